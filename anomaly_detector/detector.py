@@ -17,6 +17,7 @@ from py_eureka_client.eureka_client import EurekaClient
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from common.config import Config
 from common.models import SensorReading, Anomaly, HealthStatus
+from timescale_schema import ensure_anomalies_schema
 
 # ---------------------------
 # Logging
@@ -244,6 +245,12 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning("Could not connect to TimescaleDB, fallback to JSON only: %s", e)
 
+    if db_pool:
+        try:
+            await ensure_anomalies_schema(db_pool)
+        except Exception as e:
+            logger.warning("Could not check the anomalies hypertable layout: %s", e)
+
     mqtt_task = asyncio.create_task(mqtt_listener())
     cleanup_task = asyncio.create_task(cleanup_old_anomalies())
     yield
@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from typing import List
+
+import asyncpg
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common.config import Config
+
+logger = logging.getLogger("anomaly_detector")
+
+# Serializes schema changes if several detector instances start together
+SCHEMA_LOCK_KEY = 0x41514454  # "AQDT"
+
+# Columns written by save_anomaly_to_db and read by the api-sig ETL
+CREATE_ANOMALIES_TABLE = """
+    CREATE TABLE IF NOT EXISTS anomalies (
+        id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        sensor_id TEXT,
+        parameter TEXT,
+        value DOUBLE PRECISION,
+        duration_seconds INTEGER,
+        message TEXT,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION
+    );
+"""
+
+# Serves the ETL keyset scan: WHERE (timestamp, id) > ($1, $2) ORDER BY timestamp, id
+CREATE_KEYSET_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_anomalies_timestamp_id ON anomalies (timestamp, id);
+"""
+
+
+CONVERT_COMMAND = "python timescale_schema.py --convert"
+
+
+async def _hypertable_info(conn):
+    return await conn.fetchrow("""
+        SELECT compression_enabled
+        FROM timescaledb_information.hypertables
+        WHERE hypertable_schema = 'public' AND hypertable_name = 'anomalies'
+    """)
+
+
+async def _setup_anomalies(conn):
+    """Table, hypertable conversion, keyset index, compression and retention (caller's transaction)"""
+    await conn.execute("CREATE EXTENSION IF NOT EXISTS timescaledb;")
+    await conn.execute(CREATE_ANOMALIES_TABLE)
+
+    info = await _hypertable_info(conn)
+    if info is None:
+        row_count = await conn.fetchval(
+            "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'anomalies'::regclass"
+        )
+        if row_count:
+            logger.warning("Converting anomalies (~%d rows) to a hypertable, this may take a while...", row_count)
+        await conn.execute(
+            f"""
+            SELECT create_hypertable(
+                'anomalies', 'timestamp',
+                chunk_time_interval => INTERVAL '{Config.ANOMALIES_CHUNK_INTERVAL}',
+                migrate_data => TRUE,
+                if_not_exists => TRUE
+            )
+            """
+        )
+        logger.info("anomalies is now a hypertable (chunks of %s)", Config.ANOMALIES_CHUNK_INTERVAL)
+        info = await _hypertable_info(conn)
+
+    await conn.execute(CREATE_KEYSET_INDEX)
+
+    # Compression settings cannot change once chunks are compressed: set them once
+    if not info['compression_enabled']:
+        await conn.execute("""
+            ALTER TABLE anomalies SET (
+                timescaledb.compress,
+                timescaledb.compress_segmentby = 'sensor_id',
+                timescaledb.compress_orderby = 'timestamp, id'
+            )
+        """)
+        logger.info("Compression enabled on anomalies (segmented by sensor_id)")
+    await conn.execute(
+        f"SELECT add_compression_policy('anomalies', INTERVAL '{Config.ANOMALIES_COMPRESS_AFTER}', if_not_exists => TRUE)"
+    )
+
+    if Config.ANOMALIES_RETENTION:
+        await conn.execute(
+            f"SELECT add_retention_policy('anomalies', INTERVAL '{Config.ANOMALIES_RETENTION}', if_not_exists => TRUE)"
+        )
+
+    logger.info(
+        "anomalies schema ready (compress after %s, retention %s)",
+        Config.ANOMALIES_COMPRESS_AFTER, Config.ANOMALIES_RETENTION or "none"
+    )
+
+
+async def check_anomalies_layout(conn) -> List[str]:
+    """Return what differs from the expected layout, without changing anything"""
+    has_timescaledb = await conn.fetchval(
+        "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb')"
+    )
+    info = await _hypertable_info(conn) if has_timescaledb else None
+    problems = []
+    if info is None:
+        problems.append("not a hypertable")
+    elif not info['compression_enabled']:
+        problems.append("compression disabled")
+    if await conn.fetchval("SELECT to_regclass('public.idx_anomalies_timestamp_id') IS NULL"):
+        problems.append("keyset index missing")
+    return problems
+
+
+async def ensure_anomalies_schema(pool):
+    """
+    Startup check. A missing anomalies table is created as a configured hypertable,
+    which is instant while it is empty. An existing table is only checked: converting
+    it rewrites every row, so that runs as an explicit step (CONVERT_COMMAND), not
+    while the detector is starting.
+    """
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_KEY)
+            if await conn.fetchval("SELECT to_regclass('public.anomalies') IS NULL"):
+                await _setup_anomalies(conn)
+                return
+            problems = await check_anomalies_layout(conn)
+
+    if problems:
+        logger.warning(
+            "anomalies layout incomplete (%s): run `%s` during a maintenance window",
+            ", ".join(problems), CONVERT_COMMAND
+        )
+    else:
+        logger.info("anomalies hypertable layout OK")
+
+
+async def convert_anomalies(dsn: str):
+    """One-off conversion of an existing anomalies table (hypertable, index, compression, policies)"""
+    conn = await asyncpg.connect(dsn)
+    try:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_KEY)
+            await _setup_anomalies(conn)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Layout of the TimescaleDB anomalies table")
+    parser.add_argument("--convert", action="store_true",
+                        help="convert anomalies to a hypertable and apply index, compression and retention")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    async def main():
+        if args.convert:
+            await convert_anomalies(Config.TIMESCALEDB_DSN)
+            return
+        conn = await asyncpg.connect(Config.TIMESCALEDB_DSN)
+        try:
+            problems = await check_anomalies_layout(conn)
+        finally:
+            await conn.close()
+        print("anomalies layout: " + (", ".join(problems) or "OK"))
+
+    asyncio.run(main())
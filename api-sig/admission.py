@@ -0,0 +1,242 @@
+# AquaWatch/api-sig/admission.py
+# Contrôle d'admission : pools PostGIS séparés (requêtes légères / lourdes),
+# limite de concurrence par endpoint et budget de temps par requête
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import asyncpg
+from fastapi import HTTPException
+
+# Nombre de mesures conservées pour les percentiles de temps d'attente
+WAIT_SAMPLES = 1000
+
+
+class ServiceSaturated(HTTPException):
+    """503 avec Retry-After : la file d'attente de l'endpoint est pleine ou trop lente"""
+
+    def __init__(self, endpoint: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"Service saturé ({endpoint}), réessayez plus tard",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+class WaitStats:
+    """Temps d'attente récents (ms) : nombre, max et percentiles"""
+
+    def __init__(self):
+        self.samples = deque(maxlen=WAIT_SAMPLES)
+        self.count = 0
+        self.max_ms = 0.0
+
+    def record(self, wait_ms: float):
+        self.samples.append(wait_ms)
+        self.count += 1
+        self.max_ms = max(self.max_ms, wait_ms)
+
+    def snapshot(self) -> dict:
+        values = sorted(self.samples)
+
+        def percentile(p):
+            if not values:
+                return 0.0
+            return round(values[min(len(values) - 1, int(len(values) * p / 100))], 2)
+
+        return {
+            "count": self.count,
+            "p50_ms": percentile(50),
+            "p99_ms": percentile(99),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class PoolPartition:
+    """Pool asyncpg dédié à une classe de requêtes, avec son statement_timeout"""
+
+    def __init__(self, name: str, min_size: int, max_size: int, statement_timeout_ms: int):
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_timeout_ms = statement_timeout_ms
+        self.pool: Optional[asyncpg.Pool] = None
+        self.wait = WaitStats()
+
+    async def open(self, dsn: str, init=None):
+        self.pool = await asyncpg.create_pool(
+            dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            # Le serveur interrompt la requête, le client garde une marge
+            command_timeout=self.statement_timeout_ms / 1000 + 5,
+            server_settings={"statement_timeout": str(self.statement_timeout_ms)},
+            init=init
+        )
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+
+    async def acquire(self, timeout: Optional[float] = None) -> asyncpg.Connection:
+        """Emprunte une connexion ; asyncio.TimeoutError si aucune ne se libère à temps"""
+        started = time.perf_counter()
+        conn = await self.pool.acquire(timeout=timeout)
+        self.wait.record((time.perf_counter() - started) * 1000)
+        return conn
+
+    async def release(self, conn: asyncpg.Connection):
+        await self.pool.release(conn)
+
+    @asynccontextmanager
+    async def connection(self, timeout: Optional[float] = None):
+        conn = await self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    def snapshot(self) -> dict:
+        return {
+            "size": self.pool.get_size() if self.pool else 0,
+            "idle": self.pool.get_idle_size() if self.pool else 0,
+            "max_size": self.max_size,
+            "statement_timeout_ms": self.statement_timeout_ms,
+            "acquire_wait": self.wait.snapshot(),
+        }
+
+
+class EndpointLimiter:
+    """Limite de concurrence et file d'attente bornée pour un endpoint"""
+
+    def __init__(
+        self,
+        name: str,
+        partition: PoolPartition,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: int
+    ):
+        self.name = name
+        self.partition = partition
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.wait = WaitStats()
+
+    def _reject(self):
+        self.rejected += 1
+        raise ServiceSaturated(self.name, self.retry_after)
+
+    def _abandon(self, waiter: asyncio.Future):
+        """Renonce à une attente de place : une place obtenue malgré tout est rendue"""
+        def release_if_acquired(future):
+            if not future.cancelled() and future.exception() is None:
+                self.semaphore.release()
+        waiter.cancel()
+        waiter.add_done_callback(release_if_acquired)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Attend une place (au plus queue_timeout) puis une connexion de la partition"""
+        started = time.perf_counter()
+        if self.semaphore.locked():
+            if self.queued >= self.max_queue:
+                self._reject()
+            self.queued += 1
+            # Attente suivie dans sa propre tâche : avec wait_for (Python <= 3.11), une
+            # place accordée au moment du timeout ou de l'annulation était perdue
+            waiter = asyncio.ensure_future(self.semaphore.acquire())
+            try:
+                done, _ = await asyncio.wait({waiter}, timeout=self.queue_timeout)
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+            finally:
+                self.queued -= 1
+            if not done:
+                self._abandon(waiter)
+                self._reject()
+        else:
+            await self.semaphore.acquire()
+
+        self.in_flight += 1
+        try:
+            remaining = self.queue_timeout - (time.perf_counter() - started)
+            try:
+                conn = await self.partition.acquire(timeout=max(remaining, 0.1))
+            except asyncio.TimeoutError:
+                self._reject()
+            self.wait.record((time.perf_counter() - started) * 1000)
+            try:
+                yield conn
+            finally:
+                await self.partition.release(conn)
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "partition": self.partition.name,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "wait": self.wait.snapshot(),
+        }
+
+
+class AdmissionController:
+    """Regroupe les partitions de pool et les limiteurs des endpoints"""
+
+    def __init__(self, dsn: str, init=None):
+        self.dsn = dsn
+        self.init = init
+        self.partitions: Dict[str, PoolPartition] = {}
+        self.endpoints: Dict[str, EndpointLimiter] = {}
+        self.ready = False
+
+    def add_partition(self, name: str, min_size: int, max_size: int, statement_timeout_ms: int):
+        self.partitions[name] = PoolPartition(name, min_size, max_size, statement_timeout_ms)
+
+    def add_endpoint(
+        self,
+        name: str,
+        partition: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: int
+    ):
+        self.endpoints[name] = EndpointLimiter(
+            name, self.partitions[partition], max_concurrency, max_queue, queue_timeout, retry_after
+        )
+
+    async def open(self):
+        for partition in self.partitions.values():
+            await partition.open(self.dsn, init=self.init)
+        self.ready = True
+
+    async def close(self):
+        self.ready = False
+        for partition in self.partitions.values():
+            await partition.close()
+
+    def acquire(self, endpoint: str):
+        return self.endpoints[endpoint].acquire()
+
+    def snapshot(self) -> dict:
+        return {
+            "partitions": {name: p.snapshot() for name, p in self.partitions.items()},
+            "endpoints": {name: e.snapshot() for name, e in self.endpoints.items()},
+        }
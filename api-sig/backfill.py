@@ -0,0 +1,196 @@
+# AquaWatch/api-sig/backfill.py
+# Resynchronisation massive TimescaleDB -> PostGIS par tranches de temps parallèles
+# (après une reconstruction de PostGIS), reprise possible après un arrêt
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+
+import partitions
+import staging
+import sync_events
+
+logger = logging.getLogger(__name__)
+
+# Pas d'ORDER BY : une tranche est rechargée entièrement en cas de reprise.
+# Les anomalies sans coordonnées sont lues aussi : la staging les rejette.
+SLICE_QUERY = """
+    SELECT id, type, timestamp, sensor_id, parameter, value, message, latitude, longitude
+    FROM anomalies
+    WHERE timestamp >= $1 AND timestamp < $2
+"""
+
+# Nouvelles tentatives d'un batch en conflit avec une autre transaction
+# (l'ETL courant met à jour les rollups des mêmes jours)
+MAX_BATCH_ATTEMPTS = 3
+
+
+def plan_slices(start: datetime, end: datetime, slice_days: int):
+    """
+    Découpe [start, end[ en tranches alignées sur minuit UTC. Les rollups étant
+    agrégés par jour, deux tranches ne modifient jamais les mêmes lignes de rollup :
+    les workers ne peuvent pas s'interbloquer.
+    """
+    slices = []
+    day = start.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < end:
+        upper = day + timedelta(days=slice_days)
+        slices.append((max(day, start), min(upper, end)))
+        day = upper
+    return slices
+
+
+async def prepare(dst, start: datetime, end: datetime, slice_days: int):
+    """
+    Partitions de toute la plage et tranches ; retourne les tranches à (re)traiter.
+    Le schéma (dont etl_backfill_slices) est créé par les migrations.
+    """
+    # Partitions créées avant les writers, hors de leurs transactions
+    await partitions.ensure_partitions(dst, start, end - timedelta(microseconds=1))
+
+    await dst.executemany("""
+        INSERT INTO etl_backfill_slices (slice_start, slice_end)
+        VALUES ($1, $2)
+        ON CONFLICT (slice_start, slice_end) DO NOTHING
+    """, plan_slices(start, end, slice_days))
+    return await dst.fetch("""
+        SELECT slice_start, slice_end, status
+        FROM etl_backfill_slices
+        WHERE slice_start >= $1 AND slice_end <= $2
+        ORDER BY slice_start
+    """, start, end)
+
+
+async def _load_with_retry(dst, rows):
+    for attempt in range(1, MAX_BATCH_ATTEMPTS + 1):
+        try:
+            return await staging.load_batch(dst, rows)
+        except (asyncpg.exceptions.DeadlockDetectedError, asyncpg.exceptions.SerializationError) as e:
+            if attempt == MAX_BATCH_ATTEMPTS:
+                raise
+            logger.warning(f"⚠ Conflit lors du chargement ({e}), nouvelle tentative {attempt + 1}/{MAX_BATCH_ATTEMPTS}")
+            await asyncio.sleep(0.1 * attempt)
+
+
+async def process_slice(src, dst, slice_start, slice_end, batch_size: int, totals: dict):
+    """
+    Charge une tranche batch par batch. Chaque batch valide ses lignes et ses rollups
+    ensemble : une tranche interrompue peut être rejouée sans double comptage.
+    Les anomalies ajoutées sont publiées comme une synchronisation (etl_sync_events),
+    pour que les workers de l'API invalident leurs caches et complètent leur index.
+    """
+    await dst.execute("""
+        UPDATE etl_backfill_slices
+        SET status = 'running', attempts = attempts + 1, started_at = NOW(), error = NULL
+        WHERE slice_start = $1 AND slice_end = $2
+    """, slice_start, slice_end)
+
+    counts = {"read": 0, "inserted": 0, "duplicates": 0, "rejected": 0}
+    points = []     # Anomalies ajoutées (id, type, lon, lat), publiées en fin de tranche
+    try:
+        async with src.transaction(isolation='repeatable_read', readonly=True):
+            cursor = await src.cursor(SLICE_QUERY, slice_start, slice_end)
+            while True:
+                rows = await cursor.fetch(batch_size)
+                if not rows:
+                    break
+                inserted, duplicates, rejected = await _load_with_retry(dst, rows)
+                points.extend((r['id'], r['type'], r['longitude'], r['latitude']) for r in inserted)
+                counts["read"] += len(rows)
+                counts["inserted"] += len(inserted)
+                counts["duplicates"] += duplicates
+                counts["rejected"] += rejected
+                totals["read"] += len(rows)
+                totals["inserted"] += len(inserted)
+    except Exception as e:
+        async with dst.transaction():
+            await dst.execute("""
+                UPDATE etl_backfill_slices SET status = 'error', error = $3
+                WHERE slice_start = $1 AND slice_end = $2
+            """, slice_start, slice_end, str(e))
+            # Les batches validés avant l'erreur sont visibles : ils sont publiés aussi
+            if points:
+                await sync_events.record_run(dst, points)
+        raise
+
+    async with dst.transaction():
+        await dst.execute("""
+            UPDATE etl_backfill_slices
+            SET status = 'done', finished_at = NOW(),
+                rows_read = $3, inserted = $4, duplicates = $5, rejected = $6
+            WHERE slice_start = $1 AND slice_end = $2
+        """, slice_start, slice_end, counts["read"], counts["inserted"], counts["duplicates"], counts["rejected"])
+        if points:
+            await sync_events.record_run(dst, points)
+    return counts
+
+
+async def _worker(worker_id: int, src_dsn: str, dst_dsn: str, queue: asyncio.Queue,
+                  batch_size: int, totals: dict, progress: dict):
+    """Une paire de connexions (TimescaleDB, PostGIS) qui traite les tranches à la suite"""
+    src = await asyncpg.connect(src_dsn)
+    dst = await asyncpg.connect(dst_dsn)
+    try:
+        while True:
+            try:
+                slice_start, slice_end = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            slice_started = time.perf_counter()
+            try:
+                counts = await process_slice(src, dst, slice_start, slice_end, batch_size, totals)
+            except Exception as e:
+                progress["failed"] += 1
+                logger.error(f"❌ Tranche {slice_start.isoformat()} en erreur (worker {worker_id}): {e}")
+                continue
+            progress["done"] += 1
+            elapsed = time.perf_counter() - progress["started"]
+            logger.info(
+                f"   [{progress['done'] + progress['failed']}/{progress['total']}] "
+                f"{slice_start:%Y-%m-%d %H:%M} -> {slice_end:%Y-%m-%d %H:%M} (worker {worker_id}): "
+                f"{counts['inserted']} ajoutées / {counts['read']} lues en "
+                f"{time.perf_counter() - slice_started:.1f}s | cumul {totals['read'] / elapsed:.0f} lignes/s"
+            )
+    finally:
+        await src.close()
+        await dst.close()
+
+
+async def run_backfill(src_dsn: str, dst_dsn: str, start: datetime, end: datetime,
+                       workers: int = 4, slice_days: int = 1, batch_size: int = 10000) -> dict:
+    """Resynchronise [start, end[ ; les tranches déjà terminées sont ignorées (reprise)"""
+    logger.info("=" * 60)
+    logger.info(f"BACKFILL {start.isoformat()} -> {end.isoformat()}")
+    logger.info(f"   Configuration: tranches de {slice_days} jour(s), {workers} workers, batch_size={batch_size}")
+    logger.info("=" * 60)
+
+    dst = await asyncpg.connect(dst_dsn)
+    try:
+        slices = await prepare(dst, start, end, slice_days)
+    finally:
+        await dst.close()
+
+    todo = [(s['slice_start'], s['slice_end']) for s in slices if s['status'] != 'done']
+    logger.info(f"   {len(slices)} tranches, {len(slices) - len(todo)} déjà terminées, {len(todo)} à traiter")
+
+    queue = asyncio.Queue()
+    for item in todo:
+        queue.put_nowait(item)
+    totals = {"read": 0, "inserted": 0}
+    progress = {"total": len(todo), "done": 0, "failed": 0, "started": time.perf_counter()}
+
+    await asyncio.gather(*(
+        _worker(i + 1, src_dsn, dst_dsn, queue, batch_size, totals, progress)
+        for i in range(min(workers, len(todo)))
+    ))
+
+    elapsed = time.perf_counter() - progress["started"]
+    logger.info("=" * 60)
+    logger.info(f"✅ BACKFILL TERMINÉ en {elapsed:.1f}s")
+    logger.info(f"   - {progress['done']} tranches terminées, {progress['failed']} en erreur (relancer pour reprendre)")
+    logger.info(f"   - {totals['read']} anomalies lues, {totals['inserted']} ajoutées")
+    logger.info(f"   - Débit agrégé: {totals['read'] / elapsed if elapsed > 0 else 0:.0f} lignes/s")
+    logger.info("=" * 60)
+    return {**totals, "slices_done": progress["done"], "slices_failed": progress["failed"], "seconds": elapsed}
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# Script de mesure des réponses de l'API-SIG (taille, latence, cache/ETag)
+# Usage : python3 bench_api.py [--url http://localhost:8000] [--requests 20] [--export-days 30]
+#                              [--sync-seconds 600 --concurrency 8]
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ENDPOINTS = [
+    "/api/anomalies/geojson?days=7",
+    "/api/anomalies/clusters?zoom=5",
+    "/api/zones/communes?days=7",
+    "/api/historical?days=30",
+    "/api/stats",
+]
+
+ENCODINGS = ["identity", "gzip", "br", "zstd"]
+
+
+def fetch(url, headers=None):
+    """Retourne (status, en-têtes, taille du corps, durée en ms)"""
+    request = urllib.request.Request(url, headers=headers or {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            body = response.read()
+            status = response.status
+            response_headers = response.headers
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        status = e.code
+        response_headers = e.headers
+    return status, response_headers, len(body), (time.perf_counter() - start) * 1000
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def bench_endpoint(base_url, path, n_requests):
+    url = base_url + path
+    print(f"\n{path}")
+
+    # Taille et latence par encodage
+    etag = None
+    for encoding in ENCODINGS:
+        durations = []
+        size = 0
+        for _ in range(n_requests):
+            status, headers, size, duration = fetch(url, {"Accept-Encoding": encoding})
+            durations.append(duration)
+            etag = headers.get("ETag") or etag
+        print(
+            f"  {encoding:>8}: {size:>10} octets | "
+            f"p50 {statistics.median(durations):8.1f} ms | p99 {percentile(durations, 99):8.1f} ms"
+        )
+
+    # Polls conditionnels : doivent répondre 304 sans corps
+    if etag:
+        durations = []
+        not_modified = 0
+        for _ in range(n_requests):
+            status, _, _, duration = fetch(url, {"If-None-Match": etag})
+            durations.append(duration)
+            not_modified += status == 304
+        print(
+            f"  If-None-Match: {not_modified}/{n_requests} réponses 304 | "
+            f"p50 {statistics.median(durations):8.1f} ms"
+        )
+    else:
+        print("  (pas d'ETag retourné)")
+
+
+def bench_export(base_url, days):
+    """Débit (lignes/s) de l'export colonnaire comparé à la pagination GeoJSON"""
+    print(f"\nExport des {days} derniers jours")
+
+    # GeoJSON : parcours de toutes les pages via le curseur 'next'
+    start = time.perf_counter()
+    total_rows = 0
+    total_bytes = 0
+    cursor = None
+    while True:
+        url = f"{base_url}/api/anomalies/geojson?days={days}&page_size=10000"
+        if cursor:
+            url += f"&cursor={cursor}"
+        with urllib.request.urlopen(url, timeout=600) as response:
+            body = response.read()
+        page = json.loads(body)
+        total_rows += len(page["features"])
+        total_bytes += len(body)
+        cursor = page.get("next")
+        if not cursor:
+            break
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {'geojson':>10}: {total_rows:>9} lignes | {total_bytes:>12} octets | "
+        f"{elapsed:7.2f} s | {total_rows / elapsed if elapsed else 0:10.0f} lignes/s"
+    )
+
+    date_to = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+    date_from = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(time.time() - days * 86400))
+    for export_format in ("arrow", "parquet", "flatgeobuf"):
+        url = f"{base_url}/api/anomalies/export?format={export_format}&from={date_from}&to={date_to}"
+        start = time.perf_counter()
+        size = 0
+        with urllib.request.urlopen(url, timeout=600) as response:
+            while True:
+                chunk = response.read(1 << 20)
+                if not chunk:
+                    break
+                size += len(chunk)
+        elapsed = time.perf_counter() - start
+        # Même période que la pagination GeoJSON : même nombre de lignes
+        print(
+            f"  {export_format:>10}: {total_rows:>9} lignes | {size:>12} octets | "
+            f"{elapsed:7.2f} s | {total_rows / elapsed if elapsed else 0:10.0f} lignes/s"
+        )
+
+
+# Requêtes de carte utilisées pour la mesure de latence pendant une synchronisation
+SYNC_LOAD_ENDPOINTS = [
+    "/api/anomalies/geojson?days=1&page_size=1000",
+    "/api/stats",
+    "/api/anomalies/clusters?zoom=5",
+]
+
+
+def etl_running(base_url):
+    """Vrai si /api/health indique une synchronisation ETL en cours"""
+    try:
+        with urllib.request.urlopen(f"{base_url}/api/health", timeout=10) as response:
+            etl = json.loads(response.read()).get("etl") or {}
+        return etl.get("status") == "running"
+    except Exception:
+        return None
+
+
+def bench_during_sync(base_url, seconds, concurrency):
+    """
+    Charge continue sur les endpoints de carte pendant `seconds` secondes
+    (au moins un cycle ETL de 5 minutes) : latences séparées selon qu'une
+    synchronisation est en cours ou non.
+    """
+    print(f"\nLatence pendant les synchronisations ETL ({seconds}s, {concurrency} clients)")
+    deadline = time.monotonic() + seconds
+    syncing = {"value": False}
+    samples = {True: [], False: []}
+    errors = {"count": 0}
+    lock = threading.Lock()
+
+    def poll_health():
+        while time.monotonic() < deadline:
+            running = etl_running(base_url)
+            if running is not None:
+                syncing["value"] = running
+            time.sleep(1)
+
+    def client(offset):
+        i = offset
+        while time.monotonic() < deadline:
+            path = SYNC_LOAD_ENDPOINTS[i % len(SYNC_LOAD_ENDPOINTS)]
+            i += 1
+            in_sync = syncing["value"]
+            status, _, _, duration = fetch(base_url + path, {"Accept-Encoding": "gzip"})
+            with lock:
+                if status == 200:
+                    samples[in_sync and syncing["value"]].append(duration)
+                else:
+                    errors["count"] += 1
+
+    threads = [threading.Thread(target=poll_health)]
+    threads += [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for label, in_sync in (("hors sync", False), ("pendant sync", True)):
+        durations = samples[in_sync]
+        if not durations:
+            print(f"  {label:>12}: aucune mesure")
+            continue
+        print(
+            f"  {label:>12}: {len(durations):>7} requêtes | "
+            f"p50 {statistics.median(durations):8.1f} ms | p99 {percentile(durations, 99):8.1f} ms"
+        )
+    print(f"  Réponses non 200 (dont 503) : {errors['count']}")
+    if not samples[True]:
+        print("  ⚠ Aucune synchronisation observée : allonger --sync-seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure des réponses de l'API-SIG")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--export-days", type=int, default=0,
+                        help="Compare aussi l'export colonnaire au GeoJSON sur N jours")
+    parser.add_argument("--sync-seconds", type=int, default=0,
+                        help="Mesure aussi la latence p99 pendant les synchronisations ETL (durée de charge)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"MESURE DE L'API-SIG ({args.url}, {args.requests} requêtes par cas)")
+    print("=" * 60)
+    for path in ENDPOINTS:
+        bench_endpoint(args.url, path, args.requests)
+    if args.export_days:
+        bench_export(args.url, args.export_days)
+    if args.sync_seconds:
+        bench_during_sync(args.url, args.sync_seconds, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# Script de mesure du chargement PostGIS de l'ETL (lignes/s)
+# Compare l'insertion ligne à ligne et le chargement COPY + staging sur des
+# anomalies synthétiques ; chaque mesure est annulée (ROLLBACK) à la fin.
+# Avec --cycles N, mesure plutôt la préparation d'un cycle de synchronisation,
+# avec et sans les vérifications de schéma désormais faites par les migrations.
+# Avec --source-reads N, mesure la lecture d'un batch dans TimescaleDB selon le motif
+# de l'ETL (à lancer avant et après la conversion de anomalies en hypertable).
+# Usage : python3 bench_etl.py [--rows 20000] [--batch-size 10000] [--cycles 20] [--source-reads 20]
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+
+import migrations
+import partitions
+import rollups
+import staging
+from etl_anomalies import POSTGIS_DSN, SOURCE_QUERY, TIMESCALEDB_DSN
+
+
+class _Rollback(Exception):
+    pass
+
+
+def synthetic_rows(count, invalid_ratio=0.01):
+    """Anomalies aléatoires sur la France métropolitaine, dont une part de coordonnées invalides"""
+    now = datetime.now(timezone.utc)
+    rows = []
+    for _ in range(count):
+        invalid = random.random() < invalid_ratio
+        rows.append({
+            "id": uuid.uuid4().hex,
+            "type": random.choice(["spike", "drift", "dropout"]),
+            "timestamp": now - timedelta(seconds=random.randint(0, 86400)),
+            "sensor_id": f"sensor_{random.randint(1, 50)}",
+            "parameter": random.choice(["temperature", "ph", "turbidity"]),
+            "value": round(random.uniform(0, 40), 3),
+            "message": "bench",
+            "latitude": 123.0 if invalid else random.uniform(42, 51),
+            "longitude": random.uniform(-5, 8),
+        })
+    return rows
+
+
+async def load_row_by_row(conn, rows, batch_size):
+    """Ancienne méthode : un INSERT et un savepoint par ligne"""
+    for start in range(0, len(rows), batch_size):
+        batch = [
+            r for r in rows[start:start + batch_size]
+            if -90 <= r['latitude'] <= 90 and -180 <= r['longitude'] <= 180
+        ]
+        inserted = []
+        async with conn.transaction():
+            for r in batch:
+                async with conn.transaction():
+                    result = await conn.execute("""
+                        INSERT INTO anomalies_gis (id, type, timestamp, sensor_id, parameter, value, message, geom)
+                        VALUES ($1, $2, $3, $4, $5, $6, $7, ST_SetSRID(ST_MakePoint($8, $9), 4326))
+                        ON CONFLICT (id, timestamp) DO NOTHING
+                    """, r['id'], r['type'], r['timestamp'], r['sensor_id'], r['parameter'],
+                       r['value'], r['message'], r['longitude'], r['latitude'])
+                if result == "INSERT 0 1":
+                    inserted.append(r)
+            await rollups.update_rollups(conn, inserted)
+
+
+async def load_copy(conn, rows, batch_size):
+    """Méthode actuelle : COPY vers la staging puis INSERT ... SELECT par batch"""
+    for start in range(0, len(rows), batch_size):
+        await staging.load_batch(conn, rows[start:start + batch_size])
+
+
+async def measure(conn, label, loader, rows, batch_size):
+    started = time.perf_counter()
+    try:
+        async with conn.transaction():
+            await staging.ensure_rejects_table(conn)
+            await staging.ensure_rejects_key(conn)
+            await partitions.ensure_partitions(
+                conn, min(r['timestamp'] for r in rows), max(r['timestamp'] for r in rows)
+            )
+            await loader(conn, rows, batch_size)
+            elapsed = time.perf_counter() - started
+            raise _Rollback()
+    except _Rollback:
+        pass
+    finally:
+        # Les partitions créées pendant la mesure ont été annulées
+        partitions.reset_cache()
+    print(f"  {label:>14}: {len(rows):>8} lignes | {elapsed:7.2f} s | {len(rows) / elapsed:10.0f} lignes/s")
+    return elapsed
+
+
+async def cycle_setup(with_schema_checks: bool):
+    """Préparation d'un cycle : connexions, et vérifications de schéma dans l'ancien mode"""
+    src = await asyncpg.connect(TIMESCALEDB_DSN)
+    dst = await asyncpg.connect(POSTGIS_DSN)
+    try:
+        if with_schema_checks:
+            # Ce que chaque cycle rejouait avant les migrations (opérations idempotentes)
+            for _, _, migrate in migrations.MIGRATIONS:
+                await migrate(dst)
+            await migrations.maintain_partitions(dst)
+    finally:
+        await src.close()
+        await dst.close()
+
+
+async def measure_cycles(cycles: int):
+    print("=" * 60)
+    print(f"MESURE DE LA PRÉPARATION D'UN CYCLE ({cycles} cycles)")
+    print("=" * 60)
+    results = {}
+    for label, with_schema_checks in (("avant", True), ("après", False)):
+        durations = []
+        for _ in range(cycles):
+            started = time.perf_counter()
+            await cycle_setup(with_schema_checks)
+            durations.append((time.perf_counter() - started) * 1000)
+        durations.sort()
+        results[label] = durations[len(durations) // 2]
+        print(f"  {label:>6}: p50 {results[label]:7.1f} ms | max {durations[-1]:7.1f} ms")
+    print(f"\n  Gain par cycle: {results['avant'] - results['après']:.1f} ms")
+
+
+async def source_layout(src) -> str:
+    """Organisation actuelle de anomalies (table simple ou hypertable compressée)"""
+    try:
+        row = await src.fetchrow("""
+            SELECT num_chunks, compression_enabled
+            FROM timescaledb_information.hypertables
+            WHERE hypertable_name = 'anomalies'
+        """)
+    except asyncpg.exceptions.UndefinedTableError:
+        row = None
+    if row is None:
+        return "table simple"
+    return f"hypertable, {row['num_chunks']} chunks, compression {'activée' if row['compression_enabled'] else 'désactivée'}"
+
+
+async def measure_source_reads(reads: int, batch_size: int):
+    """Premier batch du parcours (timestamp, id) de l'ETL depuis plusieurs positions de marque"""
+    src = await asyncpg.connect(TIMESCALEDB_DSN)
+    try:
+        print("=" * 60)
+        print(f"LECTURE TIMESCALEDB ({await source_layout(src)}, {reads} lectures par position)")
+        print("=" * 60)
+        now = datetime.now(timezone.utc)
+        for label, delta in (("marque -5 min", timedelta(minutes=5)), ("marque -1 jour", timedelta(days=1)),
+                             ("fenêtre 7 jours", timedelta(days=7))):
+            durations = []
+            rows = 0
+            for _ in range(reads):
+                started = time.perf_counter()
+                async with src.transaction(isolation='repeatable_read', readonly=True):
+                    cursor = await src.cursor(SOURCE_QUERY, now - delta, '')
+                    rows = len(await cursor.fetch(batch_size))
+                durations.append((time.perf_counter() - started) * 1000)
+            durations.sort()
+            print(
+                f"  {label:>15}: {rows:>6} lignes | p50 {durations[len(durations) // 2]:8.1f} ms "
+                f"| max {durations[-1]:8.1f} ms"
+            )
+    finally:
+        await src.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Mesure du chargement PostGIS de l'ETL")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--cycles", type=int, default=0,
+                        help="mesurer la préparation d'un cycle (avant/après migrations)")
+    parser.add_argument("--source-reads", type=int, default=0,
+                        help="mesurer la lecture TimescaleDB selon le motif de l'ETL")
+    args = parser.parse_args()
+
+    if args.source_reads:
+        await measure_source_reads(args.source_reads, args.batch_size)
+        return
+    if args.cycles:
+        await measure_cycles(args.cycles)
+        return
+
+    print("=" * 60)
+    print(f"MESURE DU CHARGEMENT ETL ({args.rows} anomalies, batches de {args.batch_size})")
+    print("=" * 60)
+
+    rows = synthetic_rows(args.rows)
+    conn = await asyncpg.connect(POSTGIS_DSN)
+    try:
+        row_by_row = await measure(conn, "ligne à ligne", load_row_by_row, rows, args.batch_size)
+        copy = await measure(conn, "COPY + staging", load_copy, rows, args.batch_size)
+    finally:
+        await conn.close()
+    print(f"\n  Accélération: x{row_by_row / copy:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
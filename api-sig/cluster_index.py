@@ -0,0 +1,163 @@
+# AquaWatch/api-sig/cluster_index.py
+# Index hiérarchique en mémoire pour le clustering des anomalies par niveau de zoom
+import math
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Paramètres du clustering (mêmes valeurs par défaut que supercluster)
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+RADIUS = 60    # Rayon de regroupement en pixels
+EXTENT = 512   # Taille d'une tuile en pixels
+
+
+def lng_x(lng: float) -> float:
+    """Longitude -> coordonnée X Web Mercator normalisée [0, 1]"""
+    return lng / 360.0 + 0.5
+
+
+def lat_y(lat: float) -> float:
+    """Latitude -> coordonnée Y Web Mercator normalisée [0, 1]"""
+    sin = math.sin(lat * math.pi / 180.0)
+    if sin >= 1.0 or sin <= -1.0:
+        return 0.0 if sin > 0 else 1.0
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return min(max(y, 0.0), 1.0)
+
+
+def x_lng(x: float) -> float:
+    return (x - 0.5) * 360.0
+
+
+def y_lat(y: float) -> float:
+    y2 = (180.0 - y * 360.0) * math.pi / 180.0
+    return 360.0 * math.atan(math.exp(y2)) / math.pi - 90.0
+
+
+class _Cell:
+    """Agrégat d'un cluster : nombre de points, barycentre et répartition par type"""
+    __slots__ = ("count", "sum_x", "sum_y", "types", "point_id")
+
+    def __init__(self):
+        self.count = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.types = Counter()
+        self.point_id = None
+
+
+class ClusterIndex:
+    """
+    Grille hiérarchique par niveau de zoom : à chaque zoom, les points sont
+    regroupés dans des cellules de RADIUS pixels. Chaque cellule maintient
+    son nombre de points, son barycentre et le type dominant.
+
+    Contrairement à un KD-tree statique, l'insertion d'un point coûte
+    O(nombre de zooms), ce qui permet une mise à jour incrémentale après
+    chaque synchronisation ETL sans reconstruire l'index.
+    """
+
+    def __init__(self, min_zoom: int = MIN_ZOOM, max_zoom: int = MAX_ZOOM):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.levels: Dict[int, Dict[Tuple[int, int], _Cell]] = {
+            z: {} for z in range(min_zoom, max_zoom + 1)
+        }
+        self.cell_sizes = {
+            z: RADIUS / (EXTENT * (2 ** z)) for z in range(min_zoom, max_zoom + 1)
+        }
+        self.total_points = 0
+        self.point_ids = set()
+        self.built_at: Optional[datetime] = None
+        self.updated_at: Optional[datetime] = None
+        # Dernière synchronisation ETL intégrée à l'index
+        self.version: Optional[int] = None
+
+    def add(self, point_id: str, anomaly_type: str, lon: float, lat: float) -> bool:
+        """
+        Ajoute un point à tous les niveaux de zoom. Un id déjà indexé est ignoré :
+        rejouer une synchronisation déjà vue dans l'instantané de construction
+        ne compte pas ses points deux fois.
+        """
+        if point_id in self.point_ids:
+            return False
+        x = lng_x(lon)
+        y = lat_y(lat)
+        for z, level in self.levels.items():
+            size = self.cell_sizes[z]
+            key = (int(x // size), int(y // size))
+            cell = level.get(key)
+            if cell is None:
+                cell = level[key] = _Cell()
+            cell.count += 1
+            cell.sum_x += x
+            cell.sum_y += y
+            cell.types[anomaly_type] += 1
+            cell.point_id = point_id
+        self.point_ids.add(point_id)
+        self.total_points += 1
+        return True
+
+    def add_many(self, points: Iterable[Tuple[str, str, float, float]]) -> int:
+        """Ajoute un lot de points (id, type, longitude, latitude), en ignorant ceux déjà indexés"""
+        added = 0
+        for point_id, anomaly_type, lon, lat in points:
+            if lon is None or lat is None:
+                continue
+            if self.add(point_id, anomaly_type, float(lon), float(lat)):
+                added += 1
+        self.updated_at = datetime.now(timezone.utc)
+        return added
+
+    def get_clusters(
+        self,
+        bbox: Tuple[float, float, float, float],
+        zoom: int
+    ) -> List[dict]:
+        """Retourne les clusters (features GeoJSON) intersectant la bbox au zoom donné"""
+        z = min(max(int(zoom), self.min_zoom), self.max_zoom)
+        level = self.levels[z]
+        size = self.cell_sizes[z]
+
+        min_lon, min_lat, max_lon, max_lat = bbox
+        min_cx = int(lng_x(min_lon) // size)
+        max_cx = int(lng_x(max_lon) // size)
+        min_cy = int(lat_y(max_lat) // size)
+        max_cy = int(lat_y(min_lat) // size)
+
+        # Choisir le parcours le moins coûteux : plage de cellules de la bbox
+        # ou ensemble des cellules non vides du niveau
+        span = (max_cx - min_cx + 1) * (max_cy - min_cy + 1)
+        if span <= len(level):
+            cells = (
+                ((cx, cy), level.get((cx, cy)))
+                for cx in range(min_cx, max_cx + 1)
+                for cy in range(min_cy, max_cy + 1)
+            )
+        else:
+            cells = level.items()
+
+        features = []
+        for (cx, cy), cell in cells:
+            if cell is None:
+                continue
+            if not (min_cx <= cx <= max_cx and min_cy <= cy <= max_cy):
+                continue
+            lon = x_lng(cell.sum_x / cell.count)
+            lat = y_lat(cell.sum_y / cell.count)
+            dominant_type, _ = cell.types.most_common(1)[0]
+            properties = {
+                "cluster": cell.count > 1,
+                "point_count": cell.count,
+                "dominant_type": dominant_type,
+                "types": dict(cell.types),
+            }
+            if cell.count == 1:
+                properties["id"] = cell.point_id
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": properties
+            })
+        return features
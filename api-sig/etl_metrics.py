@@ -0,0 +1,195 @@
+# AquaWatch/api-sig/etl_metrics.py
+# Métriques de l'ETL : historique des exécutions dans PostGIS et endpoint HTTP /metrics
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Durée de conservation de l'historique des exécutions
+RUNS_RETENTION = "90 days"
+
+CREATE_RUNS_TABLE = """
+    CREATE TABLE IF NOT EXISTS etl_runs (
+        run_id BIGSERIAL PRIMARY KEY,
+        started_at TIMESTAMPTZ NOT NULL,
+        finished_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        duration_ms DOUBLE PRECISION NOT NULL,
+        status TEXT NOT NULL,
+        rows_read INTEGER NOT NULL DEFAULT 0,
+        inserted INTEGER NOT NULL DEFAULT 0,
+        duplicates INTEGER NOT NULL DEFAULT 0,
+        rejected INTEGER NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0,
+        aborted INTEGER NOT NULL DEFAULT 0,
+        batches INTEGER NOT NULL DEFAULT 0,
+        batch_p50_ms DOUBLE PRECISION,
+        batch_max_ms DOUBLE PRECISION,
+        watermark TIMESTAMPTZ,
+        watermark_lag_seconds DOUBLE PRECISION,
+        source_rows_estimate BIGINT,
+        target_rows_estimate BIGINT,
+        error TEXT
+    );
+"""
+
+RUN_COLUMNS = [
+    "started_at", "duration_ms", "setup_ms", "status", "rows_read", "inserted", "duplicates", "rejected",
+    "errors", "aborted", "batches", "batch_p50_ms", "batch_max_ms", "watermark",
+    "watermark_lag_seconds", "source_rows_estimate", "target_rows_estimate", "error",
+]
+
+
+async def ensure_runs_table(conn):
+    await conn.execute(CREATE_RUNS_TABLE)
+
+
+async def estimate_rows(conn, table: str) -> Optional[int]:
+    """
+    Nombre de lignes estimé sans parcours. Avec TimescaleDB, approximate_row_count()
+    couvre les chunks de l'hypertable, compressés compris. Sinon, pg_class.reltuples
+    des partitions feuilles (anomalies_gis) : depuis PostgreSQL 14, ANALYZE renseigne
+    aussi la table mère, qui compterait deux fois. None si la table n'existe pas ou
+    n'a jamais été analysée.
+    """
+    if await conn.fetchval("SELECT to_regclass($1) IS NULL", table):
+        return None
+    if await conn.fetchval("SELECT to_regprocedure('approximate_row_count(regclass)') IS NOT NULL"):
+        return await conn.fetchval("SELECT approximate_row_count($1::regclass)", table)
+    return await conn.fetchval("""
+        SELECT SUM(c.reltuples)::bigint
+        FROM pg_partition_tree($1::regclass) t
+        JOIN pg_class c ON c.oid = t.relid
+        WHERE t.isleaf AND c.reltuples >= 0
+    """, table)
+
+
+async def record_run(conn, run: dict):
+    """Ajoute une exécution à etl_runs et purge l'historique expiré"""
+    placeholders = ", ".join(f"${i}" for i in range(1, len(RUN_COLUMNS) + 1))
+    async with conn.transaction():
+        await conn.execute(
+            f"INSERT INTO etl_runs ({', '.join(RUN_COLUMNS)}) VALUES ({placeholders})",
+            *(run.get(column) for column in RUN_COLUMNS)
+        )
+        await conn.execute(f"DELETE FROM etl_runs WHERE started_at < NOW() - INTERVAL '{RUNS_RETENTION}'")
+
+
+def quantiles(samples) -> dict:
+    """p50 / p99 / max d'une série de mesures (ms)"""
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(ordered[len(ordered) // 2], 1),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 1),
+        "max_ms": round(ordered[-1], 1),
+    }
+
+
+class EtlMetrics:
+    """Compteurs cumulés depuis le démarrage du processus et dernière exécution complète"""
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.totals = {
+            "runs": 0, "failed_runs": 0, "micro_syncs": 0, "rows_read": 0, "inserted": 0,
+            "duplicates": 0, "rejected": 0, "errors": 0, "aborted": 0,
+        }
+        self.last_run: Optional[dict] = None
+        self.batch_ms = deque(maxlen=1000)
+        # Fraîcheur (ms) du mode temps réel : de l'INSERT dans TimescaleDB au COMMIT dans PostGIS
+        self.freshness_ms = deque(maxlen=1000)
+
+    def _add(self, stats: dict):
+        for key, stat in (("rows_read", "read"), ("inserted", "inserted"), ("duplicates", "duplicates"),
+                          ("rejected", "rejected"), ("errors", "errors"), ("aborted", "aborted")):
+            self.totals[key] += stats[stat]
+        self.batch_ms.extend(stats["batch_ms"])
+
+    def record_run(self, run: dict, stats: dict):
+        self.totals["runs"] += 1
+        if run["status"] != "ok":
+            self.totals["failed_runs"] += 1
+        self._add(stats)
+        self.last_run = {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in run.items()
+        }
+
+    def record_micro(self, stats: dict, freshness_ms: float):
+        self.totals["micro_syncs"] += 1
+        self._add(stats)
+        self.freshness_ms.append(freshness_ms)
+
+    def snapshot(self) -> dict:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "totals": self.totals,
+            "batch_latency": quantiles(self.batch_ms),
+            "freshness": quantiles(self.freshness_ms),
+            "last_run": self.last_run,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+
+
+def build_run(started_at: datetime, started: float, setup_ms: Optional[float], stats: dict, watermark,
+              error: Optional[str], source_estimate: Optional[int], target_estimate: Optional[int]) -> dict:
+    """Ligne de etl_runs pour une exécution complète"""
+    batch = quantiles(stats["batch_ms"])
+    return {
+        "started_at": started_at,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "setup_ms": round(setup_ms, 1) if setup_ms is not None else None,
+        "status": "error" if error else "ok",
+        "rows_read": stats["read"],
+        "inserted": stats["inserted"],
+        "duplicates": stats["duplicates"],
+        "rejected": stats["rejected"],
+        "errors": stats["errors"],
+        "aborted": stats["aborted"],
+        "batches": stats["batches"],
+        "batch_p50_ms": batch["p50_ms"],
+        "batch_max_ms": batch["max_ms"],
+        "watermark": watermark,
+        "watermark_lag_seconds": (
+            round((datetime.now(timezone.utc) - watermark).total_seconds(), 1) if watermark else None
+        ),
+        "source_rows_estimate": source_estimate,
+        "target_rows_estimate": target_estimate,
+        "error": error,
+    }
+
+
+async def serve(metrics: EtlMetrics, host: str, port: int):
+    """Serveur HTTP minimal : GET /metrics retourne metrics.snapshot() en JSON"""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # En-têtes ignorés
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", json.dumps(metrics.snapshot()).encode()
+            else:
+                status, body = "404 Not Found", b'{"detail": "Not Found"}'
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"✓ Métriques de l'ETL exposées sur http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,192 @@
+# AquaWatch/api-sig/export_formats.py
+# Export des anomalies en formats binaires colonnaires (Arrow IPC, Parquet, FlatGeobuf)
+import struct
+from typing import AsyncIterator, List
+
+import flatbuffers
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EXPORT_COLUMNS = [
+    ("id", pa.string()),
+    ("type", pa.string()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("sensor_id", pa.string()),
+    ("parameter", pa.string()),
+    ("value", pa.float64()),
+    ("message", pa.string()),
+    ("longitude", pa.float64()),
+    ("latitude", pa.float64()),
+]
+EXPORT_SCHEMA = pa.schema(EXPORT_COLUMNS)
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "flatgeobuf": "application/flatgeobuf",
+}
+EXTENSIONS = {"arrow": "arrow", "parquet": "parquet", "flatgeobuf": "fgb"}
+
+
+def rows_to_batch(rows) -> pa.RecordBatch:
+    """Convertit un paquet de lignes asyncpg en RecordBatch Arrow"""
+    arrays = []
+    for name, arrow_type in EXPORT_COLUMNS:
+        values = [row[name] for row in rows]
+        if arrow_type == pa.float64():
+            values = [float(v) if v is not None else None for v in values]
+        arrays.append(pa.array(values, type=arrow_type))
+    return pa.RecordBatch.from_arrays(arrays, schema=EXPORT_SCHEMA)
+
+
+class _ChunkSink:
+    """Fichier en écriture dont le contenu est vidé à chaque lecture (pour le streaming)"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+# ============================================
+# ARROW IPC (format streaming)
+# ============================================
+
+# Marqueur de fin de flux IPC : continuation 0xFFFFFFFF + longueur 0
+ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+
+async def encode_arrow(batches: AsyncIterator[pa.RecordBatch]) -> AsyncIterator[bytes]:
+    yield EXPORT_SCHEMA.serialize().to_pybytes()
+    async for batch in batches:
+        yield batch.serialize().to_pybytes()
+    yield ARROW_EOS
+
+
+# ============================================
+# PARQUET (un row group par paquet)
+# ============================================
+
+async def encode_parquet(batches: AsyncIterator[pa.RecordBatch]) -> AsyncIterator[bytes]:
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), EXPORT_SCHEMA, compression="zstd")
+    try:
+        async for batch in batches:
+            writer.write_batch(batch)
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+# ============================================
+# FLATGEOBUF (sans index spatial, lisible en streaming)
+# ============================================
+
+FGB_MAGIC = b"fgb\x03fgb\x00"
+FGB_POINT = 1
+FGB_COLUMN_STRING = 11
+FGB_COLUMN_DOUBLE = 10
+FGB_COLUMN_DATETIME = 13
+
+# Colonnes attributaires (la position est encodée dans les propriétés)
+FGB_COLUMNS = [
+    ("id", FGB_COLUMN_STRING),
+    ("type", FGB_COLUMN_STRING),
+    ("timestamp", FGB_COLUMN_DATETIME),
+    ("sensor_id", FGB_COLUMN_STRING),
+    ("parameter", FGB_COLUMN_STRING),
+    ("value", FGB_COLUMN_DOUBLE),
+    ("message", FGB_COLUMN_STRING),
+]
+
+
+def fgb_header() -> bytes:
+    """Magic bytes + en-tête FlatGeobuf (table Header, préfixée par sa taille)"""
+    builder = flatbuffers.Builder(1024)
+
+    columns = []
+    for column_name, column_type in FGB_COLUMNS:
+        name = builder.CreateString(column_name)
+        builder.StartObject(11)
+        builder.PrependUOffsetTRelativeSlot(0, name, 0)
+        builder.PrependUint8Slot(1, column_type, 0)
+        columns.append(builder.EndObject())
+
+    builder.StartVector(4, len(columns), 4)
+    for column in reversed(columns):
+        builder.PrependUOffsetTRelative(column)
+    columns_vector = builder.EndVector()
+
+    name = builder.CreateString("anomalies")
+    crs_org = builder.CreateString("EPSG")
+    builder.StartObject(6)
+    builder.PrependUOffsetTRelativeSlot(0, crs_org, 0)
+    builder.PrependInt32Slot(1, 4326, 0)
+    crs = builder.EndObject()
+
+    builder.StartObject(14)
+    builder.PrependUOffsetTRelativeSlot(0, name, 0)
+    builder.PrependUint8Slot(2, FGB_POINT, 0)
+    builder.PrependUOffsetTRelativeSlot(7, columns_vector, 0)
+    builder.PrependUint64Slot(8, 0, 0)       # Nombre de features inconnu (streaming)
+    builder.PrependUint16Slot(9, 0, 16)      # Pas d'index spatial
+    builder.PrependUOffsetTRelativeSlot(10, crs, 0)
+    builder.FinishSizePrefixed(builder.EndObject())
+    return FGB_MAGIC + bytes(builder.Output())
+
+
+def fgb_feature(row) -> bytes:
+    """Encode une anomalie en Feature FlatGeobuf (point + propriétés)"""
+    properties = bytearray()
+    for index, (column_name, column_type) in enumerate(FGB_COLUMNS):
+        value = row[column_name]
+        if value is None:
+            continue
+        properties += struct.pack("<H", index)
+        if column_type == FGB_COLUMN_DOUBLE:
+            properties += struct.pack("<d", float(value))
+        else:
+            text = (value.isoformat() if column_type == FGB_COLUMN_DATETIME else str(value)).encode()
+            properties += struct.pack("<I", len(text)) + text
+
+    builder = flatbuffers.Builder(256 + len(properties))
+    properties_vector = builder.CreateByteVector(bytes(properties))
+
+    builder.StartVector(8, 2, 8)
+    builder.PrependFloat64(float(row["latitude"]))
+    builder.PrependFloat64(float(row["longitude"]))
+    xy = builder.EndVector()
+
+    builder.StartObject(8)
+    builder.PrependUOffsetTRelativeSlot(1, xy, 0)
+    builder.PrependUint8Slot(6, FGB_POINT, 0)
+    geometry = builder.EndObject()
+
+    builder.StartObject(3)
+    builder.PrependUOffsetTRelativeSlot(0, geometry, 0)
+    builder.PrependUOffsetTRelativeSlot(1, properties_vector, 0)
+    builder.FinishSizePrefixed(builder.EndObject())
+    return bytes(builder.Output())
+
+
+async def encode_flatgeobuf(row_chunks: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    yield fgb_header()
+    async for rows in row_chunks:
+        yield b"".join(fgb_feature(row) for row in rows)
@@ -0,0 +1,106 @@
+# AquaWatch/api-sig/migrations.py
+# Migrations versionnées du schéma PostGIS de l'ETL, appliquées une fois au démarrage
+import logging
+import time
+
+import etl_metrics
+import partitions
+import rollups
+import staging
+import sync_events
+import sync_state
+
+logger = logging.getLogger(__name__)
+
+# Verrou consultatif : un seul processus (ETL, backfill) migre à la fois
+MIGRATIONS_LOCK_KEY = 0x41515741  # "AQWA"
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        duration_ms DOUBLE PRECISION NOT NULL
+    );
+"""
+
+# Tranches du backfill et leur avancement (voir backfill.py)
+CREATE_BACKFILL_SLICES_TABLE = """
+    CREATE TABLE IF NOT EXISTS etl_backfill_slices (
+        slice_start TIMESTAMPTZ NOT NULL,
+        slice_end TIMESTAMPTZ NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        rows_read INTEGER NOT NULL DEFAULT 0,
+        inserted INTEGER NOT NULL DEFAULT 0,
+        duplicates INTEGER NOT NULL DEFAULT 0,
+        rejected INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        started_at TIMESTAMPTZ,
+        finished_at TIMESTAMPTZ,
+        PRIMARY KEY (slice_start, slice_end)
+    );
+"""
+
+
+async def _postgis_extension(conn):
+    await conn.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+
+
+async def _etl_bookkeeping(conn):
+    await staging.ensure_rejects_table(conn)
+    await sync_state.ensure_sync_state_table(conn)
+    await sync_events.ensure_sync_tables(conn)
+    await etl_metrics.ensure_runs_table(conn)
+    await conn.execute(CREATE_BACKFILL_SLICES_TABLE)
+
+
+async def _runs_setup_ms(conn):
+    await conn.execute("ALTER TABLE etl_runs ADD COLUMN IF NOT EXISTS setup_ms DOUBLE PRECISION;")
+
+
+# (version, nom, fonction) : une migration appliquée n'est jamais modifiée, on en ajoute une.
+# Les premières reprennent les anciennes vérifications idempotentes : sur une base
+# existante, elles constatent l'état en place et sont simplement enregistrées.
+MIGRATIONS = [
+    (1, "extension postgis", _postgis_extension),
+    (2, "anomalies_gis partitionnée par mois", partitions.ensure_partitioned_table),
+    (3, "tables de rollup", rollups.ensure_rollup_tables),
+    (4, "tables de suivi de l'ETL", _etl_bookkeeping),
+    (5, "etl_runs.setup_ms", _runs_setup_ms),
+    (6, "clé unique des rejets", staging.ensure_rejects_key),
+]
+
+
+async def run_migrations(conn) -> list:
+    """Applique les migrations manquantes, chacune dans sa transaction ; retourne leurs versions"""
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_KEY)
+    try:
+        await conn.execute(CREATE_MIGRATIONS_TABLE)
+        applied = {row['version'] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+        done = []
+        for version, name, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+            logger.info(f"Migration {version}: {name}...")
+            started = time.perf_counter()
+            async with conn.transaction():
+                await migrate(conn)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, duration_ms) VALUES ($1, $2, $3)",
+                    version, name, (time.perf_counter() - started) * 1000
+                )
+            logger.info(f"✓ Migration {version} appliquée en {time.perf_counter() - started:.2f}s")
+            done.append(version)
+        if not done:
+            logger.info(f"✓ Schéma à jour (version {MIGRATIONS[-1][0]})")
+        return done
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_KEY)
+
+
+async def maintain_partitions(conn):
+    """Partitions des mois à venir et rétention (au démarrage, puis au plus une fois par jour)"""
+    await partitions.load_cache(conn)
+    await partitions.ensure_upcoming_partitions(conn)
+    await partitions.drop_expired_partitions(conn)
@@ -0,0 +1,243 @@
+# AquaWatch/api-sig/partitions.py
+# Partitionnement mensuel de anomalies_gis (RANGE sur timestamp) : création, migration et rétention
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timezone
+
+import rollups
+
+logger = logging.getLogger(__name__)
+
+# Nombre de partitions mensuelles créées à l'avance
+PARTITIONS_AHEAD_MONTHS = int(os.getenv("PARTITIONS_AHEAD_MONTHS", "3"))
+# Rétention en mois (0 = conserver tout l'historique)
+RETENTION_MONTHS = int(os.getenv("ANOMALIES_GIS_RETENTION_MONTHS", "0"))
+
+PARTITION_PREFIX = "anomalies_gis_p"
+
+# La clé primaire d'une table partitionnée doit inclure la clé de partition.
+# Les index créés sur la table mère sont créés sur chaque partition (un GiST par mois).
+CREATE_PARTITIONED_TABLE = """
+    CREATE TABLE anomalies_gis (
+        id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        sensor_id TEXT,
+        parameter TEXT,
+        value NUMERIC,
+        message TEXT,
+        geom GEOMETRY(Point, 4326) NOT NULL,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+    CREATE INDEX idx_anomalies_gis_geom ON anomalies_gis USING GIST (geom);
+    CREATE INDEX idx_anomalies_gis_timestamp ON anomalies_gis (timestamp DESC, id DESC);
+"""
+
+# Verrou consultatif de création des partitions, partagé entre processus
+PARTITIONS_LOCK_KEY = 0x41515750  # "AQWP"
+
+# Mois dont la partition existe déjà (évite une requête au catalogue par batch)
+_known_partitions = set()
+# Les writers parallèles de l'ETL ne créent pas la même partition en même temps
+_partitions_lock = asyncio.Lock()
+
+
+def month_start(value) -> date:
+    """Premier jour du mois (UTC) contenant value"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def reset_cache():
+    """Oublie les partitions mémorisées (après une transaction annulée qui en a créé)"""
+    _known_partitions.clear()
+
+
+async def load_cache(conn):
+    """Mémorise les partitions existantes si le cache est vide"""
+    if not _known_partitions:
+        _known_partitions.update(await list_partitions(conn))
+
+
+async def list_partitions(conn) -> dict:
+    """Retourne {premier jour du mois: nom de la partition}"""
+    rows = await conn.fetch("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'anomalies_gis'::regclass
+    """)
+    partitions = {}
+    for row in rows:
+        suffix = row['relname'][len(PARTITION_PREFIX):]
+        if row['relname'].startswith(PARTITION_PREFIX) and len(suffix) == 6 and suffix.isdigit():
+            partitions[date(int(suffix[:4]), int(suffix[4:]), 1)] = row['relname']
+    return partitions
+
+
+async def ensure_partitions(conn, start, end):
+    """
+    Crée les partitions mensuelles manquantes couvrant [start, end]. Une partition
+    est créée à part puis attachée : ATTACH PARTITION ne prend qu'un verrou SHARE
+    UPDATE EXCLUSIVE sur anomalies_gis, compatible avec les INSERT des writers en
+    cours (CREATE TABLE ... PARTITION OF attendrait un ACCESS EXCLUSIVE derrière
+    leurs transactions, elles-mêmes en attente de leur tour de validation).
+    """
+    month = month_start(start)
+    last = month_start(end)
+    while month <= last:
+        if month not in _known_partitions:
+            async with _partitions_lock:
+                if month not in _known_partitions:
+                    await _attach_partition(conn, month)
+                    _known_partitions.add(month)
+        month = add_months(month, 1)
+
+
+async def _attach_partition(conn, month: date):
+    name = partition_name(month)
+    upper = add_months(month, 1)
+    async with conn.transaction():
+        # Un autre processus (ETL, backfill) peut attacher le même mois en même temps
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", PARTITIONS_LOCK_KEY)
+        attached = await conn.fetchval(
+            "SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass($1))", name
+        )
+        if attached:
+            return
+        await conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name}
+                (LIKE anomalies_gis INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+            ALTER TABLE anomalies_gis ATTACH PARTITION {name}
+                FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00');
+        """)
+
+
+async def ensure_partitioned_table(conn):
+    """
+    Crée anomalies_gis partitionnée si absente, ou migre l'ancienne table
+    non partitionnée (les doublons d'id sont éliminés au passage).
+    """
+    relkind = await conn.fetchval(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('public.anomalies_gis')"
+    )
+    now = datetime.now(timezone.utc)
+
+    try:
+        if relkind is None:
+            logger.warning("⚠ Table 'anomalies_gis' n'existe pas, création (partitionnée par mois)...")
+            async with conn.transaction():
+                await conn.execute(CREATE_PARTITIONED_TABLE)
+                await ensure_partitions(conn, now, now)
+            logger.info("✓ Table anomalies_gis créée avec succès")
+
+        elif relkind == 'r':
+            logger.warning("⚠ Table 'anomalies_gis' non partitionnée, migration vers des partitions mensuelles...")
+            async with conn.transaction():
+                await conn.execute("""
+                    ALTER TABLE anomalies_gis RENAME TO anomalies_gis_heap;
+                    ALTER TABLE anomalies_gis_heap DROP CONSTRAINT IF EXISTS anomalies_gis_pkey;
+                    DROP INDEX IF EXISTS idx_anomalies_gis_geom;
+                    DROP INDEX IF EXISTS idx_anomalies_gis_timestamp;
+                """)
+                await conn.execute(CREATE_PARTITIONED_TABLE)
+                bounds = await conn.fetchrow(
+                    "SELECT MIN(timestamp) AS first, MAX(timestamp) AS last FROM anomalies_gis_heap"
+                )
+                if bounds['first'] is not None:
+                    await ensure_partitions(conn, bounds['first'], bounds['last'])
+                result = await conn.execute("""
+                    INSERT INTO anomalies_gis (id, type, timestamp, sensor_id, parameter, value, message, geom)
+                    SELECT id, type, timestamp, sensor_id, parameter, value, message, geom
+                    FROM anomalies_gis_heap
+                    ON CONFLICT DO NOTHING;
+                    DROP TABLE anomalies_gis_heap;
+                """)
+            logger.info(f"✓ anomalies_gis migrée vers des partitions mensuelles ({result})")
+
+        else:
+            logger.info("✓ Table anomalies_gis (partitionnée) trouvée dans PostGIS")
+            await load_cache(conn)
+    except Exception:
+        # Transaction annulée : les partitions mémorisées ne sont plus fiables
+        reset_cache()
+        raise
+
+
+async def ensure_upcoming_partitions(conn):
+    """Crée les partitions du mois courant et des PARTITIONS_AHEAD_MONTHS suivants"""
+    now = datetime.now(timezone.utc)
+    await ensure_partitions(conn, now, add_months(month_start(now), PARTITIONS_AHEAD_MONTHS))
+
+
+def retention_cutoff(now: datetime, months: int) -> date:
+    """Premier jour conservé : début du mois courant (UTC) moins `months` mois"""
+    return add_months(month_start(now), -months)
+
+
+async def _list_partition_tables(conn) -> dict:
+    """
+    Retourne {premier jour du mois: (nom, attachée, détachement en attente)} pour toutes
+    les tables de partition, y compris celles déjà détachées mais pas encore supprimées
+    """
+    rows = await conn.fetch("""
+        SELECT c.relname, i.inhrelid IS NOT NULL AS attached, COALESCE(i.inhdetachpending, false) AS pending
+        FROM pg_class c
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'anomalies_gis'::regclass
+        WHERE c.relkind = 'r' AND c.relname LIKE $1 AND pg_table_is_visible(c.oid)
+    """, f"{PARTITION_PREFIX}%")
+    tables = {}
+    for row in rows:
+        suffix = row['relname'][len(PARTITION_PREFIX):]
+        if len(suffix) == 6 and suffix.isdigit():
+            tables[date(int(suffix[:4]), int(suffix[4:]), 1)] = (row['relname'], row['attached'], row['pending'])
+    return tables
+
+
+async def drop_expired_partitions(conn, months: int = RETENTION_MONTHS) -> list:
+    """
+    Rétention : supprime les partitions entièrement antérieures à la fenêtre
+    (DROP TABLE, sans DELETE ligne à ligne) et les rollups correspondants.
+
+    Chaque partition est d'abord détachée avec DETACH PARTITION ... CONCURRENTLY,
+    hors transaction : seul un verrou SHARE UPDATE EXCLUSIVE est pris sur anomalies_gis,
+    les lectures de l'API et les INSERT de l'ETL continuent. Les tables détachées et
+    les rollups sont ensuite supprimés dans une même transaction. Une table détachée
+    lors d'une exécution interrompue est reprise à l'exécution suivante.
+    """
+    if months <= 0:
+        return []
+    cutoff = retention_cutoff(datetime.now(timezone.utc), months)
+    expired = [
+        (month, table) for month, table in sorted((await _list_partition_tables(conn)).items())
+        if add_months(month, 1) <= cutoff
+    ]
+    if not expired:
+        return []
+
+    for month, (name, attached, pending) in expired:
+        _known_partitions.discard(month)
+        if pending:
+            # DETACH CONCURRENTLY interrompu : le terminer
+            await conn.execute(f"ALTER TABLE anomalies_gis DETACH PARTITION {name} FINALIZE;")
+        elif attached:
+            await conn.execute(f"ALTER TABLE anomalies_gis DETACH PARTITION {name} CONCURRENTLY;")
+
+    dropped = [name for _, (name, _, _) in expired]
+    async with conn.transaction():
+        for name in dropped:
+            await conn.execute(f"DROP TABLE {name};")
+        await rollups.drop_before(conn, cutoff)
+    logger.info(f"✓ Rétention: partitions supprimées {dropped}")
+    return dropped
@@ -0,0 +1,232 @@
+# AquaWatch/api-sig/response_cache.py
+# Cache des réponses GeoJSON pré-encodées : compression négociée, ETag et GET conditionnel
+import asyncio
+import gzip
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import brotli
+import zstandard
+
+# Encodages supportés, par ordre de préférence du serveur
+ENCODERS = {
+    "br": lambda body: brotli.compress(body, quality=5),
+    "zstd": lambda body: zstandard.ZstdCompressor(level=6).compress(body),
+    "gzip": lambda body: gzip.compress(body, compresslevel=6),
+}
+
+# En dessous de cette taille, la compression ne vaut pas le coût
+MIN_COMPRESS_SIZE = 1024
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Retourne l'encodage préféré accepté par le client (None = identité)"""
+    accepted = set()
+    for token in accept_encoding.split(','):
+        parts = [p.strip() for p in token.split(';')]
+        name = parts[0].lower()
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+    for encoding in ENCODERS:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+class CachedBody:
+    """Corps de réponse encodé une seule fois, compressé au plus une fois par encodage"""
+    __slots__ = ("etag", "body", "media_type", "created_at", "encoded", "pending")
+
+    def __init__(self, etag: str, body: bytes, media_type: str):
+        self.etag = etag
+        self.body = body
+        self.media_type = media_type
+        self.created_at = time.monotonic()
+        self.encoded: Dict[str, bytes] = {}
+        # Compressions en cours, partagées par les requêtes simultanées
+        self.pending: Dict[str, asyncio.Task] = {}
+
+    @property
+    def size(self) -> int:
+        """Octets retenus : corps et copies compressées"""
+        return len(self.body) + sum(len(data) for data in self.encoded.values())
+
+
+class ResponseCache:
+    """
+    Cache des corps de réponse indexé par (chemin, paramètres).
+    La version des données est celle de la dernière synchronisation ETL, annoncée
+    à tous les workers : les ETags en dérivent et sont identiques d'un worker à
+    l'autre, un client à jour reçoit donc un 304 sans requête SQL.
+    """
+
+    def __init__(self, ttl: int = 300, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Budget mémoire du cache (corps + copies compressées), éviction LRU
+        self.max_bytes = max_bytes
+        self.size = 0
+        # Tant que la version ETL est inconnue, les ETags sont propres au processus
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.version: Optional[int] = None
+        self.entries: "OrderedDict[str, CachedBody]" = OrderedDict()
+
+    @property
+    def data_version(self) -> str:
+        return f"v{self.version}" if self.version is not None else self.boot_id
+
+    def set_version(self, version: Optional[int]):
+        """Nouvelle version des données : invalide toutes les entrées"""
+        if version != self.version:
+            self.version = version
+            self.entries.clear()
+            self.size = 0
+
+    def etag_for(self, key: str) -> str:
+        # Les fenêtres glissantes (days=N) évoluent avec le temps même sans
+        # nouvelle donnée : l'ETag change aussi à chaque période de TTL
+        bucket = int(time.time() // self.ttl)
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return f'"{self.data_version}-{bucket}-{digest}"'
+
+    def get(self, key: str, etag: str) -> Optional[CachedBody]:
+        entry = self.entries.get(key)
+        if entry is None or entry.etag != etag:
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CachedBody):
+        # Un corps plus gros que tout le budget est servi sans être retenu
+        if entry.size > self.max_bytes:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= previous.size
+        self.entries[key] = entry
+        self.size += entry.size
+        self._evict()
+
+    def _evict(self):
+        # L'entrée la plus récente (celle qu'on vient de servir) est conservée
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+
+    async def encode(self, key: str, entry: CachedBody, encoding: Optional[str]) -> bytes:
+        """
+        Corps de l'entrée dans l'encodage demandé. La compression (plusieurs Mo
+        pour une page GeoJSON) s'exécute dans un thread, hors de la boucle
+        d'événements ; le résultat est conservé et compté dans le budget.
+        """
+        if encoding is None:
+            return entry.body
+        data = entry.encoded.get(encoding)
+        if data is not None:
+            return data
+        task = entry.pending.get(encoding)
+        if task is None:
+            task = entry.pending[encoding] = asyncio.create_task(self._compress(key, entry, encoding))
+        # shield : une déconnexion du client n'annule pas une compression partagée
+        return await asyncio.shield(task)
+
+    async def _compress(self, key: str, entry: CachedBody, encoding: str) -> bytes:
+        try:
+            data = await asyncio.to_thread(ENCODERS[encoding], entry.body)
+        finally:
+            entry.pending.pop(encoding, None)
+        entry.encoded[encoding] = data
+        # Entrée toujours en cache (ni évincée, ni invalidée) : la copie compte dans le budget
+        if self.entries.get(key) is entry:
+            self.size += len(data)
+            self._evict()
+        return data
+
+
+class CachedResponseMiddleware:
+    """
+    Middleware ASGI : sert les GET des chemins listés depuis le cache,
+    répond 304 si l'ETag du client est à jour, et compresse selon Accept-Encoding.
+    """
+
+    def __init__(self, app, cache: ResponseCache, paths: Iterable[str]):
+        self.app = app
+        self.cache = cache
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode().lower(): v.decode() for k, v in scope["headers"]}
+        query = "&".join(sorted(scope["query_string"].decode().split("&")))
+        key = f"{scope['path']}?{query}"
+        etag = self.cache.etag_for(key)
+
+        if_none_match = headers.get("if-none-match", "")
+        if etag in [t.strip() for t in if_none_match.split(",")]:
+            await self._send(send, 304, etag, None, b"", None)
+            return
+
+        entry = self.cache.get(key, etag)
+        if entry is None:
+            status, media_type, body, extra_headers = await self._render(scope, receive)
+            if status != 200:
+                # Erreur non mise en cache ; Retry-After (503) est conservé
+                await self._send(send, status, None, None, body, media_type, extra_headers)
+                return
+            entry = CachedBody(etag, body, media_type)
+            self.cache.put(key, entry)
+
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if len(entry.body) < MIN_COMPRESS_SIZE:
+            encoding = None
+        body = await self.cache.encode(key, entry, encoding)
+        await self._send(send, 200, entry.etag, encoding, body, entry.media_type)
+
+    async def _render(self, scope, receive):
+        """Exécute l'endpoint et capture sa réponse complète"""
+        response = {"status": 500, "media_type": "application/json", "body": [], "headers": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for k, v in message.get("headers", []):
+                    if k.lower() == b"content-type":
+                        response["media_type"] = v.decode()
+                    elif k.lower() == b"retry-after":
+                        response["headers"].append((b"retry-after", v))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        return response["status"], response["media_type"], b"".join(response["body"]), response["headers"]
+
+    @staticmethod
+    async def _send(send, status, etag, encoding, body, media_type, extra_headers=()):
+        headers = [
+            (b"cache-control", b"no-cache"),
+            (b"vary", b"Accept-Encoding"),
+            *extra_headers,
+        ]
+        if etag:
+            headers.append((b"etag", etag.encode()))
+        if encoding:
+            headers.append((b"content-encoding", encoding.encode()))
+        if media_type:
+            headers.append((b"content-type", media_type.encode()))
+        if status != 304:
+            headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
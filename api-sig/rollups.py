@@ -0,0 +1,216 @@
+# AquaWatch/api-sig/rollups.py
+# Tables pré-agrégées maintenues par l'ETL pour /api/historical, /api/zones/communes et /api/stats
+import logging
+import math
+from datetime import timezone
+
+logger = logging.getLogger(__name__)
+
+# Pyramide de grilles des zones : niveau -> nombre de cellules par degré
+# (niveau 0 = 1°, niveau 1 = 0.1°, niveau 2 = 0.01°)
+GRID_LEVELS = {0: 1, 1: 10, 2: 100}
+
+ROLLUP_TABLES = {
+    "anomalies_daily_rollup": """
+        CREATE TABLE anomalies_daily_rollup (
+            day DATE NOT NULL,
+            parameter TEXT NOT NULL DEFAULT '',
+            sensor_id TEXT NOT NULL DEFAULT '',
+            anomaly_count BIGINT NOT NULL,
+            value_count BIGINT NOT NULL,
+            value_sum DOUBLE PRECISION,
+            value_min DOUBLE PRECISION,
+            value_max DOUBLE PRECISION,
+            PRIMARY KEY (day, parameter, sensor_id)
+        );
+        INSERT INTO anomalies_daily_rollup
+        SELECT
+            DATE(timestamp AT TIME ZONE 'UTC'),
+            COALESCE(parameter, ''),
+            COALESCE(sensor_id, ''),
+            COUNT(*),
+            COUNT(value),
+            SUM(value),
+            MIN(value),
+            MAX(value)
+        FROM anomalies_gis
+        GROUP BY 1, 2, 3;
+    """,
+    "anomalies_grid_pyramid": f"""
+        CREATE TABLE anomalies_grid_pyramid (
+            level SMALLINT NOT NULL,
+            day DATE NOT NULL,
+            cell_x INTEGER NOT NULL,
+            cell_y INTEGER NOT NULL,
+            anomaly_count BIGINT NOT NULL,
+            PRIMARY KEY (level, day, cell_x, cell_y)
+        );
+        -- Recherche par bbox sur de longues périodes
+        CREATE INDEX idx_anomalies_grid_pyramid_cell ON anomalies_grid_pyramid (level, cell_x, cell_y);
+        INSERT INTO anomalies_grid_pyramid
+        SELECT
+            l.level,
+            DATE(a.timestamp AT TIME ZONE 'UTC'),
+            FLOOR(ST_X(a.geom) * l.cells_per_degree)::int,
+            FLOOR(ST_Y(a.geom) * l.cells_per_degree)::int,
+            COUNT(*)
+        FROM anomalies_gis a
+        CROSS JOIN (VALUES {", ".join(f"({level}, {cells})" for level, cells in GRID_LEVELS.items())})
+            AS l(level, cells_per_degree)
+        GROUP BY 1, 2, 3, 4;
+        -- Remplace l'ancienne grille journalière à résolution unique (0.1°)
+        DROP TABLE IF EXISTS anomalies_grid_daily;
+    """,
+    "anomalies_counters": """
+        CREATE TABLE anomalies_counters (
+            day DATE NOT NULL,
+            type TEXT NOT NULL,
+            parameter TEXT NOT NULL DEFAULT '',
+            anomaly_count BIGINT NOT NULL,
+            PRIMARY KEY (day, type, parameter)
+        );
+        INSERT INTO anomalies_counters
+        SELECT
+            DATE(timestamp AT TIME ZONE 'UTC'),
+            type,
+            COALESCE(parameter, ''),
+            COUNT(*)
+        FROM anomalies_gis
+        GROUP BY 1, 2, 3;
+    """,
+}
+
+
+async def ensure_rollup_tables(conn):
+    """Crée les tables de rollup manquantes et les initialise depuis anomalies_gis"""
+    for table, ddl in ROLLUP_TABLES.items():
+        exists = await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", f"public.{table}")
+        if exists:
+            continue
+        logger.warning(f"⚠ Table '{table}' n'existe pas, création et initialisation...")
+        async with conn.transaction():
+            await conn.execute(ddl)
+        logger.info(f"✓ Table {table} créée et initialisée")
+
+
+async def update_rollups(conn, rows):
+    """
+    Ajoute aux rollups les anomalies nouvellement insérées.
+    À appeler dans la même transaction que l'insertion des lignes.
+    """
+    daily = {}
+    grid = {}
+    counters = {}
+    for r in rows:
+        day = r['timestamp'].astimezone(timezone.utc).date()
+
+        key = (day, r['parameter'] or '', r['sensor_id'] or '')
+        agg = daily.get(key)
+        if agg is None:
+            agg = daily[key] = [0, 0, None, None, None]
+        agg[0] += 1
+        if r['value'] is not None:
+            value = float(r['value'])
+            agg[1] += 1
+            agg[2] = value if agg[2] is None else agg[2] + value
+            agg[3] = value if agg[3] is None else min(agg[3], value)
+            agg[4] = value if agg[4] is None else max(agg[4], value)
+
+        longitude = float(r['longitude'])
+        latitude = float(r['latitude'])
+        for level, cells_per_degree in GRID_LEVELS.items():
+            cell = (
+                level,
+                day,
+                math.floor(longitude * cells_per_degree),
+                math.floor(latitude * cells_per_degree),
+            )
+            grid[cell] = grid.get(cell, 0) + 1
+
+        counter = (day, r['type'], r['parameter'] or '')
+        counters[counter] = counters.get(counter, 0) + 1
+
+    if daily:
+        await conn.executemany("""
+            INSERT INTO anomalies_daily_rollup AS r
+                (day, parameter, sensor_id, anomaly_count, value_count, value_sum, value_min, value_max)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            ON CONFLICT (day, parameter, sensor_id) DO UPDATE SET
+                anomaly_count = r.anomaly_count + EXCLUDED.anomaly_count,
+                value_count = r.value_count + EXCLUDED.value_count,
+                value_sum = COALESCE(r.value_sum, 0) + COALESCE(EXCLUDED.value_sum, 0),
+                value_min = LEAST(r.value_min, EXCLUDED.value_min),
+                value_max = GREATEST(r.value_max, EXCLUDED.value_max)
+        """, [(*key, *agg) for key, agg in daily.items()])
+
+    if grid:
+        await conn.executemany("""
+            INSERT INTO anomalies_grid_pyramid AS g (level, day, cell_x, cell_y, anomaly_count)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (level, day, cell_x, cell_y) DO UPDATE SET
+                anomaly_count = g.anomaly_count + EXCLUDED.anomaly_count
+        """, [(*key, count) for key, count in grid.items()])
+
+    if counters:
+        await conn.executemany("""
+            INSERT INTO anomalies_counters AS c (day, type, parameter, anomaly_count)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (day, type, parameter) DO UPDATE SET
+                anomaly_count = c.anomaly_count + EXCLUDED.anomaly_count
+        """, [(*key, count) for key, count in counters.items()])
+
+
+async def drop_before(conn, cutoff):
+    """Supprime des rollups les jours antérieurs à cutoff (rétention de anomalies_gis)"""
+    async with conn.transaction():
+        for table in ROLLUP_TABLES:
+            await conn.execute(f"DELETE FROM {table} WHERE day < $1", cutoff)
+
+
+async def reconcile_counters(conn) -> int:
+    """
+    Recalcule les compteurs depuis anomalies_gis et corrige les écarts
+    (suppressions manuelles, rétention, batch interrompu...).
+
+    Les écarts sont calculés en une seule requête, donc sur un seul snapshot :
+    les lignes et leurs incréments étant validés dans la même transaction
+    (staging.load_batch), ce snapshot est cohérent. Ils sont ensuite appliqués
+    en incréments (anomaly_count + écart) plutôt qu'en réécriture : les
+    incréments validés entre-temps par l'ETL, un backfill ou une micro-synchro
+    sont conservés, sans bloquer ces écrivains.
+    Retourne le nombre de clés (jour, type, paramètre) corrigées.
+    """
+    async with conn.transaction():
+        await conn.execute("""
+            CREATE TEMP TABLE counters_delta ON COMMIT DROP AS
+            SELECT
+                day, type, parameter,
+                COALESCE(a.anomaly_count, 0) - COALESCE(c.anomaly_count, 0) AS delta
+            FROM (
+                SELECT
+                    DATE(timestamp AT TIME ZONE 'UTC') AS day,
+                    type,
+                    COALESCE(parameter, '') AS parameter,
+                    COUNT(*) AS anomaly_count
+                FROM anomalies_gis
+                GROUP BY 1, 2, 3
+            ) a
+            FULL JOIN anomalies_counters c USING (day, type, parameter)
+            WHERE a.anomaly_count IS DISTINCT FROM c.anomaly_count;
+        """)
+        drift = await conn.fetchval("SELECT COUNT(*) FROM counters_delta")
+        if drift:
+            await conn.execute("""
+                INSERT INTO anomalies_counters AS c (day, type, parameter, anomaly_count)
+                SELECT day, type, parameter, delta FROM counters_delta
+                ON CONFLICT (day, type, parameter) DO UPDATE SET
+                    anomaly_count = c.anomaly_count + EXCLUDED.anomaly_count;
+            """)
+            # Clés disparues (jours purgés, lignes supprimées) : revenues à zéro
+            await conn.execute("""
+                DELETE FROM anomalies_counters c
+                USING counters_delta d
+                WHERE c.day = d.day AND c.type = d.type AND c.parameter = d.parameter
+                  AND c.anomaly_count = 0;
+            """)
+    return drift
@@ -0,0 +1,101 @@
+# AquaWatch/api-sig/source_events.py
+# Déclenchement de l'ETL par les insertions dans TimescaleDB (LISTEN/NOTIFY)
+import asyncio
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Canal notifié à chaque INSERT dans anomalies (charge utile : epoch de l'insertion)
+CHANNEL = "anomalies_inserted"
+
+# Trigger par instruction : un seul NOTIFY par INSERT, même multi-lignes.
+# NOTIFY n'est délivré qu'au COMMIT : les lignes sont alors visibles pour l'ETL.
+CREATE_NOTIFY_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION notify_anomalies_inserted() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{CHANNEL}', extract(epoch FROM clock_timestamp())::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+CREATE_NOTIFY_TRIGGER = """
+    CREATE TRIGGER anomalies_notify_insert
+        AFTER INSERT ON anomalies
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_anomalies_inserted();
+"""
+
+
+async def install_notify_trigger(src) -> bool:
+    """Installe le trigger sur TimescaleDB ; False si les droits manquent (mode poll seul)"""
+    try:
+        async with src.transaction():
+            await src.execute(CREATE_NOTIFY_FUNCTION)
+            # Créé une seule fois : CREATE TRIGGER verrouille la table anomalies
+            exists = await src.fetchval("""
+                SELECT EXISTS(
+                    SELECT 1 FROM pg_trigger
+                    WHERE tgname = 'anomalies_notify_insert' AND tgrelid = 'anomalies'::regclass
+                )
+            """)
+            if not exists:
+                await src.execute(CREATE_NOTIFY_TRIGGER)
+        return True
+    except Exception as e:
+        logger.warning(f"⚠ Trigger de notification non installé sur anomalies: {e}")
+        return False
+
+
+class NotifyDebouncer:
+    """
+    Regroupe les notifications en micro-batches : après un premier signal, attend
+    `quiet_ms` sans nouveau signal, sans dépasser `max_wait_ms` depuis le premier.
+    """
+
+    def __init__(self, quiet_ms: int, max_wait_ms: int):
+        self.quiet = quiet_ms / 1000
+        self.max_wait = max_wait_ms / 1000
+        self.event = asyncio.Event()
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+        self.oldest_epoch: Optional[float] = None
+        self.signals = 0
+
+    def on_notify(self, connection, pid, channel, payload):
+        now = time.monotonic()
+        if self.first_at is None:
+            self.first_at = now
+        self.last_at = now
+        self.signals += 1
+        try:
+            epoch = float(payload)
+        except (TypeError, ValueError):
+            epoch = time.time()
+        if self.oldest_epoch is None or epoch < self.oldest_epoch:
+            self.oldest_epoch = epoch
+        self.event.set()
+
+    async def wait(self, timeout: float):
+        """
+        Attend un micro-batch de signaux (au plus `timeout` secondes).
+        Retourne (nombre de signaux, epoch de l'insertion la plus ancienne), ou None.
+        """
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+        while True:
+            now = time.monotonic()
+            remaining = min(self.last_at + self.quiet, self.first_at + self.max_wait) - now
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+
+        batch = (self.signals, self.oldest_epoch)
+        self.event.clear()
+        self.first_at = self.last_at = self.oldest_epoch = None
+        self.signals = 0
+        return batch
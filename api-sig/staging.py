@@ -0,0 +1,198 @@
+# AquaWatch/api-sig/staging.py
+# Chargement en masse des anomalies : COPY dans une table de staging,
+# puis un INSERT ... SELECT ensembliste vers anomalies_gis
+import asyncio
+import logging
+
+import partitions
+import rollups
+import sync_state
+
+logger = logging.getLogger(__name__)
+
+# Colonnes lues dans TimescaleDB et copiées telles quelles dans la staging
+STAGING_COLUMNS = [
+    "id", "type", "timestamp", "sensor_id", "parameter", "value", "message", "latitude", "longitude"
+]
+
+# Table temporaire : propre à la session (plusieurs writers en parallèle ne se
+# voient pas), jamais écrite dans le WAL, vidée à chaque COMMIT
+CREATE_STAGING_TABLE = """
+    CREATE TEMP TABLE IF NOT EXISTS anomalies_gis_staging (
+        id TEXT,
+        type TEXT,
+        timestamp TIMESTAMPTZ,
+        sensor_id TEXT,
+        parameter TEXT,
+        value NUMERIC,
+        message TEXT,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION
+    ) ON COMMIT DELETE ROWS;
+"""
+
+CREATE_REJECTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS anomalies_gis_rejects (
+        id TEXT,
+        type TEXT,
+        timestamp TIMESTAMPTZ,
+        sensor_id TEXT,
+        parameter TEXT,
+        value NUMERIC,
+        message TEXT,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION,
+        reason TEXT NOT NULL,
+        rejected_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+"""
+
+# Un rejet par (id, timestamp, motif) : les relectures de la marge de reprise ne
+# dupliquent pas les rejets. NULLS NOT DISTINCT : une ligne sans id ou sans
+# timestamp relue n'est pas non plus enregistrée deux fois.
+CREATE_REJECTS_KEY = """
+    DELETE FROM anomalies_gis_rejects r
+    USING anomalies_gis_rejects older
+    WHERE r.id IS NOT DISTINCT FROM older.id
+      AND r.timestamp IS NOT DISTINCT FROM older.timestamp
+      AND r.reason = older.reason
+      AND r.ctid > older.ctid;
+
+    CREATE UNIQUE INDEX IF NOT EXISTS anomalies_gis_rejects_key
+        ON anomalies_gis_rejects (id, timestamp, reason) NULLS NOT DISTINCT;
+"""
+
+# Motif de rejet d'une ligne de staging (NULL = ligne valide).
+# NaN est supérieur à tout nombre pour PostgreSQL : il tombe hors limites.
+REJECT_REASON = """
+    CASE
+        WHEN id IS NULL THEN 'id manquant'
+        WHEN timestamp IS NULL THEN 'timestamp manquant'
+        WHEN type IS NULL THEN 'type manquant'
+        WHEN latitude IS NULL OR longitude IS NULL THEN 'coordonnées manquantes'
+        WHEN latitude NOT BETWEEN -90 AND 90 OR longitude NOT BETWEEN -180 AND 180
+            THEN 'coordonnées hors limites'
+    END
+"""
+
+
+async def ensure_rejects_table(conn):
+    await conn.execute(CREATE_REJECTS_TABLE)
+
+
+async def ensure_rejects_key(conn):
+    await conn.execute(CREATE_REJECTS_KEY)
+
+
+class BatchAborted(Exception):
+    """Un batch précédent a échoué : celui-ci est annulé pour ne pas dépasser la marque"""
+
+
+class CommitSequencer:
+    """
+    Ordonne la validation de batches chargés en parallèle : le batch n ne met à jour
+    les rollups et la marque, puis ne valide, qu'après la validation du batch n-1.
+    Les rollups sont ainsi modifiés par un seul writer à la fois (pas d'interblocage)
+    et la marque n'avance que sur des batches contigus. Après un échec, tous les
+    batches suivants sont annulés.
+    """
+
+    def __init__(self, first_seq: int = 0):
+        self.next_seq = first_seq
+        self.failed = False
+        self.condition = asyncio.Condition()
+
+    async def wait_turn(self, seq: int):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.next_seq == seq)
+        if self.failed:
+            raise BatchAborted(f"batch {seq} annulé après l'échec d'un batch précédent")
+
+    async def done(self, seq: int, ok: bool):
+        """Fin du batch `seq` (validé ou non) : passe la main au suivant"""
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.next_seq == seq)
+            if not ok:
+                self.failed = True
+            self.next_seq += 1
+            self.condition.notify_all()
+
+
+async def load_batch(conn, rows, watermark=None, sequencer: CommitSequencer = None, seq: int = 0):
+    """
+    Charge un batch d'anomalies dans anomalies_gis en une transaction :
+    COPY vers la staging, rejets vers anomalies_gis_rejects, INSERT ... SELECT
+    des lignes valides (doublons ignorés) et mise à jour des rollups.
+    Si `watermark` (timestamp, id) est fourni, la marque de synchronisation
+    avance dans la même transaction. Avec un `sequencer`, la fin de transaction
+    (rollups, marque, COMMIT) attend le tour du batch `seq`.
+
+    Retourne (lignes insérées, nombre de doublons, nombre de rejets). Une ligne
+    invalide déjà rejetée lors d'une lecture précédente compte comme doublon.
+    """
+    committed = False
+    try:
+        # Partitions déjà créées par l'appelant en temps normal (cache mémoire) ;
+        # sinon attachées sans bloquer les transactions des autres writers
+        timestamps = [r['timestamp'] for r in rows if r['timestamp'] is not None]
+        if timestamps:
+            await partitions.ensure_partitions(conn, min(timestamps), max(timestamps))
+
+        await conn.execute(CREATE_STAGING_TABLE)
+        async with conn.transaction():
+            inserted, rejected = await _load_staged(conn, rows)
+            if sequencer:
+                await sequencer.wait_turn(seq)
+            await rollups.update_rollups(conn, inserted)
+            if watermark is not None:
+                await sync_state.advance_watermark(conn, *watermark)
+        committed = True
+    finally:
+        if sequencer:
+            await sequencer.done(seq, committed)
+
+    duplicates = len(rows) - rejected - len(inserted)
+    return inserted, duplicates, rejected
+
+
+async def _load_staged(conn, rows):
+    """COPY vers la staging, rejets et INSERT ... SELECT (dans la transaction de l'appelant)"""
+    await conn.copy_records_to_table(
+        "anomalies_gis_staging",
+        records=[tuple(r[column] for column in STAGING_COLUMNS) for r in rows],
+        columns=STAGING_COLUMNS
+    )
+
+    rejected = await record_rejects(conn)
+
+    inserted = await conn.fetch(f"""
+        INSERT INTO anomalies_gis (id, type, timestamp, sensor_id, parameter, value, message, geom)
+        SELECT
+            id, type, timestamp, sensor_id, parameter, value, message,
+            ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
+        FROM anomalies_gis_staging
+        WHERE {REJECT_REASON} IS NULL
+        ON CONFLICT (id, timestamp) DO NOTHING
+        RETURNING
+            id, type, timestamp, sensor_id, parameter, value, message,
+            ST_X(geom) AS longitude, ST_Y(geom) AS latitude
+    """)
+    return inserted, rejected
+
+
+async def record_rejects(conn) -> int:
+    """Copie les lignes invalides de la staging dans anomalies_gis_rejects ; retourne les nouveaux rejets"""
+    return await conn.fetchval(f"""
+        WITH rejected AS (
+            INSERT INTO anomalies_gis_rejects
+                (id, type, timestamp, sensor_id, parameter, value, message, latitude, longitude, reason)
+            SELECT id, type, timestamp, sensor_id, parameter, value, message, latitude, longitude, reason
+            FROM (
+                SELECT *, {REJECT_REASON} AS reason FROM anomalies_gis_staging
+            ) s
+            WHERE reason IS NOT NULL
+            ON CONFLICT (id, timestamp, reason) DO NOTHING
+            RETURNING 1
+        )
+        SELECT COUNT(*) FROM rejected
+    """)
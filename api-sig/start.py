@@ -1,85 +1,220 @@
 #!/usr/bin/env python3
 # AquaWatch/api-sig/start.py
-# Script de démarrage pour lancer à la fois l'ETL et l'API
+# Superviseur : lance l'ETL et les workers de l'API dans des processus séparés
 import asyncio
+import json
+import logging
+import os
 import signal
+import socket
 import sys
-import logging
+import time
+from datetime import datetime, timezone
+
+from py_eureka_client.eureka_client import EurekaClient
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Variables globales pour les tâches
-etl_task = None
-api_task = None
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+# Délai laissé aux processus pour terminer leurs requêtes avant SIGKILL
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "20"))
+# Redémarrage après un crash : attente doublée à chaque échec rapproché
+RESTART_BACKOFF_MIN = 1.0
+RESTART_BACKOFF_MAX = 60.0
+# Un processus resté en vie plus longtemps est considéré stable (backoff réinitialisé)
+STABLE_AFTER_SECONDS = 60.0
+# Pause entre deux workers lors d'un redémarrage progressif (SIGHUP)
+ROLLING_RESTART_DELAY = 5.0
+SUPERVISOR_STATE_FILE = os.getenv("SUPERVISOR_STATE_FILE", "/tmp/api-sig-supervisor.json")
+EUREKA_SERVER = os.getenv("EUREKA_SERVER", "http://eureka-server:8761/eureka/")
 
-def signal_handler(sig, frame):
-    """Gestionnaire pour arrêter proprement les processus"""
-    logger.info("Arrêt des services...")
-    if etl_task:
-        etl_task.cancel()
-    if api_task:
-        api_task.cancel()
-    sys.exit(0)
 
-signal.signal(signal.SIGTERM, signal_handler)
-signal.signal(signal.SIGINT, signal_handler)
+class Child:
+    """Processus supervisé : redémarré avec backoff tant que le superviseur tourne"""
+
+    def __init__(self, name, argv, pass_fds=()):
+        self.name = name
+        self.argv = argv
+        self.pass_fds = pass_fds
+        self.process = None
+        self.state = "starting"
+        self.restarts = 0
+        self.last_exit_code = None
+        self.started_at = None
+        self.restart_requested = False
+
+    async def run(self, stopping: asyncio.Event, on_change):
+        backoff = RESTART_BACKOFF_MIN
+        while not stopping.is_set():
+            self.process = await asyncio.create_subprocess_exec(*self.argv, pass_fds=self.pass_fds)
+            self.started_at = time.monotonic()
+            self.state = "running"
+            logger.info(f"✓ {self.name} démarré (pid {self.process.pid})")
+            on_change()
+
+            self.last_exit_code = await self.process.wait()
+            uptime = time.monotonic() - self.started_at
+            if stopping.is_set():
+                break
+
+            if self.restart_requested:
+                self.restart_requested = False
+                logger.info(f"{self.name} redémarré à la demande")
+                delay = 0
+            else:
+                logger.error(f"❌ {self.name} arrêté (code {self.last_exit_code}) après {uptime:.0f}s")
+                if uptime >= STABLE_AFTER_SECONDS:
+                    backoff = RESTART_BACKOFF_MIN
+                delay = backoff
+                backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+            self.restarts += 1
+            self.state = "restarting"
+            on_change()
+            try:
+                await asyncio.wait_for(stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+        self.state = "stopped"
+        on_change()
+
+    def signal(self, sig):
+        if self.process and self.process.returncode is None:
+            self.process.send_signal(sig)
+
+    async def restart(self):
+        """Arrêt gracieux (SIGTERM) ; la boucle run() relance aussitôt le processus"""
+        self.restart_requested = True
+        self.signal(signal.SIGTERM)
+
+    async def wait_stopped(self, timeout: float):
+        if not self.process or self.process.returncode is not None:
+            return
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠ {self.name} ne s'est pas arrêté en {timeout:.0f}s, SIGKILL")
+            self.signal(signal.SIGKILL)
+            await self.process.wait()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "pid": self.process.pid if self.process else None,
+            "restarts": self.restarts,
+            "last_exit_code": self.last_exit_code,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1) if self.started_at else None,
+        }
+
 
-async def run_etl():
-    """Lancer l'ETL en tâche de fond"""
+def listen_socket() -> socket.socket:
+    """Socket d'écoute partagée par tous les workers (uvicorn --fd)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((API_HOST, API_PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def write_state(children):
+    """Publie l'état des processus pour /api/health (écriture atomique)"""
+    state = {
+        "pid": os.getpid(),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "processes": {child.name: child.snapshot() for child in children},
+    }
+    tmp_path = f"{SUPERVISOR_STATE_FILE}.tmp"
     try:
-        import etl_anomalies
-        await etl_anomalies.main_loop()
-    except asyncio.CancelledError:
-        logger.info("ETL arrêté")
-        raise
-    except Exception as e:
-        logger.error(f"Erreur dans l'ETL: {e}", exc_info=True)
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, SUPERVISOR_STATE_FILE)
+    except OSError as e:
+        logger.warning(f"⚠ Impossible d'écrire l'état du superviseur: {e}")
+
 
-async def run_api():
-    """Lancer l'API"""
+async def rolling_restart(workers):
+    """Redémarre les workers un par un : les autres continuent de servir"""
+    logger.info("Redémarrage progressif des workers de l'API...")
+    for worker in workers:
+        await worker.restart()
+        await asyncio.sleep(ROLLING_RESTART_DELAY)
+
+
+async def register_eureka():
+    """
+    Enregistre le service auprès d'Eureka, une seule fois pour tous les workers
+    (même hôte, même port : une seule instance). Un serveur Eureka injoignable est
+    réessayé par le client à chaque heartbeat ; None si le client n'a pas démarré.
+    """
+    eureka_client = EurekaClient(
+        app_name='api-sig',
+        eureka_server=EUREKA_SERVER,
+        instance_host='api-sig',
+        instance_port=API_PORT
+    )
     try:
-        import uvicorn
-        from main import app
-        config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
-        server = uvicorn.Server(config)
-        await server.serve()
-    except asyncio.CancelledError:
-        logger.info("API arrêtée")
-        raise
+        await eureka_client.start()
     except Exception as e:
-        logger.error(f"Erreur dans l'API: {e}", exc_info=True)
+        logger.warning(f"⚠ Enregistrement auprès d'Eureka impossible: {e}")
+        return None
+    logger.info("✓ Client Eureka démarré (enregistrement et heartbeats du service)")
+    return eureka_client
+
 
 async def main():
-    """Lancer les deux services en parallèle"""
-    global etl_task, api_task
-    
+    """Lancer l'ETL et les workers de l'API, puis les superviser"""
     logger.info("Démarrage des services API-SIG...")
-    logger.info("  - ETL de synchronisation TimescaleDB -> PostGIS")
-    logger.info("  - API REST/GeoJSON sur le port 8000")
-    
-    # Lancer l'ETL et l'API en tâches parallèles
-    etl_task = asyncio.create_task(run_etl())
-    api_task = asyncio.create_task(run_api())
-    
-    # Attendre que l'une des tâches se termine (ou soit annulée)
-    done, pending = await asyncio.wait(
-        [etl_task, api_task],
-        return_when=asyncio.FIRST_COMPLETED
-    )
-    
-    # Annuler les tâches restantes
-    for task in pending:
-        task.cancel()
+    logger.info("  - ETL de synchronisation TimescaleDB -> PostGIS (processus dédié)")
+    logger.info(f"  - API REST/GeoJSON sur le port {API_PORT} ({API_WORKERS} workers)")
+
+    sock = listen_socket()
+    etl = Child("etl", [sys.executable, "etl_anomalies.py"])
+    workers = [
+        Child(
+            f"api-{i}",
+            [sys.executable, "-m", "uvicorn", "main:app", "--fd", str(sock.fileno()), "--log-level", "info"],
+            pass_fds=(sock.fileno(),)
+        )
+        for i in range(1, API_WORKERS + 1)
+    ]
+    children = [etl] + workers
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.create_task(rolling_restart(workers)))
+
+    tasks = [
+        asyncio.create_task(child.run(stopping, lambda: write_state(children)))
+        for child in children
+    ]
+    eureka_client = await register_eureka()
+    await stopping.wait()
+
+    # Arrêt : l'instance est retirée d'Eureka avant que les workers ne refusent les requêtes,
+    # puis les workers finissent leurs requêtes en cours, l'ETL annule sa synchronisation
+    logger.info("Arrêt des services...")
+    if eureka_client:
         try:
-            await task
-        except asyncio.CancelledError:
-            pass
+            await eureka_client.stop()
+        except Exception as e:
+            logger.warning(f"⚠ Désenregistrement d'Eureka impossible: {e}")
+    for child in children:
+        child.signal(signal.SIGTERM)
+    await asyncio.gather(*(child.wait_stopped(SHUTDOWN_GRACE_SECONDS) for child in children))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    sock.close()
+    logger.info("Services arrêtés")
+
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
-    except KeyboardInterrupt:
-        logger.info("Arrêt demandé par l'utilisateur.")
     except Exception as e:
         logger.error(f"Erreur fatale: {e}", exc_info=True)
+        sys.exit(1)
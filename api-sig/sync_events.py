@@ -0,0 +1,165 @@
+# AquaWatch/api-sig/sync_events.py
+# Signaux de synchronisation entre le processus ETL et les workers de l'API :
+# chaque exécution de l'ETL est journalisée dans PostGIS et annoncée par NOTIFY
+import logging
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Canal LISTEN/NOTIFY : la charge utile est la version de la synchronisation terminée
+CHANNEL = "anomalies_gis_sync"
+
+# Durée de conservation des points insérés (rattrapage incrémental des workers)
+POINTS_RETENTION = "1 day"
+# Durée de conservation du journal (une ligne par micro-synchronisation en temps réel)
+EVENTS_RETENTION = "30 days"
+
+# Plus ancienne version dont les points sont encore conservés
+OLDEST_KEPT_VERSION = f"""
+    SELECT COALESCE(MIN(version), 0) FROM etl_sync_events
+    WHERE started_at > NOW() - INTERVAL '{POINTS_RETENTION}'
+"""
+
+SYNC_TABLES = """
+    CREATE TABLE IF NOT EXISTS etl_sync_events (
+        version BIGSERIAL PRIMARY KEY,
+        started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        finished_at TIMESTAMPTZ,
+        status TEXT NOT NULL DEFAULT 'running',
+        inserted INTEGER NOT NULL DEFAULT 0,
+        error TEXT
+    );
+    CREATE TABLE IF NOT EXISTS etl_sync_points (
+        version BIGINT NOT NULL,
+        id TEXT NOT NULL,
+        type TEXT,
+        longitude DOUBLE PRECISION,
+        latitude DOUBLE PRECISION
+    );
+    CREATE INDEX IF NOT EXISTS idx_etl_sync_points_version ON etl_sync_points (version);
+"""
+
+
+async def ensure_sync_tables(conn):
+    await conn.execute(SYNC_TABLES)
+
+
+async def _has_sync_tables(conn) -> bool:
+    # Vérification préalable plutôt qu'une exception, qui annulerait la transaction en cours
+    return await conn.fetchval("SELECT to_regclass('public.etl_sync_events') IS NOT NULL")
+
+
+# ============================================
+# CÔTÉ ETL
+# ============================================
+
+async def start_run(conn) -> int:
+    """Journalise le début d'une synchronisation et retourne sa version"""
+    return await conn.fetchval("INSERT INTO etl_sync_events DEFAULT VALUES RETURNING version")
+
+
+async def finish_run(
+    conn,
+    version: int,
+    inserted_rows: Iterable[Tuple[str, str, float, float]] = (),
+    error: Optional[str] = None
+):
+    """
+    Clôt une synchronisation : enregistre les points insérés puis notifie les workers.
+    Le NOTIFY n'est délivré qu'au COMMIT, une fois les points visibles.
+    """
+    points = [(version, *row) for row in inserted_rows]
+    async with conn.transaction():
+        await conn.execute("""
+            UPDATE etl_sync_events
+            SET finished_at = NOW(), status = $2, inserted = $3, error = $4
+            WHERE version = $1
+        """, version, "error" if error else "ok", len(points), error)
+        await _publish(conn, version, points)
+
+
+async def record_run(conn, inserted_rows: Iterable[Tuple[str, str, float, float]]) -> int:
+    """
+    Journalise et annonce d'un coup une synchronisation déjà terminée
+    (micro-synchronisations du mode temps réel, sans état 'running').
+    """
+    rows = list(inserted_rows)
+    async with conn.transaction():
+        version = await conn.fetchval("""
+            INSERT INTO etl_sync_events (finished_at, status, inserted)
+            VALUES (NOW(), 'ok', $1)
+            RETURNING version
+        """, len(rows))
+        await _publish(conn, version, [(version, *row) for row in rows])
+    return version
+
+
+async def _publish(conn, version: int, points):
+    """Points insérés, purge et NOTIFY (dans la transaction de l'appelant)"""
+    if points:
+        await conn.copy_records_to_table(
+            "etl_sync_points",
+            records=points,
+            columns=["version", "id", "type", "longitude", "latitude"]
+        )
+    await conn.execute(f"DELETE FROM etl_sync_points WHERE version < ({OLDEST_KEPT_VERSION})")
+    await conn.execute(f"""
+        DELETE FROM etl_sync_events
+        WHERE started_at < NOW() - INTERVAL '{EVENTS_RETENTION}'
+          AND version < (SELECT MAX(version) FROM etl_sync_events)
+    """)
+    await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, str(version))
+
+
+# ============================================
+# CÔTÉ API
+# ============================================
+
+async def current_version(conn) -> Optional[int]:
+    """Version de la dernière synchronisation terminée (None si l'ETL n'a jamais tourné)"""
+    if not await _has_sync_tables(conn):
+        return None
+    return await conn.fetchval(
+        "SELECT MAX(version) FROM etl_sync_events WHERE finished_at IS NOT NULL"
+    )
+
+
+async def fetch_points_since(conn, after: int, upto: int):
+    """
+    Points insérés par les synchronisations ]after, upto], ou None s'ils ne sont
+    plus tous conservés (le worker doit alors reconstruire son index).
+    """
+    if after + 1 < await conn.fetchval(OLDEST_KEPT_VERSION):
+        return None
+    return await conn.fetch("""
+        SELECT id, type, longitude, latitude
+        FROM etl_sync_points
+        WHERE version > $1 AND version <= $2
+        ORDER BY version
+    """, after, upto)
+
+
+async def last_run(conn) -> Optional[dict]:
+    """Dernière exécution de l'ETL, pour /api/health"""
+    if not await _has_sync_tables(conn):
+        return None
+    row = await conn.fetchrow("""
+        SELECT version, started_at, finished_at, status, inserted, error
+        FROM etl_sync_events
+        ORDER BY version DESC
+        LIMIT 1
+    """)
+    if row is None:
+        return None
+    last_activity = row['finished_at'] or row['started_at']
+    return {
+        "version": row['version'],
+        "status": row['status'],
+        "started_at": row['started_at'].isoformat(),
+        "finished_at": row['finished_at'].isoformat() if row['finished_at'] else None,
+        "inserted": row['inserted'],
+        "error": row['error'],
+        "age_seconds": round((datetime.now(timezone.utc) - last_activity).total_seconds(), 1),
+    }
+
@@ -0,0 +1,49 @@
+# AquaWatch/api-sig/sync_state.py
+# Marque de synchronisation (high-water mark) de l'ETL TimescaleDB -> PostGIS :
+# position (timestamp, id) de la dernière anomalie source chargée
+from datetime import datetime
+from typing import Optional, Tuple
+
+# Nom de la source dont on suit la progression (une ligne par source)
+DEFAULT_SOURCE = "timescaledb.anomalies"
+# Marque relevée au début du dernier poll réussi : le poll suivant relit depuis
+# cette position les anomalies validées en retard, déjà dépassées par la marque
+POLL_SOURCE = f"{DEFAULT_SOURCE}#poll"
+
+CREATE_SYNC_STATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS etl_sync_state (
+        source TEXT PRIMARY KEY,
+        last_timestamp TIMESTAMPTZ NOT NULL,
+        last_id TEXT NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+"""
+
+
+async def ensure_sync_state_table(conn):
+    await conn.execute(CREATE_SYNC_STATE_TABLE)
+
+
+async def get_watermark(conn, source: str = DEFAULT_SOURCE) -> Optional[Tuple[datetime, str]]:
+    row = await conn.fetchrow(
+        "SELECT last_timestamp, last_id FROM etl_sync_state WHERE source = $1", source
+    )
+    if row is None:
+        return None
+    return row['last_timestamp'], row['last_id']
+
+
+async def advance_watermark(conn, timestamp: datetime, anomaly_id: str, source: str = DEFAULT_SOURCE):
+    """
+    Avance la marque jusqu'à (timestamp, id), jamais en arrière.
+    À appeler dans la transaction du batch : marque et lignes sont validées ensemble.
+    """
+    await conn.execute("""
+        INSERT INTO etl_sync_state AS s (source, last_timestamp, last_id)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (source) DO UPDATE SET
+            last_timestamp = EXCLUDED.last_timestamp,
+            last_id = EXCLUDED.last_id,
+            updated_at = NOW()
+        WHERE (s.last_timestamp, s.last_id) < (EXCLUDED.last_timestamp, EXCLUDED.last_id)
+    """, source, timestamp, anomaly_id)
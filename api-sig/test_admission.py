@@ -0,0 +1,132 @@
+# Tests du contrôle d'admission : rejets 503 + Retry-After et restitution des places
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from admission import AdmissionController, EndpointLimiter, ServiceSaturated
+
+
+class FakePartition:
+    """Partition dont les connexions sont des objets quelconques, sans base"""
+
+    name = "light"
+
+    async def acquire(self, timeout=None):
+        return object()
+
+    async def release(self, conn):
+        pass
+
+
+def _limiter(max_concurrency=1, max_queue=1, queue_timeout=0.05):
+    return EndpointLimiter("stats", FakePartition(), max_concurrency, max_queue, queue_timeout, retry_after=7)
+
+
+async def _hold(limiter, release: asyncio.Event):
+    async with limiter.acquire():
+        await release.wait()
+
+
+async def _wait_until(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError("condition jamais remplie")
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_rejects_with_retry_after_and_keeps_permits():
+    limiter = _limiter()
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(limiter, release))
+    await _wait_until(lambda: limiter.in_flight == 1)
+
+    with pytest.raises(ServiceSaturated) as rejected:
+        async with limiter.acquire():
+            pass
+    assert rejected.value.status_code == 503
+    assert rejected.value.headers == {"Retry-After": "7"}
+    assert limiter.queued == 0 and limiter.rejected == 1
+
+    release.set()
+    await holder
+    await asyncio.sleep(0)
+    assert limiter.semaphore._value == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_immediately():
+    limiter = _limiter(max_queue=1, queue_timeout=5)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(limiter, release))
+    await _wait_until(lambda: limiter.in_flight == 1)
+    queued = asyncio.create_task(_hold(limiter, release))
+    await _wait_until(lambda: limiter.queued == 1)
+
+    with pytest.raises(ServiceSaturated):
+        async with limiter.acquire():
+            pass
+    assert limiter.snapshot()["queue_depth"] == 1 and limiter.rejected == 1
+
+    release.set()
+    await asyncio.gather(holder, queued)
+    assert limiter.semaphore._value == 1 and limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_its_permit():
+    limiter = _limiter(queue_timeout=5)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(limiter, release))
+    await _wait_until(lambda: limiter.in_flight == 1)
+    waiter = asyncio.create_task(_hold(limiter, asyncio.Event()))
+    await _wait_until(lambda: limiter.queued == 1)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    release.set()
+    await holder
+    await asyncio.sleep(0)
+    assert limiter.semaphore._value == 1 and limiter.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_permit_granted_as_the_waiter_gives_up_is_returned():
+    limiter = _limiter(queue_timeout=5)
+    await limiter.semaphore.acquire()
+    waiter = asyncio.create_task(_hold(limiter, asyncio.Event()))
+    await _wait_until(lambda: limiter.queued == 1)
+
+    # La place est accordée puis l'attente annulée dans la même itération de la boucle
+    limiter.semaphore.release()
+    waiter.cancel()
+    await asyncio.wait({waiter}, timeout=1)
+    assert waiter.cancelled()
+    await asyncio.sleep(0.01)
+    assert limiter.semaphore._value == 1
+
+
+@pytest.mark.asyncio
+async def test_saturated_endpoint_answers_503_with_retry_after(monkeypatch):
+    controller = AdmissionController("postgresql://unused")
+    controller.partitions["light"] = FakePartition()
+    controller.add_endpoint("stats", "light", 1, 0, 0.05, retry_after=7)
+    controller.ready = True
+    monkeypatch.setattr(main, "admission", controller)
+    main.response_cache.entries.clear()
+
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(controller.endpoints["stats"], release))
+    await _wait_until(lambda: controller.endpoints["stats"].in_flight == 1)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/api/stats")
+    release.set()
+    await holder
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
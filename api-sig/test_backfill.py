@@ -0,0 +1,77 @@
+# Tests du backfill : découpage en tranches et publication des tranches chargées
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import backfill
+import migrations
+import sync_events
+
+UTC = timezone.utc
+
+
+def test_plan_slices_aligned_on_utc_midnight():
+    start = datetime(2026, 3, 1, 15, 30, tzinfo=UTC)
+    end = datetime(2026, 3, 4, 6, 0, tzinfo=UTC)
+    assert backfill.plan_slices(start, end, 1) == [
+        (start, datetime(2026, 3, 2, tzinfo=UTC)),
+        (datetime(2026, 3, 2, tzinfo=UTC), datetime(2026, 3, 3, tzinfo=UTC)),
+        (datetime(2026, 3, 3, tzinfo=UTC), datetime(2026, 3, 4, tzinfo=UTC)),
+        (datetime(2026, 3, 4, tzinfo=UTC), end),
+    ]
+
+
+def test_plan_slices_multi_day_and_other_timezones():
+    paris = timezone(timedelta(hours=1))
+    # 00:30 à Paris = 23:30 UTC la veille : la première tranche commence ce jour UTC
+    start = datetime(2026, 3, 2, 0, 30, tzinfo=paris)
+    end = datetime(2026, 3, 6, tzinfo=UTC)
+    slices = backfill.plan_slices(start, end, 2)
+    assert slices[0] == (start, datetime(2026, 3, 3, tzinfo=UTC))
+    assert slices[-1] == (datetime(2026, 3, 5, tzinfo=UTC), end)
+    assert all(lower < upper for lower, upper in slices)
+    assert all(a[1] == b[0] for a, b in zip(slices, slices[1:]))
+
+
+def test_plan_slices_empty_range():
+    day = datetime(2026, 3, 1, tzinfo=UTC)
+    assert backfill.plan_slices(day, day, 1) == []
+
+
+@pytest.mark.asyncio
+async def test_loaded_slice_is_published_as_a_sync(gis_connect, monkeypatch):
+    src = await gis_connect()
+    dst = await gis_connect()
+    await src.execute("""
+        CREATE TABLE anomalies (
+            id TEXT, type TEXT, timestamp TIMESTAMPTZ, sensor_id TEXT, parameter TEXT,
+            value NUMERIC, message TEXT, latitude DOUBLE PRECISION, longitude DOUBLE PRECISION
+        );
+        INSERT INTO anomalies VALUES
+            ('a', 'SPIKE', '2026-03-01 10:00+00', 'S1', 'ph', 8.5, NULL, 48.85, 2.35),
+            ('b', 'DRIFT', '2026-03-01 11:00+00', 'S1', 'ph', 8.6, NULL, 48.86, 2.36);
+    """)
+    await sync_events.ensure_sync_tables(dst)
+    await dst.execute(migrations.CREATE_BACKFILL_SLICES_TABLE)
+
+    async def load(dst, rows):
+        # Chargement PostGIS remplacé : 'a' est nouvelle, 'b' existait déjà
+        return [dict(rows[0])], 1, 0
+
+    monkeypatch.setattr(backfill, "_load_with_retry", load)
+    day = datetime(2026, 3, 1, tzinfo=UTC)
+    slices = [(day, day + timedelta(days=1)), (day + timedelta(days=1), day + timedelta(days=2))]
+    await dst.executemany("INSERT INTO etl_backfill_slices (slice_start, slice_end) VALUES ($1, $2)", slices)
+
+    totals = {"read": 0, "inserted": 0}
+    counts = await backfill.process_slice(src, dst, *slices[0], 10, totals)
+    assert counts == {"read": 2, "inserted": 1, "duplicates": 1, "rejected": 0}
+
+    # Lecture directe : current_version vérifie les tables dans public, pas dans le schéma du test
+    version = await dst.fetchval("SELECT MAX(version) FROM etl_sync_events WHERE status = 'ok'")
+    points = await sync_events.fetch_points_since(dst, 0, version)
+    assert [tuple(p) for p in points] == [("a", "SPIKE", 2.35, 48.85)]
+
+    # Tranche vide : pas de nouvelle version, les caches restent valides
+    await backfill.process_slice(src, dst, *slices[1], 10, totals)
+    assert await dst.fetchval("SELECT MAX(version) FROM etl_sync_events") == version
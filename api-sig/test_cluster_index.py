@@ -0,0 +1,69 @@
+# Tests de l'index de clusters : mise à jour incrémentale idempotente et requêtes par bbox/zoom
+from cluster_index import MAX_ZOOM, ClusterIndex
+
+WORLD = (-180.0, -85.0, 180.0, 85.0)
+
+PARIS = [
+    ("p1", "SPIKE", 2.3522, 48.8566),
+    ("p2", "SPIKE", 2.3530, 48.8570),
+    ("p3", "DRIFT", 2.3540, 48.8575),
+]
+BIARRITZ = [("b1", "DROPOUT", -1.5586, 43.4832)]
+
+
+def _counts(features):
+    return sorted(feature["properties"]["point_count"] for feature in features)
+
+
+def test_replayed_sync_points_are_not_counted_twice():
+    index = ClusterIndex()
+    # Construction : l'index contient déjà une partie des points de la synchronisation
+    assert index.add_many(PARIS[:2]) == 2
+
+    # La synchronisation complète est rejouée : seuls les nouveaux points sont ajoutés
+    assert index.add_many(PARIS + BIARRITZ) == 2
+    assert index.add_many(PARIS + BIARRITZ) == 0
+    assert not index.add(*PARIS[0])
+
+    assert index.total_points == 4
+    assert sum(_counts(index.get_clusters(WORLD, 0))) == 4
+
+
+def test_points_without_coordinates_are_skipped():
+    index = ClusterIndex()
+    assert index.add_many([("x", "SPIKE", None, 48.0), ("y", "SPIKE", 2.0, None)]) == 0
+    assert index.total_points == 0 and index.point_ids == set()
+
+
+def test_clusters_split_with_zoom():
+    index = ClusterIndex()
+    index.add_many(PARIS + BIARRITZ)
+
+    assert _counts(index.get_clusters(WORLD, 2)) == [1, 3]
+    paris = max(index.get_clusters(WORLD, 2), key=lambda f: f["properties"]["point_count"])
+    assert paris["properties"]["cluster"] is True
+    assert paris["properties"]["dominant_type"] == "SPIKE"
+    assert paris["properties"]["types"] == {"SPIKE": 2, "DRIFT": 1}
+    lon, lat = paris["geometry"]["coordinates"]
+    assert abs(lon - 2.353) < 0.01 and abs(lat - 48.857) < 0.01
+
+    # Au zoom maximal, chaque point isolé porte son id
+    singles = index.get_clusters(WORLD, MAX_ZOOM)
+    assert _counts(singles) == [1, 1, 1, 1]
+    assert {f["properties"]["id"] for f in singles} == {"p1", "p2", "p3", "b1"}
+
+
+def test_bbox_filters_clusters():
+    index = ClusterIndex()
+    index.add_many(PARIS + BIARRITZ)
+
+    ile_de_france = (1.5, 48.0, 3.5, 49.5)
+    assert _counts(index.get_clusters(ile_de_france, 8)) == [3]
+    assert index.get_clusters((-10.0, -10.0, -5.0, -5.0), 8) == []
+
+
+def test_zoom_is_clamped_to_index_levels():
+    index = ClusterIndex()
+    index.add_many(PARIS)
+    assert index.get_clusters(WORLD, -3) == index.get_clusters(WORLD, 0)
+    assert index.get_clusters(WORLD, 40) == index.get_clusters(WORLD, MAX_ZOOM)
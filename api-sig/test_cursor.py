@@ -0,0 +1,84 @@
+# Tests des jetons de pagination par clé (timestamp, id) et de la bbox de /api/anomalies/geojson
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+import main
+from main import decode_cursor, encode_cursor, parse_bbox
+
+
+def test_cursor_round_trip():
+    position = (datetime(2026, 3, 1, 12, 30, 5, 123456, tzinfo=timezone.utc), "sensor-1|42")
+    token = encode_cursor(*position)
+    assert "=" not in token and "/" not in token and "+" not in token
+    assert decode_cursor(token) == position
+
+
+def test_cursor_keeps_timezone_offset():
+    timestamp = datetime(2026, 3, 1, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+    decoded, _ = decode_cursor(encode_cursor(timestamp, "a"))
+    assert decoded == timestamp and decoded.utcoffset() == timedelta(hours=2)
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", "WyJhIl0", "eyJhIjogMX0"])
+def test_invalid_cursor_raises_value_error(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def test_parse_bbox():
+    assert parse_bbox(" 2.2, 48.8 ,2.5,49") == [2.2, 48.8, 2.5, 49.0]
+
+
+@pytest.mark.parametrize("bbox", [None, "", "1,2,3", "1,2,3,4,5", "a,b,c,d"])
+def test_invalid_bbox_is_ignored(bbox):
+    assert parse_bbox(bbox) is None
+
+
+class FakeAdmission:
+    """Contrôle d'admission prêt, dont la connexion enregistre la requête reçue"""
+
+    def __init__(self):
+        self.ready = True
+        self.queries = []
+
+    @asynccontextmanager
+    async def acquire(self, endpoint):
+        yield self
+
+    async def fetch(self, query, *params):
+        self.queries.append((query, params))
+        return []
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    fake = FakeAdmission()
+    monkeypatch.setattr(main, "admission", fake)
+    main.response_cache.entries.clear()
+    return fake
+
+
+async def _geojson(params):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/api/anomalies/geojson", params=params)
+
+
+@pytest.mark.asyncio
+async def test_geojson_filters_on_bbox(admission):
+    response = await _geojson({"bbox": "2.2,48.8,2.5,49"})
+    assert response.status_code == 200
+    query, params = admission.queries[0]
+    assert "ST_MakeEnvelope($2, $3, $4, $5, 4326)" in query
+    assert params[1:5] == (2.2, 48.8, 2.5, 49.0)
+
+
+@pytest.mark.parametrize("bbox", ["1,2,3", "a,b,c,d"])
+@pytest.mark.asyncio
+async def test_geojson_rejects_malformed_bbox(admission, bbox):
+    response = await _geojson({"bbox": bbox})
+    assert response.status_code == 400 and "bbox" in response.json()["detail"]
+    assert admission.queries == []
@@ -116,6 +116,7 @@ async def test_sync():
     
     try:
         import etl_anomalies
+        await etl_anomalies.bootstrap()
         await etl_anomalies.sync_anomalies()
         print("\n✅ Test de synchronisation terminé")
     except Exception as e:
@@ -0,0 +1,88 @@
+# Tests des volumes estimés (etl_metrics.estimate_rows) et de l'enregistrement d'une exécution complète
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import etl_anomalies
+import etl_metrics
+import migrations
+import sync_state
+
+CREATE_ANOMALIES = """
+    CREATE TABLE anomalies_gis (
+        id TEXT NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL
+    ) PARTITION BY RANGE (timestamp);
+    CREATE TABLE anomalies_gis_p202601 PARTITION OF anomalies_gis
+        FOR VALUES FROM ('2026-01-01 00:00:00+00') TO ('2026-02-01 00:00:00+00');
+    CREATE TABLE anomalies_gis_p202602 PARTITION OF anomalies_gis
+        FOR VALUES FROM ('2026-02-01 00:00:00+00') TO ('2026-03-01 00:00:00+00');
+"""
+
+INSERT_ANOMALIES = """
+    INSERT INTO anomalies_gis
+    SELECT g::text, TIMESTAMPTZ '2026-01-20 00:00:00+00' + g * interval '1 day' FROM generate_series(1, 30) g;
+    ANALYZE anomalies_gis;
+"""
+
+WATERMARK = (datetime(2026, 2, 18, 12, 0, tzinfo=timezone.utc), "s1|42")
+
+
+@pytest.mark.asyncio
+async def test_estimate_missing_or_never_analyzed_table(gis_connect):
+    conn = await gis_connect()
+    assert await etl_metrics.estimate_rows(conn, "anomalies_gis") is None
+    await conn.execute(CREATE_ANOMALIES)
+    assert await etl_metrics.estimate_rows(conn, "anomalies_gis") is None
+
+
+@pytest.mark.asyncio
+async def test_estimate_sums_partitions(gis_connect):
+    conn = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    await conn.execute(INSERT_ANOMALIES)
+    assert await etl_metrics.estimate_rows(conn, "anomalies_gis") == 30
+
+
+@pytest.mark.asyncio
+async def test_estimate_uses_timescaledb_approximate_row_count(gis_connect):
+    conn = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    await conn.execute(INSERT_ANOMALIES)
+    # Fonction de TimescaleDB : compte aussi les chunks compressés, absents de reltuples
+    await conn.execute("""
+        CREATE FUNCTION approximate_row_count(relation regclass) RETURNS bigint
+        LANGUAGE sql AS 'SELECT 1234::bigint'
+    """)
+    assert await etl_metrics.estimate_rows(conn, "anomalies_gis") == 1234
+    assert await etl_metrics.estimate_rows(conn, "missing") is None
+
+
+@pytest.mark.asyncio
+async def test_record_full_run(gis_connect, monkeypatch):
+    conn = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    await conn.execute(INSERT_ANOMALIES)
+    await etl_metrics.ensure_runs_table(conn)
+    await migrations._runs_setup_ms(conn)
+    await sync_state.ensure_sync_state_table(conn)
+    await sync_state.advance_watermark(conn, *WATERMARK)
+    metrics = etl_metrics.EtlMetrics()
+    monkeypatch.setattr(etl_anomalies, "metrics", metrics)
+
+    stats = {
+        "read": 12, "inserted": 10, "duplicates": 1, "rejected": 1, "errors": 0, "aborted": 0,
+        "batches": 2, "batch_ms": [40.0, 60.0],
+    }
+    started_at = datetime.now(timezone.utc)
+    await etl_anomalies.record_full_run(conn, started_at, time.perf_counter(), 5.0, stats, None, 500)
+
+    run = await conn.fetchrow("SELECT * FROM etl_runs")
+    assert run['status'] == "ok" and run['error'] is None
+    assert (run['rows_read'], run['inserted'], run['duplicates'], run['rejected'], run['batches']) == (12, 10, 1, 1, 2)
+    assert run['batch_p50_ms'] == 60.0 and run['batch_max_ms'] == 60.0 and run['setup_ms'] == 5.0
+    assert run['watermark'] == WATERMARK[0]
+    assert (run['source_rows_estimate'], run['target_rows_estimate']) == (500, 30)
+    assert metrics.totals["runs"] == 1 and metrics.totals["inserted"] == 10
+    assert metrics.last_run["started_at"] == started_at.isoformat()
@@ -0,0 +1,94 @@
+# Tests des exports binaires : relecture des flux Arrow IPC, Parquet et FlatGeobuf produits
+import asyncio
+import io
+import struct
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import export_formats
+
+ROWS = [
+    {"id": "a|1", "type": "SPIKE", "timestamp": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+     "sensor_id": "S1", "parameter": "ph", "value": 8.5, "message": "Ph spike",
+     "longitude": 2.35, "latitude": 48.85},
+    {"id": "b|2", "type": "DROPOUT", "timestamp": datetime(2026, 1, 2, 3, 5, tzinfo=timezone.utc),
+     "sensor_id": "S2", "parameter": None, "value": None, "message": None,
+     "longitude": -1.5, "latitude": 43.3},
+    {"id": "c|3", "type": "DRIFT", "timestamp": datetime(2026, 1, 2, 4, 0, tzinfo=timezone.utc),
+     "sensor_id": "S1", "parameter": "flow", "value": 120, "message": "Flow drift",
+     "longitude": 2.36, "latitude": 48.86},
+]
+
+
+async def _chunks(items):
+    for item in items:
+        yield item
+
+
+def _encode(encoder, items) -> bytes:
+    async def collect():
+        return [chunk async for chunk in encoder(_chunks(items))]
+    return b"".join(asyncio.run(collect()))
+
+
+def _batches():
+    # Deux paquets, comme deux fetch successifs du curseur d'export
+    return [export_formats.rows_to_batch(ROWS[:2]), export_formats.rows_to_batch(ROWS[2:])]
+
+
+def _expected_table():
+    return pa.Table.from_batches(_batches(), schema=export_formats.EXPORT_SCHEMA)
+
+
+def test_rows_to_batch_casts_numeric_values():
+    batch = export_formats.rows_to_batch(ROWS)
+    assert batch.schema == export_formats.EXPORT_SCHEMA
+    assert batch.column("value").to_pylist() == [8.5, None, 120.0]
+
+
+def test_arrow_stream_round_trip():
+    data = _encode(export_formats.encode_arrow, _batches())
+    assert data.endswith(export_formats.ARROW_EOS)
+    table = pa.ipc.open_stream(data).read_all()
+    assert table.equals(_expected_table())
+
+
+def test_parquet_round_trip_with_one_row_group_per_batch():
+    data = _encode(export_formats.encode_parquet, _batches())
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.metadata.num_row_groups == 2
+    assert parquet.read().equals(_expected_table())
+
+
+def test_flatgeobuf_layout():
+    data = _encode(export_formats.encode_flatgeobuf, [ROWS[:2], ROWS[2:]])
+    assert data.startswith(export_formats.FGB_MAGIC)
+
+    # En-tête puis une feature par ligne, chacun préfixé par sa taille (uint32)
+    offset = len(export_formats.FGB_MAGIC)
+    sizes = []
+    while offset < len(data):
+        (size,) = struct.unpack_from("<I", data, offset)
+        sizes.append(size)
+        offset += 4 + size
+    assert offset == len(data)
+    assert len(sizes) == 1 + len(ROWS)
+
+
+def test_flatgeobuf_read_by_gdal(tmp_path):
+    pyogrio = pytest.importorskip("pyogrio")
+    path = tmp_path / "anomalies.fgb"
+    path.write_bytes(_encode(export_formats.encode_flatgeobuf, [ROWS[:2], ROWS[2:]]))
+
+    info = pyogrio.read_info(path)
+    assert info["crs"] == "EPSG:4326" and info["geometry_type"] == "Point"
+    assert list(info["fields"]) == [name for name, _ in export_formats.FGB_COLUMNS]
+
+    _, _, geometries, fields = pyogrio.raw.read(path)
+    points = [struct.unpack("<BIdd", wkb)[2:] for wkb in geometries]
+    assert points == [(row["longitude"], row["latitude"]) for row in ROWS]
+    assert list(fields[0]) == [row["id"] for row in ROWS]
+    assert list(fields[4]) == ["ph", None, "flow"]
@@ -0,0 +1,106 @@
+# Tests de la création des partitions mensuelles pendant que des writers chargent des batches,
+# et de la rétention (drop_expired_partitions)
+import asyncio
+from datetime import date, datetime, timezone
+
+import pytest
+
+import partitions
+import rollups
+
+# anomalies_gis sans géométrie : seules la clé et le partitionnement comptent ici
+CREATE_ANOMALIES = """
+    CREATE TABLE anomalies_gis (
+        id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+"""
+
+JANUARY = datetime(2026, 1, 15, tzinfo=timezone.utc)
+MARCH = datetime(2026, 3, 15, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def empty_partition_cache():
+    partitions.reset_cache()
+    yield
+    partitions.reset_cache()
+
+
+@pytest.mark.asyncio
+async def test_partitions_are_attached_while_a_writer_transaction_is_open(gis_connect):
+    conn = await gis_connect()
+    writer = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    await partitions.ensure_partitions(conn, JANUARY, JANUARY)
+
+    # Writer en attente de son tour de validation, transaction ouverte sur anomalies_gis
+    transaction = writer.transaction()
+    await transaction.start()
+    await writer.execute("INSERT INTO anomalies_gis VALUES ('a', 'SPIKE', $1)", JANUARY)
+
+    await asyncio.wait_for(partitions.ensure_partitions(conn, JANUARY, MARCH), timeout=5)
+
+    await writer.execute("INSERT INTO anomalies_gis VALUES ('b', 'SPIKE', $1)", MARCH)
+    await transaction.commit()
+
+    assert sorted((await partitions.list_partitions(conn)).values()) == [
+        "anomalies_gis_p202601", "anomalies_gis_p202602", "anomalies_gis_p202603"
+    ]
+    # La clé primaire de la table mère s'applique aux partitions attachées
+    with pytest.raises(Exception, match="duplicate key"):
+        await conn.execute("INSERT INTO anomalies_gis VALUES ('b', 'DRIFT', $1)", MARCH)
+
+
+@pytest.mark.asyncio
+async def test_partition_attached_by_another_process_is_reused(gis_connect):
+    conn = await gis_connect()
+    other = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    await partitions.ensure_partitions(other, MARCH, MARCH)
+
+    # Cache mémoire propre à chaque processus : celui-ci ignore la partition de mars
+    partitions.reset_cache()
+    await partitions.ensure_partitions(conn, MARCH, MARCH)
+    assert list((await partitions.list_partitions(conn)).values()) == ["anomalies_gis_p202603"]
+
+
+@pytest.mark.parametrize("now, months, cutoff", [
+    (datetime(2026, 3, 15, tzinfo=timezone.utc), 2, date(2026, 1, 1)),
+    (datetime(2026, 3, 1, tzinfo=timezone.utc), 3, date(2025, 12, 1)),
+    (datetime(2026, 1, 31, 23, 59, tzinfo=timezone.utc), 1, date(2025, 12, 1)),
+    (datetime(2026, 12, 5, tzinfo=timezone.utc), 12, date(2025, 12, 1)),
+    (datetime(2026, 2, 10, tzinfo=timezone.utc), 25, date(2024, 1, 1)),
+    # 1er mars à 00:30 à Paris : encore février en UTC
+    (datetime.fromisoformat("2026-03-01T00:30:00+01:00"), 1, date(2026, 1, 1)),
+])
+def test_retention_cutoff(now, months, cutoff):
+    assert partitions.retention_cutoff(now, months) == cutoff
+
+
+@pytest.mark.asyncio
+async def test_drop_expired_partitions_detaches_then_drops_with_rollups(gis_connect):
+    conn = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    for table in rollups.ROLLUP_TABLES:
+        await conn.execute(f"CREATE TABLE {table} (day DATE NOT NULL)")
+
+    cutoff = partitions.retention_cutoff(datetime.now(timezone.utc), 2)
+    oldest, expired, kept = (partitions.add_months(cutoff, n) for n in (-2, -1, 0))
+    await partitions.ensure_partitions(conn, oldest, kept)
+    for table in rollups.ROLLUP_TABLES:
+        await conn.executemany(f"INSERT INTO {table} VALUES ($1)", [(oldest,), (expired,), (kept,)])
+    # Détachée lors d'une exécution interrompue, pas encore supprimée
+    await conn.execute(f"ALTER TABLE anomalies_gis DETACH PARTITION {partitions.partition_name(oldest)}")
+
+    dropped = await partitions.drop_expired_partitions(conn, months=2)
+
+    assert dropped == [partitions.partition_name(oldest), partitions.partition_name(expired)]
+    assert list(await partitions.list_partitions(conn)) == [kept]
+    for name in dropped:
+        assert await conn.fetchval("SELECT to_regclass($1)", name) is None
+    for table in rollups.ROLLUP_TABLES:
+        assert await conn.fetchval(f"SELECT array_agg(day) FROM {table}") == [kept]
+    assert await partitions.drop_expired_partitions(conn, months=2) == []
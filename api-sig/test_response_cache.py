@@ -0,0 +1,141 @@
+# Tests du cache de réponses : négociation de l'encodage, ETag/304, budget mémoire et compression
+import asyncio
+import gzip
+import threading
+
+import brotli
+import pytest
+
+import response_cache
+from response_cache import CachedBody, CachedResponseMiddleware, ResponseCache, negotiate_encoding
+
+BODY = b'{"type": "FeatureCollection", "features": []}' * 100
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0, gzip;q=0.5", "gzip"),
+    ("zstd, gzip", "zstd"),
+    ("*", "br"),
+    ("br;q=abc", None),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+class FakeApp:
+    """Endpoint ASGI qui compte ses appels"""
+
+    def __init__(self, status=200, body=BODY):
+        self.calls = 0
+        self.status = status
+        self.body = body
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": self.body})
+
+
+async def _get(middleware, headers=(), path="/api/anomalies/geojson", query=b"days=7"):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": path, "query_string": query,
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+    }
+    await middleware(scope, None, send)
+    start, body = messages
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body["body"]
+
+
+@pytest.mark.asyncio
+async def test_etag_and_conditional_get():
+    app = FakeApp()
+    middleware = CachedResponseMiddleware(app, ResponseCache(), ["/api/anomalies/geojson"])
+
+    status, headers, body = await _get(middleware)
+    assert status == 200 and body == BODY
+    etag = headers["etag"]
+
+    # Même requête : servie depuis le cache, sans rappeler l'endpoint
+    status, headers, body = await _get(middleware, [("accept-encoding", "gzip")])
+    assert status == 200 and app.calls == 1
+    assert headers["content-encoding"] == "gzip" and gzip.decompress(body) == BODY
+
+    # ETag à jour : 304 sans corps
+    status, headers, body = await _get(middleware, [("if-none-match", etag)])
+    assert status == 304 and body == b"" and app.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_new_data_version_changes_etag():
+    cache = ResponseCache()
+    middleware = CachedResponseMiddleware(FakeApp(), cache, ["/api/anomalies/geojson"])
+    _, headers, _ = await _get(middleware)
+
+    cache.set_version(42)
+    status, new_headers, _ = await _get(middleware, [("if-none-match", headers["etag"])])
+    assert status == 200 and new_headers["etag"] != headers["etag"]
+    assert new_headers["etag"].startswith('"v42-')
+
+
+@pytest.mark.asyncio
+async def test_errors_are_not_cached():
+    app = FakeApp(status=503, body=b'{"detail": "busy"}')
+    middleware = CachedResponseMiddleware(app, ResponseCache(), ["/api/anomalies/geojson"])
+    await _get(middleware)
+    status, headers, _ = await _get(middleware)
+    assert status == 503 and "etag" not in headers and app.calls == 2
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=2500)
+    for key in ("a", "b", "c"):
+        cache.put(key, CachedBody(cache.etag_for(key), b"x" * 1000, "application/json"))
+    assert list(cache.entries) == ["b", "c"] and cache.size == 2000
+
+    # Plus gros que le budget : servi mais pas retenu
+    cache.put("big", CachedBody(cache.etag_for("big"), b"x" * 3000, "application/json"))
+    assert "big" not in cache.entries and cache.size == 2000
+
+
+@pytest.mark.asyncio
+async def test_compressed_copies_count_in_budget():
+    cache = ResponseCache(max_bytes=len(BODY) * 2)
+    first = CachedBody(cache.etag_for("a"), BODY, "application/json")
+    cache.put("a", first)
+    cache.put("b", CachedBody(cache.etag_for("b"), BODY, "application/json"))
+
+    compressed = await cache.encode("b", cache.entries["b"], "br")
+    assert brotli.decompress(compressed) == BODY
+    # La copie compressée de "b" dépasse le budget : "a" est évincée
+    assert list(cache.entries) == ["b"]
+    assert cache.size == len(BODY) + len(compressed)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_compression_off_the_event_loop(monkeypatch):
+    calls = []
+    loop_thread = threading.get_ident()
+
+    def encoder(body):
+        calls.append(threading.get_ident())
+        return gzip.compress(body)
+
+    monkeypatch.setitem(response_cache.ENCODERS, "gzip", encoder)
+    cache = ResponseCache()
+    entry = CachedBody(cache.etag_for("a"), BODY, "application/json")
+    cache.put("a", entry)
+
+    results = await asyncio.gather(*(cache.encode("a", entry, "gzip") for _ in range(5)))
+    assert len(calls) == 1 and calls[0] != loop_thread
+    assert all(gzip.decompress(data) == BODY for data in results)
+    assert entry.pending == {}
@@ -0,0 +1,180 @@
+# Tests des endpoints servis par les rollups, comparés aux agrégats calculés sur anomalies_gis
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+import main
+import rollups
+from main import grid_cell_ranges, select_grid_level
+
+# Colonnes de anomalies_gis lues par le rollup journalier (sans géométrie)
+CREATE_ANOMALIES = """
+    CREATE TABLE anomalies_gis (
+        id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        sensor_id TEXT,
+        parameter TEXT,
+        value NUMERIC
+    );
+"""
+
+# Une anomalie par capteur, paramètre et jour, de aujourd'hui à J-10 (jours UTC)
+INSERT_ANOMALIES = """
+    INSERT INTO anomalies_gis (id, type, timestamp, sensor_id, parameter, value)
+    SELECT
+        format('%s-%s-%s', d, s, p), 'SPIKE',
+        date_trunc('day', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' - d * interval '1 day' + interval '1 minute',
+        'sensor-' || s, p, d * 10 + s
+    FROM generate_series(0, 10) d, generate_series(1, 2) s, unnest(ARRAY['ph', 'temperature']) p
+"""
+
+
+# Pyramide de grilles sans l'initialisation depuis anomalies_gis (qui requiert PostGIS)
+CREATE_GRID_PYRAMID = """
+    CREATE TABLE anomalies_grid_pyramid (
+        level SMALLINT NOT NULL,
+        day DATE NOT NULL,
+        cell_x INTEGER NOT NULL,
+        cell_y INTEGER NOT NULL,
+        anomaly_count BIGINT NOT NULL,
+        PRIMARY KEY (level, day, cell_x, cell_y)
+    );
+"""
+
+
+class RollupAdmission:
+    """Contrôle d'admission prêt qui prête la connexion de test à tous les endpoints"""
+
+    def __init__(self, conn):
+        self.ready = True
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self, endpoint):
+        yield self.conn
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    def serve(conn):
+        monkeypatch.setattr(main, "admission", RollupAdmission(conn))
+        main.response_cache.entries.clear()
+    return serve
+
+
+async def _get(path, params=None):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get(path, params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.parametrize("days", [1, 7])
+@pytest.mark.asyncio
+async def test_historical_matches_raw_aggregate(gis_connect, serve, days):
+    conn = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    await conn.execute(INSERT_ANOMALIES)
+    await conn.execute(rollups.ROLLUP_TABLES["anomalies_daily_rollup"])
+    serve(conn)
+
+    body = await _get("/api/historical", {"days": days})
+
+    # `days` jours calendaires UTC, aujourd'hui inclus
+    expected = await conn.fetch("""
+        SELECT
+            DATE(timestamp AT TIME ZONE 'UTC') AS day, parameter,
+            COUNT(*) AS anomaly_count, AVG(value) AS avg_value, MIN(value) AS min_value, MAX(value) AS max_value
+        FROM anomalies_gis
+        WHERE timestamp >= (date_trunc('day', NOW() AT TIME ZONE 'UTC') - ($1 - 1) * interval '1 day') AT TIME ZONE 'UTC'
+        GROUP BY 1, 2
+        ORDER BY 1 DESC, 2
+    """, days)
+    assert len({row['date'] for row in body['data']}) == days
+    assert [
+        (row['date'], row['parameter'], row['anomaly_count'],
+         row['statistics']['avg_value'], row['statistics']['min_value'], row['statistics']['max_value'])
+        for row in body['data']
+    ] == [
+        (row['day'].isoformat(), row['parameter'], row['anomaly_count'],
+         pytest.approx(float(row['avg_value'])), float(row['min_value']), float(row['max_value']))
+        for row in expected
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stats_last_7_days_matches_raw_count(gis_connect, serve):
+    conn = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    await conn.execute(INSERT_ANOMALIES)
+    await conn.execute(rollups.ROLLUP_TABLES["anomalies_counters"])
+    serve(conn)
+
+    body = await _get("/api/stats")
+
+    assert body['total_anomalies'] == await conn.fetchval("SELECT COUNT(*) FROM anomalies_gis")
+    # 7 jours x 2 capteurs x 2 paramètres
+    assert body['last_7_days'] == 28 == await conn.fetchval("""
+        SELECT COUNT(*) FROM anomalies_gis
+        WHERE timestamp >= (date_trunc('day', NOW() AT TIME ZONE 'UTC') - interval '6 days') AT TIME ZONE 'UTC'
+    """)
+
+
+@pytest.mark.parametrize("zoom, level", [(0, 0), (6, 0), (7, 1), (10, 1), (11, 2), (18, 2)])
+def test_grid_level_by_zoom(zoom, level):
+    # Le zoom l'emporte sur l'étendue de la bbox
+    assert select_grid_level(zoom, [-180, -90, 180, 90]) == level
+
+
+@pytest.mark.parametrize("coords, level", [
+    (None, 1),
+    ([-5, 41, 10, 51], 0),
+    ([2, 48, 3.5, 49], 1),
+    ([2.2, 48.8, 2.5, 49], 2),
+    ([0, 0, 1, 1], 2),
+    ([0, 0, 0, 20], 0),
+    # Traverse l'antiméridien : 2° de large, pas 358°
+    ([179, -17, -179, -16], 1),
+    ([170, -17, -170, -16], 0),
+])
+def test_grid_level_by_extent(coords, level):
+    assert select_grid_level(None, coords) == level
+
+
+@pytest.mark.parametrize("coords, cells_per_degree, expected", [
+    ([2.25, 48.8, 2.5, 49], 10, ([(22, 25)], (488, 490))),
+    ([-0.05, -0.05, 0.05, 0.05], 10, ([(-1, 0)], (-1, 0))),
+    # Bords de la grille, points des bords 180° et 90° compris
+    ([-180, -90, 180, 90], 1, ([(-180, 180)], (-90, 90))),
+    ([-200, -95, 200, 95], 100, ([(-18000, 18000)], (-9000, 9000))),
+    ([170, 85, 180, 90], 10, ([(1700, 1800)], (850, 900))),
+    # Traverse l'antiméridien : deux intervalles en x
+    ([179.5, -17, -179.5, -16], 10, ([(1795, 1800), (-1800, -1795)], (-170, -160))),
+    ([179, 0, -181, 1], 1, ([(179, 180), (-180, -180)], (0, 1))),
+])
+def test_grid_cell_ranges(coords, cells_per_degree, expected):
+    assert grid_cell_ranges(coords, cells_per_degree) == expected
+
+
+@pytest.mark.asyncio
+async def test_zones_cover_days_and_antimeridian(gis_connect, serve):
+    conn = await gis_connect()
+    await conn.execute(CREATE_GRID_PYRAMID)
+    # Une anomalie par jour (aujourd'hui à J-10) de part et d'autre de l'antiméridien, et une à Paris
+    await conn.execute("""
+        INSERT INTO anomalies_grid_pyramid (level, day, cell_x, cell_y, anomaly_count)
+        SELECT 0, (NOW() AT TIME ZONE 'UTC')::date - d, x, y, 1
+        FROM generate_series(0, 10) d, (VALUES (179, -17), (-180, -17), (2, 48)) c(x, y)
+    """)
+    serve(conn)
+
+    body = await _get("/api/zones/communes", {"days": 7, "zoom": 5, "bbox": "178,-18,-178,-15"})
+
+    cells = {
+        (f['geometry']['coordinates'][0][0][0], f['properties']['anomaly_count'])
+        for f in body['features']
+    }
+    assert cells == {(179.0, 7), (-180.0, 7)}
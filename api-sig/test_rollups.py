@@ -0,0 +1,69 @@
+# Tests de la réconciliation des compteurs de /api/stats (rollups.reconcile_counters)
+import asyncio
+
+import pytest
+
+import rollups
+
+# Colonnes de anomalies_gis lues par la réconciliation (sans géométrie)
+CREATE_ANOMALIES = """
+    CREATE TABLE anomalies_gis (
+        id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        parameter TEXT
+    );
+"""
+
+
+async def _insert(conn, first, last, anomaly_type="SPIKE", parameter="ph"):
+    await conn.execute("""
+        INSERT INTO anomalies_gis (id, type, timestamp, parameter)
+        SELECT g::text, $3, NOW(), $4 FROM generate_series($1::int, $2::int) g
+    """, first, last, anomaly_type, parameter)
+
+
+async def _counters(conn):
+    rows = await conn.fetch("SELECT type, parameter, anomaly_count FROM anomalies_counters ORDER BY 1, 2")
+    return [tuple(row) for row in rows]
+
+
+@pytest.mark.asyncio
+async def test_reconcile_fixes_drift_and_drops_vanished_keys(gis_connect):
+    conn = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    await _insert(conn, 1, 10)
+    await conn.execute(rollups.ROLLUP_TABLES["anomalies_counters"])
+    await conn.execute("""
+        UPDATE anomalies_counters SET anomaly_count = 3;
+        INSERT INTO anomalies_counters VALUES ('2000-01-01', 'DRIFT', '', 5);
+    """)
+
+    assert await rollups.reconcile_counters(conn) == 2
+    assert await _counters(conn) == [("SPIKE", "ph", 10)]
+    assert await rollups.reconcile_counters(conn) == 0
+
+
+@pytest.mark.asyncio
+async def test_reconcile_keeps_concurrent_increments(gis_connect):
+    conn = await gis_connect()
+    writer = await gis_connect()
+    await conn.execute(CREATE_ANOMALIES)
+    await _insert(conn, 1, 10)
+    await conn.execute(rollups.ROLLUP_TABLES["anomalies_counters"])
+    await conn.execute("UPDATE anomalies_counters SET anomaly_count = 3")
+
+    # Batch de l'ETL en cours : lignes et incrément dans la même transaction (staging.load_batch)
+    transaction = writer.transaction()
+    await transaction.start()
+    await _insert(writer, 11, 14)
+    await writer.execute("UPDATE anomalies_counters SET anomaly_count = anomaly_count + 4")
+
+    reconcile = asyncio.create_task(rollups.reconcile_counters(conn))
+    await asyncio.sleep(0.2)
+    await transaction.commit()
+    await reconcile
+
+    # L'incrément validé pendant la réconciliation n'est pas écrasé
+    assert await _counters(conn) == [("SPIKE", "ph", 14)]
+    assert await rollups.reconcile_counters(conn) == 0
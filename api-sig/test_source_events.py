@@ -0,0 +1,61 @@
+# Tests du regroupement des notifications d'insertion en micro-batches (NotifyDebouncer)
+import asyncio
+import time
+
+import pytest
+
+from source_events import CHANNEL, NotifyDebouncer
+
+
+def _notify(debouncer, payload):
+    debouncer.on_notify(None, 1, CHANNEL, payload)
+
+
+@pytest.mark.asyncio
+async def test_timeout_without_signal():
+    assert await NotifyDebouncer(10, 100).wait(0.01) is None
+
+
+@pytest.mark.asyncio
+async def test_signals_within_quiet_period_form_one_batch():
+    debouncer = NotifyDebouncer(50, 1000)
+
+    async def burst():
+        for epoch in ("1000.5", "999.25", "1001"):
+            _notify(debouncer, epoch)
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(burst())
+    assert await debouncer.wait(1) == (3, 999.25)
+    await task
+
+    # État remis à zéro pour le micro-batch suivant
+    assert await debouncer.wait(0.01) is None
+
+
+@pytest.mark.asyncio
+async def test_max_wait_bounds_a_continuous_stream():
+    debouncer = NotifyDebouncer(50, 150)
+
+    async def stream():
+        while True:
+            _notify(debouncer, str(time.time()))
+            await asyncio.sleep(0.02)
+
+    task = asyncio.create_task(stream())
+    started = time.monotonic()
+    try:
+        signals, _ = await debouncer.wait(1)
+    finally:
+        task.cancel()
+    assert 0.14 <= time.monotonic() - started < 0.5
+    assert signals >= 5
+
+
+@pytest.mark.asyncio
+async def test_invalid_payload_uses_reception_time():
+    debouncer = NotifyDebouncer(0, 0)
+    before = time.time()
+    _notify(debouncer, "not-an-epoch")
+    _, oldest = await debouncer.wait(1)
+    assert before <= oldest <= time.time()
@@ -0,0 +1,63 @@
+# Tests du classement des lignes de staging en rejets (staging.record_rejects)
+from datetime import datetime, timezone
+
+import pytest
+
+import staging
+
+TIMESTAMP = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+ROWS = [
+    ("a", "SPIKE", TIMESTAMP, "S1", "ph", 8.5, None, 48.85, 2.35),
+    ("b", "SPIKE", TIMESTAMP, "S1", "ph", 8.5, None, None, None),
+    ("c", "SPIKE", TIMESTAMP, "S1", "ph", 8.5, None, 95.0, 2.35),
+    (None, "SPIKE", TIMESTAMP, "S1", "ph", 8.5, None, 48.85, 2.35),
+]
+
+
+async def _stage(conn, rows):
+    await conn.copy_records_to_table(
+        "anomalies_gis_staging", records=rows, columns=staging.STAGING_COLUMNS
+    )
+
+
+async def _rejects(conn):
+    rows = await conn.fetch("SELECT id, reason FROM anomalies_gis_rejects ORDER BY id NULLS FIRST, reason")
+    return [tuple(row) for row in rows]
+
+
+@pytest.mark.asyncio
+async def test_rejects_are_classified_once_across_rereads(gis_connect):
+    conn = await gis_connect()
+    await staging.ensure_rejects_table(conn)
+    await staging.ensure_rejects_key(conn)
+    await conn.execute(staging.CREATE_STAGING_TABLE)
+
+    for expected in (3, 0):
+        # Relecture de la marge de reprise : mêmes lignes, aucun nouveau rejet
+        async with conn.transaction():
+            await _stage(conn, ROWS)
+            assert await staging.record_rejects(conn) == expected
+
+    assert await _rejects(conn) == [
+        (None, "id manquant"),
+        ("b", "coordonnées manquantes"),
+        ("c", "coordonnées hors limites"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rejects_key_migration_drops_existing_duplicates(gis_connect):
+    conn = await gis_connect()
+    await staging.ensure_rejects_table(conn)
+    await conn.execute("""
+        INSERT INTO anomalies_gis_rejects (id, timestamp, reason)
+        SELECT 'b', $1::timestamptz, 'coordonnées manquantes' FROM generate_series(1, 3)
+        UNION ALL SELECT 'b', $1, 'coordonnées hors limites'
+    """, TIMESTAMP)
+
+    await staging.ensure_rejects_key(conn)
+    assert await _rejects(conn) == [
+        ("b", "coordonnées hors limites"),
+        ("b", "coordonnées manquantes"),
+    ]
@@ -0,0 +1,44 @@
+# Tests de la marque de synchronisation et de la position de départ de l'ETL
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+
+import etl_anomalies
+import sync_state
+
+WATERMARK = (datetime(2026, 3, 1, 12, 10, tzinfo=timezone.utc), "s1|42")
+POLL_MARK = (datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc), "s1|7")
+
+
+@pytest_asyncio.fixture
+async def dst(gis_connect):
+    conn = await gis_connect()
+    await sync_state.ensure_sync_state_table(conn)
+    return conn
+
+
+@pytest.mark.asyncio
+async def test_watermark_never_moves_backwards(dst):
+    await sync_state.advance_watermark(dst, *WATERMARK)
+    await sync_state.advance_watermark(dst, *POLL_MARK)
+    assert await sync_state.get_watermark(dst) == WATERMARK
+
+
+@pytest.mark.asyncio
+async def test_micro_sync_starts_at_exact_watermark(dst):
+    await sync_state.advance_watermark(dst, *WATERMARK)
+    await sync_state.advance_watermark(dst, *POLL_MARK, source=sync_state.POLL_SOURCE)
+    assert await etl_anomalies.sync_start_position(dst, lookback=False) == WATERMARK
+
+
+@pytest.mark.asyncio
+async def test_poll_rereads_from_previous_poll_mark(dst, monkeypatch):
+    monkeypatch.setattr(etl_anomalies, "SYNC_LOOKBACK_SECONDS", 60)
+    await sync_state.advance_watermark(dst, *WATERMARK)
+    # Premier poll : pas encore de marque de poll, relecture courte derrière la marque
+    assert await etl_anomalies.sync_start_position(dst) == (WATERMARK[0] - timedelta(seconds=60), "")
+
+    # Les micro-synchronisations ont fait avancer la marque depuis le début du poll précédent
+    await sync_state.advance_watermark(dst, *POLL_MARK, source=sync_state.POLL_SOURCE)
+    assert await etl_anomalies.sync_start_position(dst) == (POLL_MARK[0] - timedelta(seconds=60), "")
@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import asyncpg
+
+# Each row is rendered as JSON by PostgreSQL, with the fields of models.Anomaly
+ROW_JSON = """
+    json_build_object(
+        'id', id,
+        'type', type,
+        'timestamp', timestamp,
+        'sensor_id', sensor_id,
+        'parameter', parameter,
+        'value', value,
+        'duration_seconds', NULL,
+        'message', message,
+        'latitude', ST_Y(geom),
+        'longitude', ST_X(geom)
+    )::text
+"""
+
+
+def encode_cursor(timestamp: datetime, anomaly_id: str) -> str:
+    """Opaque token for the (timestamp, id) position of the last anomaly of a page"""
+    payload = json.dumps([timestamp.isoformat(), anomaly_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises ValueError if the token is invalid"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, anomaly_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), str(anomaly_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def parse_bbox(bbox: str) -> List[float]:
+    """'min_lon,min_lat,max_lon,max_lat' -> 4 floats, raises ValueError otherwise"""
+    coords = [float(x.strip()) for x in bbox.split(",")]
+    if len(coords) != 4:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    return coords
+
+
+def build_page_query(
+    since: Optional[datetime],
+    until: Optional[datetime],
+    bbox: Optional[List[float]],
+    sensor_id: Optional[str],
+    anomaly_type: Optional[str],
+    after: Optional[Tuple[datetime, str]],
+    limit: int,
+) -> Tuple[str, list]:
+    """
+    Newest-first page of anomalies_gis, keyset-paginated on (timestamp, id).
+    Only the filters that are set appear in the query, so each combination is one
+    fixed query text: asyncpg prepares it once per pooled connection and reuses it.
+    """
+    conditions = ["geom IS NOT NULL"]
+    params = []
+
+    def param(value) -> str:
+        params.append(value)
+        return f"${len(params)}"
+
+    if since is not None:
+        conditions.append(f"timestamp >= {param(since)}")
+    if until is not None:
+        conditions.append(f"timestamp < {param(until)}")
+    if anomaly_type:
+        conditions.append(f"type = {param(anomaly_type)}")
+    if sensor_id:
+        conditions.append(f"sensor_id = {param(sensor_id)}")
+    if bbox:
+        conditions.append(
+            f"ST_Within(geom, ST_MakeEnvelope({param(bbox[0])}, {param(bbox[1])}, "
+            f"{param(bbox[2])}, {param(bbox[3])}, 4326))"
+        )
+    if after:
+        conditions.append(f"(timestamp, id) < ({param(after[0])}, {param(after[1])})")
+
+    # One row more than the page to know whether there is a next page
+    query = f"""
+        SELECT timestamp, id, {ROW_JSON} AS doc
+        FROM anomalies_gis
+        WHERE {' AND '.join(conditions)}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT {param(limit + 1)}
+    """
+    return query, params
+
+
+class AnomalyStore:
+    """
+    asyncpg pool for the API, opened by the app lifespan. If PostGIS is not reachable
+    at startup, the pool is created on first use instead.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool: Optional[asyncpg.Pool] = None
+        self._lock = asyncio.Lock()
+
+    async def open(self):
+        try:
+            await self.pool()
+            print(f"PostGIS pool ready ({self.min_size}-{self.max_size} connections)")
+        except Exception as e:
+            print(f"PostGIS pool not available yet, will retry on first request: {e}")
+
+    async def pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        statement_cache_size=256,
+                        # Timestamps rendered by json_build_object in UTC
+                        server_settings={"timezone": "UTC"},
+                    )
+        return self._pool
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def fetch_page(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        bbox: Optional[List[float]] = None,
+        sensor_id: Optional[str] = None,
+        anomaly_type: Optional[str] = None,
+        after: Optional[Tuple[datetime, str]] = None,
+        limit: int = 10,
+    ) -> Tuple[bytes, Optional[str]]:
+        """Returns (JSON array body, cursor of the next page or None)"""
+        query, params = build_page_query(since, until, bbox, sensor_id, anomaly_type, after, limit)
+        pool = await self.pool()
+        rows = await pool.fetch(query, *params)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+        body = b"[" + b",".join(row["doc"].encode() for row in rows) + b"]"
+        return body, next_cursor
@@ -1,18 +1,26 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 from datetime import datetime, timezone
+import asyncio
 import json
 import os
 import sys
-import httpx
+import traceback
 import asyncpg
 from py_eureka_client.eureka_client import EurekaClient
 
 from config import Config
 POSTGIS_DSN = Config.POSTGIS_DSN  # ✅ Utilisation de la config
-from models import Anomaly, AnomalySummary, HealthStatus, SensorReading
-from summarizer import LLMSummarizer
+from models import Anomaly, HealthStatus, SensorReading
+from summarizer import LLMSummarizer, RuleBasedSummarizer, AnomalySummary
+from summary_cache import SummaryCache, SummaryGenerationError
+from summary_worker import SummaryWorker, fetch_history
+from prompt_builder import AnomalyDigest, build_digest
+from health_monitor import HealthMonitor, create_http_client
+from anomaly_store import AnomalyStore, decode_cursor, parse_bbox
 
 app = FastAPI(
     title="AquaSense-Monitor Public API",
@@ -21,6 +29,17 @@ app = FastAPI(
 )
 
 llm_summarizer_instance = LLMSummarizer()
+rule_based_summarizer = RuleBasedSummarizer()
+anomaly_store = AnomalyStore(
+    POSTGIS_DSN,
+    min_size=Config.DB_POOL_MIN_SIZE,
+    max_size=Config.DB_POOL_MAX_SIZE,
+)
+summary_cache = SummaryCache(
+    llm_summarizer_instance.generate_summary,
+    ttl_seconds=Config.SUMMARY_CACHE_TTL_SECONDS,
+    stale_while_revalidate=Config.SUMMARY_STALE_WHILE_REVALIDATE,
+)
 
 # Initialize Eureka client
 eureka_client = EurekaClient(
@@ -31,6 +50,30 @@ eureka_client = EurekaClient(
 )
 eureka_client.register()
 
+# --- Lifespan: PostGIS pool, background summarizer and health monitor ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global health_monitor
+    await anomaly_store.open()
+    http_client = create_http_client()
+    health_monitor = HealthMonitor(
+        health_status_data,
+        http_client,
+        interval_seconds=Config.HEALTH_PROBE_INTERVAL_SECONDS,
+        llm_available=llm_summarizer_instance.llm is not None,
+    )
+    tasks = [asyncio.create_task(health_monitor.run())]
+    if Config.SUMMARY_WORKER_ENABLED:
+        tasks.append(asyncio.create_task(summary_worker.run()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await http_client.aclose()
+    await anomaly_store.close()
+
+app.router.lifespan_context = lifespan
+
 # --- Global State for Health Status ---
 health_status_data = {
     "sensor_simulator_active": False,
@@ -44,6 +87,8 @@ health_status_data = {
     "current_anomalies_count": 0,
     "ollama_model_loaded": False,
 }
+# Created by the lifespan with the shared HTTP client
+health_monitor: Optional[HealthMonitor] = None
 
 # URL for the anomaly detector service (non utilisé dans /summary)
 anomaly_detector_url = (
@@ -51,137 +96,215 @@ anomaly_detector_url = (
 )
 
 
-async def check_service_health(
-    service_host: str, port: int, endpoint: str = "/status", return_data=False
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+@app.get(
+    "/anomalies_from_db",
+    response_class=Response,
+    responses={
+        200: {
+            "model": List[Anomaly],
+            "description": "Page of anomalies, newest first",
+            "content": {"application/json": {}},
+            "headers": {
+                "X-Next-Cursor": {
+                    "description": "Cursor of the next page, absent on the last page",
+                    "schema": {"type": "string"},
+                },
+            },
+        },
+        400: {"description": "Malformed cursor or bbox"},
+        500: {"description": "Database error (details are only logged)"},
+    },
+)
+async def get_anomalies_from_db(
+    since: Optional[datetime] = Query(None, description="Start of the time window (inclusive)"),
+    until: Optional[datetime] = Query(None, description="End of the time window (exclusive)"),
+    bbox: Optional[str] = Query(None, description="Bounding box: min_lon,min_lat,max_lon,max_lat"),
+    sensor_id: Optional[str] = Query(None, description="Filter by sensor ID"),
+    anomaly_type: Optional[str] = Query(None, description="Filter by anomaly type (SPIKE, DRIFT, DROPOUT)"),
+    limit: int = Query(10, ge=1, le=Config.ANOMALIES_PAGE_MAX, description="Anomalies per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
 ):
+    """
+    Newest anomalies first, keyset-paginated on (timestamp, id): pass the X-Next-Cursor
+    response header as `cursor` to get the next page (absent on the last page).
+    The body is the JSON array rendered by PostgreSQL, without a model per row.
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"http://{service_host}:{port}{endpoint}", timeout=5
-            )
-            response.raise_for_status()
-            if return_data:
-                return True, response.json()
-            else:
-                return True
-    except (httpx.RequestError, httpx.HTTPStatusError):
-        return (False, None) if return_data else False
-
+        after = decode_cursor(cursor) if cursor else None
+        coords = parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-async def check_ollama_model_loaded():
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"http://{Config.OLLAMA_HOST}:{Config.OLLAMA_PORT}/api/show",
-                json={"name": Config.LLM_MODEL_NAME},
-                timeout=5,
-            )
-            response.raise_for_status()
-            return True
+        body, next_cursor = await anomaly_store.fetch_page(
+            since=_utc(since),
+            until=_utc(until),
+            bbox=coords,
+            sensor_id=sensor_id,
+            anomaly_type=anomaly_type,
+            after=after,
+            limit=limit,
+        )
     except Exception as e:
-        print(f"Ollama model check failed: {e}")
-        return False
+        # Full error in the service log only: PostGIS messages expose the schema
+        print(f"🚨 Erreur PostGIS (/anomalies_from_db): {e!r}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Failed to read anomalies from the database")
 
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
 
-@app.get("/anomalies_from_db", response_model=List[Anomaly])
-async def get_anomalies_from_db():
+# Summary input: the whole window of anomalies_gis aggregated in SQL, rendered as a
+# compact table within the prompt token budget
+async def get_summary_input() -> AnomalyDigest:
     try:
-        conn = await asyncpg.connect(POSTGIS_DSN)
-        rows = await conn.fetch("""
-            SELECT 
-                id, 
-                type, 
-                timestamp, 
-                sensor_id, 
-                parameter, 
-                value, 
-                message,
-                ST_X(geom) AS longitude,
-                ST_Y(geom) AS latitude
-            FROM anomalies_gis
-            WHERE geom IS NOT NULL
-            ORDER BY timestamp DESC
-            LIMIT 10
-        """)
-        await conn.close()
-
-        anomalies = []
-        for row in rows:
-            anomaly_data = {
-                "id": row["id"],
-                "type": row["type"],
-                "timestamp": row["timestamp"],
-                "sensor_id": row["sensor_id"],
-                "parameter": row["parameter"],
-                "value": row["value"],
-                "message": row["message"],
-                "latitude": float(row["latitude"]) if row["latitude"] is not None else None,
-                "longitude": float(row["longitude"]) if row["longitude"] is not None else None,
-                # ⚠️ duration_seconds n'existe PAS → on met None (compatible avec le modèle Pydantic)
-                "duration_seconds": None
-            }
-            anomalies.append(Anomaly(**anomaly_data))
-
-        return anomalies
-
+        pool = await anomaly_store.pool()
+        async with pool.acquire() as conn:
+            return await build_digest(
+                conn,
+                Config.SUMMARY_WINDOW_HOURS,
+                Config.SUMMARY_BUCKET_MINUTES,
+                Config.SUMMARY_PROMPT_TOKEN_BUDGET,
+            )
     except Exception as e:
-        # 🔥 Ajoutez un log explicite pour voir l'erreur en production
         print(f"🚨 Erreur PostGIS: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur PostGIS : {str(e)}")
 
+
 # ✅ Endpoint /summary : utilise les anomalies de PostGIS
+summary_worker = SummaryWorker(
+    POSTGIS_DSN,
+    get_summary_input,
+    summary_cache,
+    poll_seconds=Config.SUMMARY_POLL_SECONDS,
+    debounce_seconds=Config.SUMMARY_DEBOUNCE_SECONDS,
+    min_interval_seconds=Config.SUMMARY_MIN_INTERVAL_SECONDS,
+    generation_timeout_seconds=Config.SUMMARY_GENERATION_TIMEOUT_SECONDS,
+    max_age_seconds=Config.SUMMARY_MAX_AGE_SECONDS,
+)
+
+
+# Latest summary precomputed by the background worker; until the first one exists,
+# identical anomaly sets share one cached (or in-flight) LLM generation. If the LLM
+# does not answer within the latency budget (or fails), the rule-based summary is
+# returned; the generation keeps running and its result replaces it through the cache.
 @app.get("/summary", response_model=AnomalySummary)
-async def get_latest_summary():
-    anomalies = await get_anomalies_from_db()
-    success, summary_output = await llm_summarizer_instance.generate_summary(anomalies)
-    health_status_data["last_summary_generated"] = datetime.now(timezone.utc)
-
-    if success:
-        return summary_output
-    else:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to generate anomaly summary: {summary_output}",
+async def get_latest_summary(response: Response):
+    latest = summary_worker.latest
+    if latest is not None:
+        response.headers["X-Summary-Version"] = str(latest["version"])
+        response.headers["X-Summary-Source"] = latest["source"]
+        return latest["summary"]
+
+    digest = await get_summary_input()
+    if digest.total == 0:
+        # Nothing to summarize: the summary cache only ever holds LLM output
+        response.headers["X-Summary-Source"] = "rules"
+        return rule_based_summarizer.summarize(digest)
+    try:
+        # Cancelling the wait leaves the shielded generation running
+        summary_output, cache_status = await asyncio.wait_for(
+            summary_cache.get(digest), Config.SUMMARY_LATENCY_BUDGET_MS / 1000
         )
+    except (asyncio.TimeoutError, SummaryGenerationError) as e:
+        if isinstance(e, SummaryGenerationError):
+            print(f"LLM summary unavailable, serving rule-based summary: {e}")
+        response.headers["X-Summary-Source"] = "rules"
+        return rule_based_summarizer.summarize(digest)
 
+    if cache_status == "miss":
+        health_status_data["last_summary_generated"] = datetime.now(timezone.utc)
+    response.headers["X-Summary-Cache"] = cache_status
+    response.headers["X-Summary-Source"] = "llm"
+    return summary_output
 
-@app.get("/status", response_model=HealthStatus)
-async def get_health_status():
-    if not os.path.exists(Config.DATA_DIR):
-        print(f"Warning: Shared data directory {Config.DATA_DIR} does not exist.")
 
-    health_status_data["anomaly_detector_active"] = await check_service_health(
-        Config.ANOMALY_DETECTOR_HOST,
-        Config.ANOMALY_DETECTOR_PORT,
-        endpoint="/anomalies",
-    )
+def _sse(event: str, data) -> str:
+    if hasattr(data, "model_dump"):
+        data = data.model_dump(mode="json")
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    llm_summarizer_health_status, _ = await llm_summarizer_instance.check_llm_status()
-    health_status_data["llm_summarizer_active"] = llm_summarizer_health_status
 
-    health_status_data["ollama_active"] = await check_service_health(
-        Config.OLLAMA_HOST,
-        Config.OLLAMA_PORT,
-        endpoint="/api/tags",
-    )
-    health_status_data["ollama_model_loaded"] = await check_ollama_model_loaded()
-
-    health_status_data["sensor_simulator_active"], sensor_simulator_data = (
-        await check_service_health(
-            Config.SENSOR_SIMULATOR_HOST,
-            Config.SENSOR_SIMULATOR_PORT,
-            endpoint="/status",
-            return_data=True,
-        )
+# Server-sent events: the rule-based summary first ("preliminary"), then tokens as Ollama
+# produces them and each summary field as soon as it is complete. On client disconnect
+# Starlette cancels the response, and closing the stream closes the Ollama request so
+# the generation stops.
+@app.get("/summary/stream")
+async def stream_summary():
+    digest = await get_summary_input()
+
+    async def events():
+        yield _sse("preliminary", rule_based_summarizer.summarize(digest))
+        stream = llm_summarizer_instance.stream_summary(digest)
+        try:
+            async for event, data in stream:
+                yield _sse(event, data)
+                if event == "summary":
+                    health_status_data["last_summary_generated"] = datetime.now(timezone.utc)
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    if sensor_simulator_data:
-        health_status_data["last_sensor_reading_received"] = sensor_simulator_data.get(
-            "last_data_sent", health_status_data["last_sensor_reading_received"]
-        )
 
+
+@app.get("/summary/history")
+async def get_summary_history(limit: int = 20, before_version: Optional[int] = None):
+    limit = max(1, min(limit, 100))
+    try:
+        summaries = await fetch_history(await anomaly_store.pool(), limit, before_version)
+    except asyncpg.exceptions.UndefinedTableError:
+        summaries = []
+    next_before = summaries[-1]["version"] if len(summaries) == limit else None
+    return {"summaries": summaries, "next_before_version": next_before}
+
+
+@app.get("/summary/cache")
+async def get_summary_cache_stats():
+    return summary_cache.snapshot()
+
+
+# Prompt size of the current input and token counts / duration of recent generations
+@app.get("/summary/metrics")
+async def get_summary_metrics():
+    digest = await get_summary_input()
+    return {
+        "prompt": {
+            "window_hours": digest.window_hours,
+            "anomalies": digest.total,
+            "groups_total": digest.groups_total,
+            "groups_in_prompt": digest.groups_shown,
+            "prompt_tokens_estimate": digest.estimated_tokens,
+            "token_budget": Config.SUMMARY_PROMPT_TOKEN_BUDGET,
+        },
+        "generation": llm_summarizer_instance.generation_snapshot(),
+        "cache": summary_cache.snapshot(),
+    }
+
+
+# Latest snapshot of the background probes: no dependency is contacted here
+@app.get("/status", response_model=HealthStatus)
+async def get_health_status():
     return HealthStatus(**health_status_data)
 
 
+# Per-probe result of the last round and latency history
+@app.get("/status/probes")
+async def get_health_probes():
+    if health_monitor is None:
+        raise HTTPException(status_code=503, detail="Health monitor not started")
+    return health_monitor.snapshot()
+
+
 @app.get("/discovery")
 async def get_discovery():
     """Get registered services from Eureka"""
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# Measures what the asyncpg pool removes from request latency: the same anomalies page
+# fetched with a fresh connection per request (previous behaviour) and through the pool.
+# Usage: python3 bench_db.py [--dsn postgresql://...] [--requests 200] [--limit 10]
+#                            [--url http://localhost:8004]
+import argparse
+import asyncio
+import statistics
+import time
+import urllib.request
+
+import asyncpg
+
+from anomaly_store import AnomalyStore, build_page_query
+from config import Config
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def report(label, durations):
+    print(
+        f"  {label:<28} p50 {statistics.median(durations):8.2f} ms | "
+        f"p99 {percentile(durations, 99):8.2f} ms | max {max(durations):8.2f} ms"
+    )
+
+
+async def bench_connect_per_request(dsn, query, params, n_requests):
+    durations, connect = [], []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        conn = await asyncpg.connect(dsn)
+        connected = time.perf_counter()
+        try:
+            await conn.fetch(query, *params)
+        finally:
+            await conn.close()
+        durations.append((time.perf_counter() - start) * 1000)
+        connect.append((connected - start) * 1000)
+    return durations, connect
+
+
+async def bench_pool(dsn, limit, n_requests):
+    store = AnomalyStore(dsn, min_size=1, max_size=4)
+    await store.pool()
+    try:
+        # First request prepares the statement on the connection
+        await store.fetch_page(limit=limit)
+        durations = []
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            await store.fetch_page(limit=limit)
+            durations.append((time.perf_counter() - start) * 1000)
+    finally:
+        await store.close()
+    return durations
+
+
+def bench_http(url, limit, n_requests):
+    durations = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        with urllib.request.urlopen(f"{url}/anomalies_from_db?limit={limit}", timeout=30) as response:
+            response.read()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Connection setup cost vs pooled, prepared queries")
+    parser.add_argument("--dsn", default=Config.POSTGIS_DSN)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--url", help="Also time GET /anomalies_from_db on a running api_service")
+    args = parser.parse_args()
+
+    query, params = build_page_query(None, None, None, None, None, None, args.limit)
+    print(f"{args.requests} requests, page of {args.limit} anomalies")
+
+    durations, connect = await bench_connect_per_request(args.dsn, query, params, args.requests)
+    report("connect per request", durations)
+    report("  of which connection setup", connect)
+    report("pool + prepared statement", await bench_pool(args.dsn, args.limit, args.requests))
+
+    if args.url:
+        report("HTTP /anomalies_from_db", bench_http(args.url.rstrip("/"), args.limit, args.requests))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,6 @@
+# Shared test setup for the API service
+import os
+import sys
+
+# The service modules import each other flat (from config import Config, ...)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, Tuple
+
+import httpx
+
+from config import Config
+
+PROBES = ("anomaly_detector", "sensor_simulator", "ollama")
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """One keep-alive connection pool shared by every probe."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(Config.HEALTH_PROBE_TIMEOUT_SECONDS),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+    )
+
+
+def _latency_stats(samples) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+    return {
+        "count": len(ordered),
+        "p50_ms": ordered[len(ordered) // 2],
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "max_ms": ordered[-1],
+    }
+
+
+class HealthMonitor:
+    """
+    Probes the dependencies of the API concurrently every `interval_seconds` and keeps
+    the result in `status` (the dict served by /status), so requests never wait on a probe.
+
+    Ollama is checked through its model list (/api/tags), which does not load the model
+    or run a generation.
+    """
+
+    def __init__(
+        self,
+        status: dict,
+        client: httpx.AsyncClient,
+        interval_seconds: float = 15,
+        history_size: int = 100,
+        llm_available: bool = True,
+    ):
+        self.status = status
+        self.client = client
+        self.interval_seconds = interval_seconds
+        self.llm_available = llm_available
+        self.latency_ms = {name: deque(maxlen=history_size) for name in PROBES}
+        self.last_results = {}
+        self.last_probe_at: Optional[datetime] = None
+        self.data_dir_ok: Optional[bool] = None
+
+    async def _get_json(self, url: str):
+        response = await self.client.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    async def probe_anomaly_detector(self) -> Tuple[bool, dict]:
+        return True, await self._get_json(
+            f"http://{Config.ANOMALY_DETECTOR_HOST}:{Config.ANOMALY_DETECTOR_PORT}/status"
+        )
+
+    async def probe_sensor_simulator(self) -> Tuple[bool, dict]:
+        return True, await self._get_json(
+            f"http://{Config.SENSOR_SIMULATOR_HOST}:{Config.SENSOR_SIMULATOR_PORT}/status"
+        )
+
+    async def probe_ollama(self) -> Tuple[bool, bool]:
+        """(server up, configured model present)"""
+        data = await self._get_json(f"http://{Config.OLLAMA_HOST}:{Config.OLLAMA_PORT}/api/tags")
+        names = {model.get("name") for model in data.get("models", [])}
+        return True, Config.LLM_MODEL_NAME in names or f"{Config.LLM_MODEL_NAME}:latest" in names
+
+    async def _timed(self, name: str, probe: Callable[[], Awaitable[Tuple[bool, object]]]):
+        started = time.perf_counter()
+        error = None
+        try:
+            ok, data = await probe()
+        except Exception as e:
+            ok, data, error = False, None, str(e) or type(e).__name__
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.latency_ms[name].append(latency_ms)
+        self.last_results[name] = {
+            "ok": ok,
+            "latency_ms": latency_ms,
+            "error": error,
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+        }
+        return ok, data
+
+    async def probe_once(self):
+        (detector_ok, detector), (simulator_ok, simulator), (ollama_ok, model_loaded) = await asyncio.gather(
+            self._timed("anomaly_detector", self.probe_anomaly_detector),
+            self._timed("sensor_simulator", self.probe_sensor_simulator),
+            self._timed("ollama", self.probe_ollama),
+        )
+
+        self.status["anomaly_detector_active"] = detector_ok
+        if detector:
+            self.status["last_anomaly_detected"] = detector.get(
+                "last_anomaly_detected", self.status["last_anomaly_detected"]
+            )
+            self.status["current_anomalies_count"] = detector.get(
+                "current_anomalies_count", self.status["current_anomalies_count"]
+            )
+
+        self.status["sensor_simulator_active"] = simulator_ok
+        if simulator:
+            self.status["last_sensor_reading_received"] = simulator.get(
+                "last_data_sent", self.status["last_sensor_reading_received"]
+            )
+
+        self.status["ollama_active"] = ollama_ok
+        self.status["ollama_model_loaded"] = bool(model_loaded)
+        self.status["llm_summarizer_active"] = bool(model_loaded) and self.llm_available
+
+        data_dir_ok = os.path.exists(Config.DATA_DIR)
+        if not data_dir_ok and self.data_dir_ok is not False:
+            print(f"Warning: Shared data directory {Config.DATA_DIR} does not exist.")
+        self.data_dir_ok = data_dir_ok
+        self.last_probe_at = datetime.now(timezone.utc)
+
+    async def run(self):
+        while True:
+            try:
+                await self.probe_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Health monitor error: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "last_probe_at": self.last_probe_at.isoformat() if self.last_probe_at else None,
+            "interval_seconds": self.interval_seconds,
+            "probes": {
+                name: {
+                    "last": self.last_results.get(name),
+                    "latency": _latency_stats(self.latency_ms[name]),
+                    "history_ms": list(self.latency_ms[name]),
+                }
+                for name in PROBES
+            },
+        }
@@ -12,7 +12,7 @@ class SensorReading(BaseModel):
     conductivity: Optional[float] = None
 
 class Anomaly(BaseModel):
-    id: int
+    id: str
     type: str
     timestamp: datetime
     sensor_id: str
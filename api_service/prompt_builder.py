@@ -0,0 +1,128 @@
+import hashlib
+import math
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+# Rough token estimate for English/number-heavy text (no tokenizer dependency)
+CHARS_PER_TOKEN = 4
+
+GROUPS_QUERY = """
+    SELECT
+        type,
+        COALESCE(parameter, '') AS parameter,
+        COALESCE(sensor_id, '') AS sensor_id,
+        COUNT(*) AS anomaly_count,
+        MIN(value) AS value_min,
+        AVG(value) AS value_avg,
+        MAX(value) AS value_max,
+        MAX(timestamp) AS last_seen
+    FROM anomalies_gis
+    WHERE timestamp >= $1
+    GROUP BY 1, 2, 3
+    ORDER BY anomaly_count DESC, last_seen DESC
+"""
+
+BUCKETS_QUERY = """
+    SELECT
+        to_timestamp(floor(extract(epoch FROM timestamp) / $2) * $2) AS bucket,
+        type,
+        COUNT(*) AS anomaly_count
+    FROM anomalies_gis
+    WHERE timestamp >= $1
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class AnomalyDigest:
+    """Compact, aggregated view of every anomaly in the window, rendered for the LLM prompt."""
+
+    def __init__(self, window_hours: int, groups: List[dict], text: str, groups_shown: int):
+        self.window_hours = window_hours
+        # Per type/parameter/sensor aggregates, largest first (also used by the rule-based summarizer)
+        self.groups = groups
+        self.total = sum(g["anomaly_count"] for g in groups)
+        self.text = text
+        self.groups_shown = groups_shown
+        self.groups_total = len(groups)
+        self.estimated_tokens = estimate_tokens(text)
+        self.cache_key = hashlib.sha256(text.encode()).hexdigest()
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{float(value):.4g}"
+
+
+def render_digest(window_hours: int, bucket_minutes: int, groups: List, buckets: List,
+                  token_budget: int) -> Tuple[str, int]:
+    """
+    Renders the aggregates as compact pipe-separated tables, largest groups first,
+    stopping at `token_budget`. Returns (text, number of groups rendered).
+    """
+    total = sum(g["anomaly_count"] for g in groups)
+    by_type = {}
+    for g in groups:
+        by_type[g["type"]] = by_type.get(g["type"], 0) + g["anomaly_count"]
+
+    lines = [
+        f"Window: last {window_hours}h | total anomalies: {total} | groups: {len(groups)}",
+        "By type: " + ", ".join(f"{t}={n}" for t, n in sorted(by_type.items(), key=lambda kv: -kv[1])),
+        "type|parameter|sensor|count|min|avg|max|last_seen",
+    ]
+    used = estimate_tokens("\n".join(lines))
+    # Room for the "omitted" line (largest possible counts) should the table be cut short
+    omitted_reserve = estimate_tokens(f"... {len(groups)} smaller groups omitted ({total} anomalies)") + 1
+    shown = 0
+    for i, g in enumerate(groups):
+        line = (
+            f"{g['type']}|{g['parameter']}|{g['sensor_id']}|{g['anomaly_count']}|"
+            f"{_fmt(g['value_min'])}|{_fmt(g['value_avg'])}|{_fmt(g['value_max'])}|"
+            f"{g['last_seen'].astimezone(timezone.utc):%m-%d %H:%M}"
+        )
+        cost = estimate_tokens(line) + 1
+        reserve = omitted_reserve if i < len(groups) - 1 else 0
+        # Keep room for the timeline below
+        if used + cost + reserve > token_budget * 0.8:
+            break
+        lines.append(line)
+        used += cost
+        shown += 1
+    if shown < len(groups):
+        omitted = sum(g["anomaly_count"] for g in groups[shown:])
+        line = f"... {len(groups) - shown} smaller groups omitted ({omitted} anomalies)"
+        lines.append(line)
+        used += estimate_tokens(line) + 1
+
+    timeline = {}
+    for b in buckets:
+        timeline.setdefault(b["bucket"], []).append(f"{b['type']}={b['anomaly_count']}")
+    if timeline:
+        header = f"Timeline ({bucket_minutes} min buckets, UTC):"
+        used += estimate_tokens(header)
+        timeline_lines = []
+        # Most recent buckets first when the budget is short
+        for bucket in sorted(timeline, reverse=True):
+            line = f"{bucket.astimezone(timezone.utc):%m-%d %H:%M} " + ",".join(timeline[bucket])
+            cost = estimate_tokens(line) + 1
+            if used + cost > token_budget:
+                break
+            timeline_lines.append(line)
+            used += cost
+        if timeline_lines:
+            lines.append(header)
+            lines.extend(reversed(timeline_lines))
+
+    return "\n".join(lines), shown
+
+
+async def build_digest(conn, window_hours: int, bucket_minutes: int, token_budget: int) -> AnomalyDigest:
+    """Aggregates the whole window in SQL and renders it within the token budget."""
+    since = datetime.now(timezone.utc) - timedelta(hours=window_hours)
+    groups = [dict(row) for row in await conn.fetch(GROUPS_QUERY, since)]
+    buckets = await conn.fetch(BUCKETS_QUERY, since, bucket_minutes * 60)
+    text, shown = render_digest(window_hours, bucket_minutes, groups, buckets, token_budget)
+    return AnomalyDigest(window_hours, groups, text, shown)
@@ -2,7 +2,9 @@ import json
 import os
 import sys
 import asyncio
-from typing import List, Tuple, Dict, Any
+import time
+from collections import deque
+from typing import List, Tuple, Dict, Any, AsyncIterator, Optional, Union
 
 # Add the parent directory to sys.path to allow importing from common
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -10,14 +12,119 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from common.config import Config
 from common.models import Anomaly, AnomalySummary  # Import AnomalySummary
 from datetime import datetime, timezone
+from prompt_builder import AnomalyDigest, estimate_tokens
 
 # from langchain_openai import ChatOpenAI
 from langchain_ollama import ChatOllama
 from langchain.prompts import PromptTemplate
 from langchain.output_parsers import PydanticOutputParser
+from langchain_core.exceptions import OutputParserException
 from pydantic import ValidationError  # Import ValidationError for explicit handling
 
 
+_JSON_WHITESPACE = " \t\r\n"
+_JSON_LITERALS = ("true", "false", "null")
+
+
+class JsonFieldStream:
+    """
+    Incremental scanner of the top-level fields of a JSON object generated token by token.
+    Each character is examined once, and text inside strings is never taken for a key.
+    A number is only complete once a following character shows it cannot grow.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.state = "start"
+        self.key = None
+        self.value_start = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text: str) -> Dict[str, Any]:
+        """Appends generated text; returns the fields completed by it."""
+        self.buffer += text
+        fields = {}
+        buffer = self.buffer
+        while self.pos < len(buffer):
+            char = buffer[self.pos]
+            state = self.state
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if state == "key":
+                        self.key = json.loads(buffer[self.value_start:self.pos + 1])
+                        self.state = "colon"
+                    elif self.depth == 0:
+                        self._complete(fields, self.pos + 1)
+            elif state == "start":
+                if char == "{":
+                    self.state = "key_or_end"
+            elif state == "key_or_end":
+                if char == '"':
+                    self.state = "key"
+                    self.value_start = self.pos
+                    self.in_string = True
+                elif char == "}":
+                    self.state = "done"
+            elif state == "colon":
+                if char == ":":
+                    self.state = "value"
+            elif state == "value":
+                if char not in _JSON_WHITESPACE:
+                    self.value_start = self.pos
+                    self.state = "container" if char in "{[" else "scalar"
+                    self.depth = 1 if char in "{[" else 0
+                    self.in_string = char == '"'
+                    # A literal cannot grow: complete as soon as it is spelled out
+                    if char not in '"{[' and buffer[self.value_start:self.pos + 1] in _JSON_LITERALS:
+                        self._complete(fields, self.pos + 1)
+            elif state == "container":
+                if char == '"':
+                    self.in_string = True
+                elif char in "{[":
+                    self.depth += 1
+                elif char in "}]":
+                    self.depth -= 1
+                    if self.depth == 0:
+                        self._complete(fields, self.pos + 1)
+            elif state == "scalar":
+                if char in _JSON_WHITESPACE or char in ",}]":
+                    self._complete(fields, self.pos)
+                    continue  # The delimiter is scanned again after the value
+                if buffer[self.value_start:self.pos + 1] in _JSON_LITERALS:
+                    self._complete(fields, self.pos + 1)
+            elif state == "done":
+                break
+            self.pos += 1
+        return fields
+
+    def _complete(self, fields: Dict[str, Any], end: int):
+        try:
+            fields[self.key] = json.loads(self.buffer[self.value_start:end])
+        except ValueError:
+            pass
+        self.state = "key_or_end"
+
+
+def extract_complete_fields(buffer: str) -> Dict[str, Any]:
+    """Returns the top-level fields of a partially generated JSON object whose values are complete."""
+    return JsonFieldStream().feed(buffer)
+
+
+def format_anomalies(anomalies: Union[AnomalyDigest, List[Anomaly]]) -> Tuple[str, int]:
+    """Prompt text and anomaly count for either an aggregated digest or a list of anomalies."""
+    if isinstance(anomalies, AnomalyDigest):
+        return anomalies.text, anomalies.total
+    return "".join(f"- {anomaly.model_dump_json()}\n" for anomaly in anomalies), len(anomalies)
+
+
 class LLMSummarizer:
     """
     Handles LLM-based summarization of anomalies using LangChain and Ollama.
@@ -29,6 +136,8 @@ class LLMSummarizer:
         self.ollama_base_url = f"http://{Config.OLLAMA_HOST}:{Config.OLLAMA_PORT}"
         self.llm = None
         self.status_llm = None
+        # Prompt size and generation time of recent summaries
+        self.generation_stats = deque(maxlen=100)
 
         try:
             self.llm = ChatOllama(
@@ -62,12 +171,13 @@ class LLMSummarizer:
                 "format_instructions": self.parser.get_format_instructions()
             },
             template="""You are an expert system for a water treatment facility.
-            Your task is to analyze a list of sensor anomalies and provide a concise, structured summary.
+            Your task is to analyze sensor anomalies and provide a concise, structured summary.
+            The anomalies are given as aggregated statistics per type, parameter and sensor, followed by a timeline.
             
             *Guidelines for Summary Generation:*
             1.  *Overall Status*: Determine the overall operational status based on the anomalies. Choose from 'Normal', 'Minor Issues', 'Moderate Concern', 'Critical'.
-            2.  *Summary Message*: Provide a human-readable overview of the anomalies. Highlight the issues, including their values and time.
-            3.  *Anomaly Counts*: You MUST include the total number of anomalies detected in the field anomalies_count.
+            2.  *Summary Message*: Provide a human-readable overview of the anomalies. Highlight the main issues, including their values, sensors and time.
+            3.  *Anomaly Counts*: You MUST include the total number of anomalies (the "total anomalies" figure) in the field anomalies_count.
             4.  *Conciseness*: Your response must be as brief as possible while still conveying comprehensive analytics.
 
             *Output Format*:
@@ -85,7 +195,8 @@ class LLMSummarizer:
         self.status_chain = None
 
         if self.llm:
-            self.llm_chain = self.prompt_template | self.llm | self.parser
+            # Parsed separately so Ollama's response metadata (token counts) stays available
+            self.llm_chain = self.prompt_template | self.llm
             self.status_chain = (
                 PromptTemplate(
                     input_variables=[], template="Reply with only the letter 'Y'."
@@ -101,11 +212,39 @@ class LLMSummarizer:
                 "LLM Summarizer initialized without a functional LLM chain due to prior errors."
             )
 
+    def _record_generation(self, prompt: str, started: float, metadata: Optional[dict], streamed: bool):
+        metadata = metadata or {}
+        stats = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "streamed": streamed,
+            "prompt_chars": len(prompt),
+            "prompt_tokens_estimate": estimate_tokens(prompt),
+            # Actual counts reported by Ollama, when available
+            "prompt_tokens": metadata.get("prompt_eval_count"),
+            "output_tokens": metadata.get("eval_count"),
+            "generation_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        self.generation_stats.append(stats)
+        print(
+            f"LLM summary: {stats['prompt_tokens'] or stats['prompt_tokens_estimate']} prompt tokens, "
+            f"{stats['output_tokens']} output tokens, {stats['generation_ms']:.0f} ms"
+        )
+
+    def generation_snapshot(self) -> dict:
+        recent = list(self.generation_stats)
+        durations = sorted(s["generation_ms"] for s in recent)
+        return {
+            "count": len(recent),
+            "generation_p50_ms": durations[len(durations) // 2] if durations else None,
+            "generation_max_ms": durations[-1] if durations else None,
+            "last": recent[-1] if recent else None,
+        }
+
     async def generate_summary(
-        self, anomalies: List[Anomaly]
+        self, anomalies: Union[AnomalyDigest, List[Anomaly]]
     ) -> Tuple[bool, str | AnomalySummary]:
         """
-        Generates a structured summary from a list of anomalies asynchronously.
+        Generates a structured summary from an aggregated digest (or a list of anomalies) asynchronously.
         Returns a tuple: (success_status: bool, summary_output: str | AnomalySummary)
         If successful, summary_output is an AnomalySummary object.
         If unsuccessful, summary_output is an error string.
@@ -116,7 +255,8 @@ class LLMSummarizer:
                 "LLM Summarizer is not active or not initialized properly. Cannot generate summary.",
             )
 
-        if not anomalies:
+        anomalies_str, count = format_anomalies(anomalies)
+        if count == 0:
             return True, AnomalySummary(
                 overall_status="Normal",
                 summary_message="No anomalies detected in the recent period.",
@@ -124,20 +264,18 @@ class LLMSummarizer:
                 timestamp=datetime.now(timezone.utc),
             )
 
-        # Format anomalies into a string for the LLM
-        anomalies_str = ""
-        for anomaly in anomalies:
-            anomalies_str += f"- {anomaly.model_dump_json()}\n"
-
         try:
+            started = time.perf_counter()
             # ⏱️ Appel SANS timeout — attend la réponse complète pour gérer les générations longues
-            summary_object = await self.llm_chain.ainvoke(
+            message = await self.llm_chain.ainvoke(
                 {"anomalies_data": anomalies_str}
             )
+            self._record_generation(anomalies_str, started, message.response_metadata, streamed=False)
+            summary_object = self.parser.parse(message.content)
             print("Successfully generated and parsed LLM summary.")
             return True, summary_object
 
-        except ValidationError as ve:
+        except (ValidationError, OutputParserException) as ve:
             error_message = f"Failed to parse LLM response due to validation error: {ve}\nRaw LLM output might not conform to the expected schema."
             print(error_message)
             return False, error_message
@@ -146,6 +284,56 @@ class LLMSummarizer:
             print(error_message)
             return False, error_message
 
+    async def stream_summary(
+        self, anomalies: Union[AnomalyDigest, List[Anomaly]]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streams a summary generation as (event, data) tuples:
+        ("token", text) for each chunk from Ollama, ("field", {name: value}) as soon as a
+        top-level field of the JSON output is complete (overall_status comes first),
+        then ("summary", AnomalySummary) or ("error", message).
+        Closing the generator closes the Ollama request, which stops the generation.
+        """
+        if not self.llm:
+            yield "error", "LLM Summarizer is not active or not initialized properly. Cannot generate summary."
+            return
+
+        anomalies_str, count = format_anomalies(anomalies)
+        if count == 0:
+            yield "summary", AnomalySummary(
+                overall_status="Normal",
+                summary_message="No anomalies detected in the recent period.",
+                anomalies_count=0,
+                timestamp=datetime.now(timezone.utc),
+            )
+            return
+
+        fields = JsonFieldStream()
+        metadata = None
+        started = time.perf_counter()
+        stream = (self.prompt_template | self.llm).astream({"anomalies_data": anomalies_str})
+        try:
+            async for chunk in stream:
+                # Ollama reports token counts on the final chunk
+                if chunk.response_metadata:
+                    metadata = chunk.response_metadata
+                if not chunk.content:
+                    continue
+                yield "token", chunk.content
+                for name, value in fields.feed(chunk.content).items():
+                    yield "field", {name: value}
+        except Exception as e:
+            yield "error", f"Error generating LLM summary: {e}"
+            return
+        finally:
+            await stream.aclose()
+
+        self._record_generation(anomalies_str, started, metadata, streamed=True)
+        try:
+            yield "summary", self.parser.parse(fields.buffer)
+        except Exception as e:
+            yield "error", f"Failed to parse LLM response: {e}"
+
     async def check_llm_status(self) -> Tuple[bool, str]:
         """
         Checks the LLM's responsiveness by asking it to reply with a single letter 'Y'.
@@ -170,4 +358,78 @@ class LLMSummarizer:
                 return False, f"Unexpected response: {cleaned_response}"
         except Exception as e:
             print(f"Error during LLM status check: {e}")
-            return False, f"LLM status check failed due to error: {e}"
\ No newline at end of file
+            return False, f"LLM status check failed due to error: {e}"
+
+class RuleBasedSummarizer:
+    """
+    Deterministic summary computed from the aggregated digest in milliseconds.
+    Served while the LLM summary is not ready (or when Ollama is unavailable).
+    """
+
+    # Detector spike limits per parameter (see anomaly_detector.detect_anomalies)
+    SPIKE_LIMITS = {
+        "temperature": Config.TEMP_SPIKE_THRESHOLD_HIGH,
+        "pressure": Config.PRESSURE_SPIKE_THRESHOLD_HIGH,
+        "flow": Config.FLOW_SPIKE_THRESHOLD_HIGH,
+        "ph": Config.PH_SPIKE_THRESHOLD_HIGH,
+        "turbidity": Config.TURBIDITY_SPIKE_THRESHOLD_HIGH,
+        "conductivity": Config.CONDUCTIVITY_SPIKE_THRESHOLD_HIGH,
+    }
+    # Severity rules
+    CRITICAL_SPIKE_RATIO = 1.5  # spike peak at 150% of the parameter limit
+    CRITICAL_SPIKE_SENSORS = 3  # spikes on this many sensors at once
+    CRITICAL_SPIKES = 50
+    MODERATE_DROPOUT_SENSORS = 2
+    MODERATE_ANOMALIES = 100
+
+    def _status(self, digest: AnomalyDigest) -> str:
+        if digest.total == 0:
+            return "Normal"
+        spikes = [g for g in digest.groups if g["type"] == "SPIKE"]
+        spike_count = sum(g["anomaly_count"] for g in spikes)
+        spike_sensors = {g["sensor_id"] for g in spikes}
+        dropout_sensors = {g["sensor_id"] for g in digest.groups if g["type"] == "DROPOUT"}
+        severe_spike = any(
+            g["value_max"] is not None
+            and g["parameter"] in self.SPIKE_LIMITS
+            and g["value_max"] >= self.SPIKE_LIMITS[g["parameter"]] * self.CRITICAL_SPIKE_RATIO
+            for g in spikes
+        )
+
+        if severe_spike or len(spike_sensors) >= self.CRITICAL_SPIKE_SENSORS or spike_count >= self.CRITICAL_SPIKES:
+            return "Critical"
+        if spikes or len(dropout_sensors) >= self.MODERATE_DROPOUT_SENSORS or digest.total >= self.MODERATE_ANOMALIES:
+            return "Moderate Concern"
+        return "Minor Issues"
+
+    def summarize(self, digest: AnomalyDigest) -> AnomalySummary:
+        now = datetime.now(timezone.utc)
+        if digest.total == 0:
+            return AnomalySummary(
+                overall_status="Normal",
+                summary_message="No anomalies detected in the recent period.",
+                anomalies_count=0,
+                timestamp=now,
+            )
+
+        by_type = {}
+        for g in digest.groups:
+            by_type[g["type"]] = by_type.get(g["type"], 0) + g["anomaly_count"]
+        sensors = {g["sensor_id"] for g in digest.groups}
+        top = digest.groups[0]
+        last_seen = max(g["last_seen"] for g in digest.groups)
+
+        message = (
+            f"{digest.total} anomalies in the last {digest.window_hours}h across {len(sensors)} sensor(s) "
+            f"({', '.join(f'{t}: {n}' for t, n in sorted(by_type.items(), key=lambda kv: -kv[1]))}). "
+            f"Most frequent: {top['type']} on {top['parameter'] or 'n/a'} at sensor {top['sensor_id'] or 'n/a'} "
+            f"({top['anomaly_count']} times"
+            + (f", peak {top['value_max']:.4g}" if top["value_max"] is not None and top["type"] != "DROPOUT" else "")
+            + f"). Last anomaly at {last_seen.astimezone(timezone.utc):%Y-%m-%d %H:%M} UTC."
+        )
+        return AnomalySummary(
+            overall_status=self._status(digest),
+            summary_message=message,
+            anomalies_count=digest.total,
+            timestamp=now,
+        )
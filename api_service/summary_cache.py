@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class SummaryGenerationError(Exception):
+    """Raised when the LLM could not produce a summary for a request."""
+
+
+class _Entry:
+    def __init__(self, value, ttl_seconds: float):
+        self.value = value
+        self.created_at = time.monotonic()
+        self.expires_at = self.created_at + ttl_seconds
+
+
+class SummaryCache:
+    """
+    Caches LLM summaries keyed by a hash of the input (aggregated digest or anomaly list).
+
+    - Entries expire after `ttl_seconds`.
+    - Concurrent requests for the same key share one in-flight generation (single-flight).
+    - With `stale_while_revalidate`, a miss returns the most recent summary immediately
+      and refreshes it in the background.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[list], Awaitable[Tuple[bool, object]]],
+        ttl_seconds: float = 300,
+        stale_while_revalidate: bool = True,
+        max_entries: int = 32,
+    ):
+        self.generate = generate
+        self.ttl_seconds = ttl_seconds
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_entries = max_entries
+        self.entries: Dict[str, _Entry] = {}
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.latest: Optional[_Entry] = None
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "shared": 0, "generations": 0, "failures": 0}
+
+    @staticmethod
+    def key_for(anomalies) -> str:
+        # Aggregated digests carry the hash of their rendered prompt
+        if hasattr(anomalies, "cache_key"):
+            return anomalies.cache_key
+        digest = hashlib.sha256()
+        for anomaly in anomalies:
+            digest.update(anomaly.model_dump_json().encode())
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    async def get(self, anomalies: List) -> Tuple[object, str]:
+        """
+        Returns (summary, cache_status) where cache_status is "hit", "stale" or "miss".
+        Raises SummaryGenerationError if a summary had to be generated and failed.
+        """
+        key = self.key_for(anomalies)
+        entry = self.entries.get(key)
+        if entry and time.monotonic() < entry.expires_at:
+            self.stats["hits"] += 1
+            return entry.value, "hit"
+
+        # The expired entry for this input if any, otherwise the most recent summary
+        stale = entry or self.latest
+        if self.stale_while_revalidate and stale is not None:
+            self.stats["stale"] += 1
+            self._start(key, anomalies)
+            return stale.value, "stale"
+
+        self.stats["misses"] += 1
+        # shield: a client disconnecting must not cancel a generation other requests share
+        return await asyncio.shield(self._start(key, anomalies)), "miss"
+
+    async def refresh(self, anomalies: List):
+        """Generates a fresh summary for this input (joining any in-flight generation)."""
+        return await asyncio.shield(self._start(self.key_for(anomalies), anomalies))
+
+    def _start(self, key: str, anomalies: List) -> asyncio.Task:
+        task = self.inflight.get(key)
+        if task is not None:
+            self.stats["shared"] += 1
+            return task
+        task = asyncio.create_task(self._generate(key, anomalies))
+        self.inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key: str, task: asyncio.Task):
+        self.inflight.pop(key, None)
+        # Background refreshes are never awaited: consume their exception here
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Summary generation failed: {task.exception()}")
+
+    async def _generate(self, key: str, anomalies: List):
+        self.stats["generations"] += 1
+        success, output = await self.generate(anomalies)
+        if not success:
+            self.stats["failures"] += 1
+            raise SummaryGenerationError(output)
+
+        entry = _Entry(output, self.ttl_seconds)
+        self.entries[key] = entry
+        self.latest = entry
+        if len(self.entries) > self.max_entries:
+            oldest = min(self.entries, key=lambda k: self.entries[k].created_at)
+            del self.entries[oldest]
+        return output
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "inflight": len(self.inflight),
+            "latest_age_seconds": round(time.monotonic() - self.latest.created_at, 1) if self.latest else None,
+        }
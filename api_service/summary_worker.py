@@ -0,0 +1,205 @@
+import asyncio
+import json
+import time
+from datetime import timezone
+from typing import Awaitable, Callable, List, Optional
+
+import asyncpg
+
+from prompt_builder import AnomalyDigest
+from summarizer import RuleBasedSummarizer
+from summary_cache import SummaryCache, SummaryGenerationError
+
+# NOTIFY channel of the api-sig ETL, fired after each sync into anomalies_gis
+SYNC_CHANNEL = "anomalies_gis_sync"
+
+CREATE_SUMMARIES_TABLE = """
+    CREATE TABLE IF NOT EXISTS anomaly_summaries (
+        version BIGSERIAL PRIMARY KEY,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        input_key TEXT NOT NULL,
+        input_fingerprint TEXT,
+        anomalies_count INTEGER NOT NULL,
+        generation_ms DOUBLE PRECISION,
+        summary JSONB NOT NULL
+    );
+    -- "llm", or "rules" when the summary was computed without the LLM.
+    -- Rows written before the column existed keep NULL: their provenance is unknown.
+    ALTER TABLE anomaly_summaries ADD COLUMN IF NOT EXISTS source TEXT;
+"""
+
+# Cheap change detector: newest row through the (timestamp DESC, id DESC) index
+FINGERPRINT_QUERY = """
+    SELECT timestamp, id FROM anomalies_gis
+    ORDER BY timestamp DESC, id DESC
+    LIMIT 1
+"""
+
+
+class SummaryWorker:
+    """
+    Regenerates the anomaly summary in the background whenever the input changes,
+    so /summary only reads the latest stored version.
+
+    Changes are detected from the ETL's NOTIFY, with a polling fallback. Bursts are
+    debounced and generations are rate-limited to one per `min_interval_seconds`.
+    Anomalies also leave the window as it slides, so the input is re-checked at least
+    every `max_age_seconds` even when no new anomaly arrived.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        fetch_input: Callable[[], Awaitable[AnomalyDigest]],
+        cache: SummaryCache,
+        poll_seconds: float = 30,
+        debounce_seconds: float = 5,
+        min_interval_seconds: float = 60,
+        generation_timeout_seconds: float = 120,
+        max_age_seconds: float = 3600,
+    ):
+        self.dsn = dsn
+        self.fetch_input = fetch_input
+        self.cache = cache
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.generation_timeout_seconds = generation_timeout_seconds
+        self.max_age_seconds = max_age_seconds
+        self.latest: Optional[dict] = None
+        self.fingerprint: Optional[str] = None
+        self.last_attempt = 0.0
+        self.rules = RuleBasedSummarizer()
+        # When the input was last compared with the stored summary
+        self.checked_at: Optional[float] = None
+
+    async def run(self):
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self.dsn)
+                await conn.execute(CREATE_SUMMARIES_TABLE)
+                await self._load_latest(conn)
+                await self._watch(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Summary worker error, retrying in 10s: {e}")
+                await asyncio.sleep(10)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+
+    async def _load_latest(self, conn):
+        row = await conn.fetchrow("""
+            SELECT version, created_at, input_key, input_fingerprint, anomalies_count, generation_ms, summary, source
+            FROM anomaly_summaries
+            ORDER BY version DESC
+            LIMIT 1
+        """)
+        if row is not None:
+            self.latest = _row_to_dict(row)
+            self.fingerprint = row["input_fingerprint"]
+
+    async def _watch(self, conn):
+        changed = asyncio.Event()
+
+        def on_notify(connection, pid, channel, payload):
+            changed.set()
+
+        await conn.add_listener(SYNC_CHANNEL, on_notify)
+        try:
+            while True:
+                await self._maybe_regenerate(conn)
+                try:
+                    await asyncio.wait_for(changed.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    continue
+                # Debounce: let a burst of syncs settle before summarizing
+                await asyncio.sleep(self.debounce_seconds)
+                changed.clear()
+        finally:
+            if not conn.is_closed():
+                await conn.remove_listener(SYNC_CHANNEL, on_notify)
+
+    async def _current_fingerprint(self, conn) -> Optional[str]:
+        row = await conn.fetchrow(FINGERPRINT_QUERY)
+        return f"{row['timestamp'].isoformat()}|{row['id']}" if row else None
+
+    async def _maybe_regenerate(self, conn):
+        fingerprint = await self._current_fingerprint(conn)
+        window_moved = (
+            self.checked_at is None
+            or time.monotonic() - self.checked_at >= self.max_age_seconds
+        )
+        if fingerprint == self.fingerprint and self.latest is not None and not window_moved:
+            return
+
+        # Rate limit: at most one generation per min_interval_seconds
+        wait = self.last_attempt + self.min_interval_seconds - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+            fingerprint = await self._current_fingerprint(conn)
+        self.last_attempt = time.monotonic()
+
+        digest = await self.fetch_input()
+        self.checked_at = time.monotonic()
+        input_key = SummaryCache.key_for(digest)
+        if self.latest is not None and input_key == self.latest["input_key"]:
+            self.fingerprint = fingerprint
+            return
+
+        started = time.perf_counter()
+        if digest.total == 0:
+            # Nothing for the LLM to summarize: stored as what it is, a rule-based summary
+            summary, source = self.rules.summarize(digest), "rules"
+        else:
+            try:
+                # The generation is shielded in the cache: a timeout only stops waiting for it
+                summary = await asyncio.wait_for(self.cache.refresh(digest), self.generation_timeout_seconds)
+            except asyncio.TimeoutError:
+                print(f"Background summary generation timed out after {self.generation_timeout_seconds:.0f}s")
+                return
+            except SummaryGenerationError as e:
+                print(f"Background summary generation failed: {e}")
+                return
+            source = "llm"
+        generation_ms = (time.perf_counter() - started) * 1000
+
+        row = await conn.fetchrow("""
+            INSERT INTO anomaly_summaries
+                (input_key, input_fingerprint, anomalies_count, generation_ms, summary, source)
+            VALUES ($1, $2, $3, $4, $5::jsonb, $6)
+            RETURNING version, created_at, input_key, input_fingerprint, anomalies_count, generation_ms, summary, source
+        """, input_key, fingerprint, digest.total, generation_ms, summary.model_dump_json(), source)
+        self.latest = _row_to_dict(row)
+        self.fingerprint = fingerprint
+        print(
+            f"Summary version {row['version']} generated in {generation_ms:.0f} ms "
+            f"({digest.total} anomalies, ~{digest.estimated_tokens} prompt tokens)"
+        )
+
+
+async def fetch_history(pool: asyncpg.Pool, limit: int = 20, before_version: Optional[int] = None) -> List[dict]:
+    """Past summaries, newest first, paginated on the version primary key."""
+    rows = await pool.fetch("""
+        SELECT version, created_at, input_key, input_fingerprint, anomalies_count, generation_ms, summary, source
+        FROM anomaly_summaries
+        WHERE $1::bigint IS NULL OR version < $1
+        ORDER BY version DESC
+        LIMIT $2
+    """, before_version, limit)
+    return [_row_to_dict(row) for row in rows]
+
+
+def _row_to_dict(row) -> dict:
+    summary = row["summary"]
+    return {
+        "version": row["version"],
+        "created_at": row["created_at"].astimezone(timezone.utc).isoformat(),
+        "input_key": row["input_key"],
+        "anomalies_count": row["anomalies_count"],
+        "generation_ms": round(row["generation_ms"], 1) if row["generation_ms"] is not None else None,
+        "summary": json.loads(summary) if isinstance(summary, str) else summary,
+        "source": row["source"] or "unknown",
+    }
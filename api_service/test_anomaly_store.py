@@ -0,0 +1,118 @@
+# Tests for the /anomalies_from_db access layer (cursors, bbox parsing and page queries) and its errors
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+import app
+from anomaly_store import AnomalyStore, build_page_query, decode_cursor, encode_cursor, parse_bbox
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(NOW, "sensor-1|42")
+    assert "=" not in token and "/" not in token and "+" not in token
+    assert decode_cursor(token) == (NOW, "sensor-1|42")
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", "WyJhIl0", "eyJhIjogMX0"])
+def test_invalid_cursor_raises_value_error(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def test_parse_bbox():
+    assert parse_bbox(" 2.2, 48.8 ,2.5,49") == [2.2, 48.8, 2.5, 49.0]
+
+
+@pytest.mark.parametrize("bbox", ["", "1,2,3", "1,2,3,4,5", "a,b,c,d"])
+def test_invalid_bbox_raises_value_error(bbox):
+    with pytest.raises(ValueError):
+        parse_bbox(bbox)
+
+
+def test_page_query_without_filters():
+    query, params = build_page_query(None, None, None, None, None, None, 10)
+    assert "WHERE geom IS NOT NULL\n" in query
+    assert "ORDER BY timestamp DESC, id DESC" in query
+    assert "LIMIT $1" in query and params == [11]
+
+
+def test_page_query_numbers_parameters_in_filter_order():
+    after = (NOW, "s1|7")
+    query, params = build_page_query(
+        NOW - timedelta(days=1), NOW, [2.2, 48.8, 2.5, 49.0], "S1", "SPIKE", after, 50
+    )
+    assert "timestamp >= $1 AND timestamp < $2 AND type = $3 AND sensor_id = $4" in query
+    assert "ST_MakeEnvelope($5, $6, $7, $8, 4326)" in query
+    assert "(timestamp, id) < ($9, $10)" in query and "LIMIT $11" in query
+    assert params == [NOW - timedelta(days=1), NOW, "SPIKE", "S1", 2.2, 48.8, 2.5, 49.0, NOW, "s1|7", 51]
+
+
+def test_same_filters_give_the_same_query_text():
+    # One prepared statement per filter combination, whatever the values
+    first, _ = build_page_query(NOW, None, None, "S1", None, None, 10)
+    second, _ = build_page_query(NOW - timedelta(days=3), None, None, "S2", None, None, 99)
+    assert first == second
+
+
+class FakePool:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetch(self, query, *params):
+        return self.rows[:params[-1]]
+
+
+def _rows(count):
+    return [
+        {"timestamp": NOW - timedelta(minutes=i), "id": f"s1|{i}", "doc": json.dumps({"id": f"s1|{i}"})}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_returns_cursor_of_last_row_when_more_remain():
+    store = AnomalyStore("postgresql://unused")
+    store._pool = FakePool(_rows(5))
+
+    body, cursor = await store.fetch_page(limit=3)
+    assert [doc["id"] for doc in json.loads(body)] == ["s1|0", "s1|1", "s1|2"]
+    assert decode_cursor(cursor) == (NOW - timedelta(minutes=2), "s1|2")
+
+    body, cursor = await store.fetch_page(limit=5)
+    assert len(json.loads(body)) == 5 and cursor is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_empty():
+    store = AnomalyStore("postgresql://unused")
+    store._pool = FakePool([])
+    assert await store.fetch_page() == (b"[]", None)
+
+
+async def _get_anomalies(params):
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/anomalies_from_db", params=params)
+
+
+@pytest.mark.asyncio
+async def test_database_error_is_logged_not_returned(monkeypatch, capsys):
+    async def fetch_page(**kwargs):
+        raise RuntimeError('relation "anomalies_gis" does not exist')
+
+    monkeypatch.setattr(app.anomaly_store, "fetch_page", fetch_page)
+    response = await _get_anomalies({})
+
+    assert response.status_code == 500
+    assert "anomalies_gis" not in response.text
+    assert 'relation "anomalies_gis" does not exist' in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_malformed_bbox_is_rejected_by_the_endpoint():
+    response = await _get_anomalies({"bbox": "1,2,3"})
+    assert response.status_code == 400
@@ -0,0 +1,106 @@
+# Tests for the background health monitor: probes against mocked dependencies
+import httpx
+import pytest
+
+import app
+from config import Config
+from health_monitor import HealthMonitor
+
+DETECTOR_STATUS = {"last_anomaly_detected": "2026-03-01T12:00:00Z", "current_anomalies_count": 4}
+SIMULATOR_STATUS = {"last_data_sent": "2026-03-01T12:00:05Z"}
+
+
+def _handler(models=(Config.LLM_MODEL_NAME,), fail=()):
+    """Answers every probe; the dependencies whose host is in `fail` time out."""
+    def handle(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if host in fail:
+            raise httpx.ReadTimeout("timed out", request=request)
+        if host == Config.OLLAMA_HOST and request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": [{"name": name} for name in models]})
+        if host == Config.ANOMALY_DETECTOR_HOST:
+            return httpx.Response(200, json=DETECTOR_STATUS)
+        if host == Config.SENSOR_SIMULATOR_HOST:
+            return httpx.Response(200, json=SIMULATOR_STATUS)
+        return httpx.Response(404)
+    return handle
+
+
+def _monitor(handler, **kwargs) -> HealthMonitor:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return HealthMonitor(dict(app.health_status_data), client, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_all_dependencies_up_with_model_listed():
+    monitor = _monitor(_handler())
+    await monitor.probe_once()
+
+    assert monitor.status["anomaly_detector_active"] and monitor.status["sensor_simulator_active"]
+    assert monitor.status["ollama_active"] and monitor.status["ollama_model_loaded"]
+    assert monitor.status["llm_summarizer_active"]
+    assert monitor.status["current_anomalies_count"] == 4
+    assert monitor.status["last_sensor_reading_received"] == SIMULATOR_STATUS["last_data_sent"]
+    assert all(result["ok"] and result["error"] is None for result in monitor.last_results.values())
+
+
+@pytest.mark.asyncio
+async def test_ollama_up_without_the_configured_model():
+    monitor = _monitor(_handler(models=("llama3:8b",)))
+    await monitor.probe_once()
+
+    assert monitor.status["ollama_active"]
+    assert not monitor.status["ollama_model_loaded"]
+    assert not monitor.status["llm_summarizer_active"]
+
+
+@pytest.mark.asyncio
+async def test_model_tagged_latest_counts_as_loaded_unless_llm_unavailable():
+    monitor = _monitor(_handler(models=(f"{Config.LLM_MODEL_NAME}:latest",)), llm_available=False)
+    await monitor.probe_once()
+
+    assert monitor.status["ollama_model_loaded"]
+    assert not monitor.status["llm_summarizer_active"]
+
+
+@pytest.mark.asyncio
+async def test_timeout_marks_only_that_dependency_down():
+    monitor = _monitor(_handler(fail=(Config.ANOMALY_DETECTOR_HOST, Config.OLLAMA_HOST)))
+    monitor.status["current_anomalies_count"] = 2
+    await monitor.probe_once()
+
+    assert not monitor.status["anomaly_detector_active"]
+    assert not monitor.status["ollama_active"] and not monitor.status["llm_summarizer_active"]
+    assert monitor.status["sensor_simulator_active"]
+    # The last values reported by a dependency that stopped answering are kept
+    assert monitor.status["current_anomalies_count"] == 2
+    assert monitor.last_results["anomaly_detector"]["error"] == "timed out"
+    assert len(monitor.latency_ms["anomaly_detector"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_latency_history_is_bounded():
+    monitor = _monitor(_handler(), history_size=3)
+    for _ in range(5):
+        await monitor.probe_once()
+
+    probes = monitor.snapshot()["probes"]
+    assert all(len(probe["history_ms"]) == 3 for probe in probes.values())
+    assert all(probe["latency"]["count"] == 3 for probe in probes.values())
+
+
+@pytest.mark.asyncio
+async def test_status_endpoint_reports_the_probed_flags(monkeypatch):
+    monitor = _monitor(_handler(models=()))
+    monkeypatch.setattr(app, "health_status_data", monitor.status)
+    await monitor.probe_once()
+
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/status")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["anomaly_detector_active"] and body["sensor_simulator_active"] and body["ollama_active"]
+    assert not body["ollama_model_loaded"] and not body["llm_summarizer_active"]
+    assert body["current_anomalies_count"] == 4
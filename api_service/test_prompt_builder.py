@@ -0,0 +1,63 @@
+# Tests for the summary prompt digest: rendering within the token budget
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from prompt_builder import AnomalyDigest, estimate_tokens, render_digest
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _groups(count):
+    return [
+        {"type": "SPIKE" if i % 2 else "DRIFT", "parameter": "ph", "sensor_id": f"sensor-{i:03d}",
+         "anomaly_count": count - i, "value_min": 6.5, "value_avg": 7.25, "value_max": 9.125,
+         "last_seen": NOW - timedelta(minutes=i)}
+        for i in range(count)
+    ]
+
+
+def _buckets(hours):
+    return [
+        {"bucket": NOW - timedelta(hours=h), "type": "SPIKE", "anomaly_count": h + 1}
+        for h in range(hours)
+    ]
+
+
+def test_small_input_is_rendered_in_full():
+    groups = _groups(3)
+    text, shown = render_digest(24, 60, groups, _buckets(2), 800)
+    assert shown == 3 and "omitted" not in text
+    lines = text.splitlines()
+    assert lines[0] == "Window: last 24h | total anomalies: 6 | groups: 3"
+    assert lines[1] == "By type: DRIFT=4, SPIKE=2"
+    assert lines[3] == "DRIFT|ph|sensor-000|3|6.5|7.25|9.125|03-01 12:00"
+    # Timeline in chronological order
+    assert lines[-2:] == ["03-01 11:00 SPIKE=2", "03-01 12:00 SPIKE=1"]
+
+
+@pytest.mark.parametrize("budget", [60, 120, 200, 400])
+def test_large_input_stays_within_budget(budget):
+    groups = _groups(200)
+    text, shown = render_digest(24, 60, groups, _buckets(24), budget)
+    assert estimate_tokens(text) <= budget
+    assert 0 <= shown < len(groups)
+    omitted = sum(g["anomaly_count"] for g in groups[shown:])
+    assert f"... {len(groups) - shown} smaller groups omitted ({omitted} anomalies)" in text
+
+
+def test_largest_groups_and_latest_buckets_kept_first():
+    groups = _groups(200)
+    text, shown = render_digest(24, 60, groups, _buckets(24), 200)
+    assert "sensor-000" in text and f"sensor-{shown:03d}|" not in text
+    timeline = text.split("Timeline (60 min buckets, UTC):\n")[1].splitlines()
+    assert timeline[-1] == "03-01 12:00 SPIKE=1"
+
+
+def test_digest_key_follows_rendered_text():
+    groups = _groups(3)
+    text, shown = render_digest(24, 60, groups, [], 800)
+    digest = AnomalyDigest(24, groups, text, shown)
+    assert digest.total == 6 and digest.groups_total == 3
+    assert digest.cache_key == AnomalyDigest(24, groups, text, shown).cache_key
+    assert digest.cache_key != AnomalyDigest(24, groups, text + " ", shown).cache_key
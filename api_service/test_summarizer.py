@@ -0,0 +1,89 @@
+# Tests for the summarizer helpers: streamed JSON field extraction and rule-based summaries
+from datetime import datetime, timezone
+
+import pytest
+
+from prompt_builder import AnomalyDigest
+from summarizer import JsonFieldStream, RuleBasedSummarizer, extract_complete_fields
+
+LAST_SEEN = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("buffer, expected", [
+    ("", {}),
+    ('{"summary": "Two sp', {}),
+    ('{"summary": "Two spikes", "sev', {"summary": "Two spikes"}),
+    ('{"summary": "a \\"quoted\\" word", ', {"summary": 'a "quoted" word'}),
+    # A number may still grow until a following character ends it
+    ('{"count": 12', {}),
+    ('{"count": 12,', {"count": 12}),
+    ('{"score": 0.5}', {"score": 0.5}),
+    ('{"tags": ["ph", "flo', {}),
+    ('{"tags": ["ph", "flow"], "ok": true', {"tags": ["ph", "flow"], "ok": True}),
+])
+def test_extract_complete_fields(buffer, expected):
+    assert extract_complete_fields(buffer) == expected
+
+
+def test_nested_object_is_reported_once_complete():
+    assert extract_complete_fields('{"details": {"ph": 3, "flow": "hi') == {}
+    buffer = '{"details": {"ph": 3, "flow": "high"}, "summary": "x'
+    assert extract_complete_fields(buffer) == {"details": {"ph": 3, "flow": "high"}}
+
+
+def test_keys_inside_string_values_are_ignored():
+    buffer = '{"summary_message": "Sensor s1 reported \\"summary\\": 3 and {\\"x\\": [1", "anomalies_count": 4,'
+    assert extract_complete_fields(buffer) == {
+        "summary_message": 'Sensor s1 reported "summary": 3 and {"x": [1',
+        "anomalies_count": 4,
+    }
+
+
+def test_streamed_fields_are_reported_once_in_order():
+    text = '```json\n{"overall_status": "Critical", "summary_message": "pH \\"high\\"", "anomalies_count": 12}\n```'
+    stream = JsonFieldStream()
+    reported = []
+    for char in text:
+        reported.extend(stream.feed(char).items())
+    assert reported == [
+        ("overall_status", "Critical"), ("summary_message", 'pH "high"'), ("anomalies_count", 12)
+    ]
+    assert stream.buffer == text
+
+
+def _group(anomaly_type, sensor_id, count=1, parameter="ph", value_max=7.5):
+    return {"type": anomaly_type, "parameter": parameter, "sensor_id": sensor_id,
+            "anomaly_count": count, "value_min": 6.5, "value_avg": 7.0, "value_max": value_max,
+            "last_seen": LAST_SEEN}
+
+
+def _summarize(*groups):
+    return RuleBasedSummarizer().summarize(AnomalyDigest(24, list(groups), "", len(groups)))
+
+
+def test_rule_based_summary_of_an_empty_window():
+    summary = _summarize()
+    assert summary.overall_status == "Normal" and summary.anomalies_count == 0
+
+
+@pytest.mark.parametrize("groups, status", [
+    ([_group("DRIFT", "S1")], "Minor Issues"),
+    ([_group("DROPOUT", "S1", value_max=None), _group("DROPOUT", "S2", value_max=None)], "Moderate Concern"),
+    ([_group("SPIKE", "S1", value_max=9.0)], "Moderate Concern"),
+    # Peak at 150% of the pH spike limit
+    ([_group("SPIKE", "S1", value_max=12.0)], "Critical"),
+    ([_group("SPIKE", f"S{i}") for i in range(3)], "Critical"),
+    ([_group("DRIFT", "S1", count=100)], "Moderate Concern"),
+])
+def test_rule_based_status(groups, status):
+    assert _summarize(*groups).overall_status == status
+
+
+def test_rule_based_message_describes_the_largest_group():
+    summary = _summarize(_group("SPIKE", "S1", count=4, value_max=9.0), _group("DROPOUT", "S2", value_max=None))
+    assert summary.anomalies_count == 5
+    assert summary.summary_message == (
+        "5 anomalies in the last 24h across 2 sensor(s) (SPIKE: 4, DROPOUT: 1). "
+        "Most frequent: SPIKE on ph at sensor S1 (4 times, peak 9). "
+        "Last anomaly at 2026-03-01 12:00 UTC."
+    )
@@ -0,0 +1,108 @@
+# Tests for the summary cache: single-flight generations, TTL and stale-while-revalidate
+import asyncio
+
+import pytest
+
+from summary_cache import SummaryCache, SummaryGenerationError
+
+
+class Anomaly:
+    """Stands in for an Anomaly model: the cache key is built from its JSON"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def model_dump_json(self):
+        return self.name
+
+
+def anomalies(name):
+    return [Anomaly(name)]
+
+
+def key(name):
+    return SummaryCache.key_for(anomalies(name))
+
+
+class Generator:
+    """Fake LLM call that waits for `release` and counts its calls"""
+
+    def __init__(self, success=True):
+        self.calls = []
+        self.success = success
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, anomalies):
+        name = anomalies[0].name
+        self.calls.append(name)
+        await self.release.wait()
+        if not self.success:
+            return False, "ollama unreachable"
+        return True, f"summary of {name} #{len(self.calls)}"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_generation():
+    generate = Generator()
+    generate.release.clear()
+    cache = SummaryCache(generate, stale_while_revalidate=False)
+
+    requests = [asyncio.create_task(cache.get(anomalies("a"))) for _ in range(5)]
+    await asyncio.sleep(0)
+    generate.release.set()
+    results = await asyncio.gather(*requests)
+
+    assert generate.calls == ["a"]
+    assert results == [("summary of a #1", "miss")] * 5
+    assert cache.stats["shared"] == 4 and cache.inflight == {}
+    assert await cache.get(anomalies("a")) == ("summary of a #1", "hit")
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_does_not_cancel_shared_generation():
+    generate = Generator()
+    generate.release.clear()
+    cache = SummaryCache(generate, stale_while_revalidate=False)
+
+    first = asyncio.create_task(cache.get(anomalies("a")))
+    second = asyncio.create_task(cache.get(anomalies("a")))
+    await asyncio.sleep(0)
+    first.cancel()
+    generate.release.set()
+
+    assert await second == ("summary of a #1", "miss")
+    assert generate.calls == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_stale_summary_served_while_refreshing():
+    generate = Generator()
+    cache = SummaryCache(generate, ttl_seconds=0)
+    await cache.get(anomalies("a"))
+
+    # New input: the latest summary is served at once, the new one is generated behind
+    generate.release.clear()
+    assert await cache.get(anomalies("b")) == ("summary of a #1", "stale")
+    assert list(cache.inflight) == [key("b")]
+    generate.release.set()
+    await cache.inflight[key("b")]
+
+    assert cache.latest.value == "summary of b #2"
+    assert await cache.get(anomalies("b")) == ("summary of b #2", "stale")
+
+
+@pytest.mark.asyncio
+async def test_failed_generation_raises_without_caching():
+    cache = SummaryCache(Generator(success=False), stale_while_revalidate=False)
+    with pytest.raises(SummaryGenerationError, match="ollama unreachable"):
+        await cache.get(anomalies("a"))
+    assert cache.entries == {} and cache.stats["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_oldest_entry_evicted():
+    cache = SummaryCache(Generator(), max_entries=2, stale_while_revalidate=False)
+    for name in ("a", "b", "c"):
+        await cache.get(anomalies(name))
+    assert sorted(cache.entries) == sorted([key("b"), key("c")])
@@ -0,0 +1,141 @@
+# Tests for the background summary worker: generation timeout and sliding window
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from summary_cache import SummaryCache
+from summary_worker import SummaryWorker, _row_to_dict
+
+NEWEST = {"timestamp": datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc), "id": "s1|42"}
+
+
+class Digest:
+    def __init__(self, cache_key, total=3):
+        self.cache_key = cache_key
+        self.total = total
+        self.estimated_tokens = 100
+
+
+class Summary:
+    def __init__(self, text):
+        self.text = text
+
+    def model_dump_json(self):
+        return json.dumps({"summary": self.text})
+
+
+class FakeConn:
+    """Answers the fingerprint query and records stored summaries"""
+
+    def __init__(self):
+        self.stored = []
+
+    async def fetchrow(self, query, *args):
+        if "INSERT INTO anomaly_summaries" not in query:
+            return NEWEST
+        self.stored.append(args)
+        input_key, fingerprint, count, generation_ms, summary, source = args
+        return {
+            "version": len(self.stored), "created_at": datetime.now(timezone.utc),
+            "input_key": input_key, "input_fingerprint": fingerprint,
+            "anomalies_count": count, "generation_ms": generation_ms, "summary": summary,
+            "source": source,
+        }
+
+
+def _worker(inputs, generate, **kwargs):
+    async def fetch_input():
+        key = inputs.pop(0)
+        return key if isinstance(key, Digest) else Digest(key)
+
+    options = {"min_interval_seconds": 0, **kwargs}
+    return SummaryWorker("postgresql://unused", fetch_input, SummaryCache(generate), **options)
+
+
+async def _generate(digest):
+    return True, Summary(f"summary of {digest.cache_key}")
+
+
+@pytest.mark.asyncio
+async def test_generation_timeout_is_logged_and_retried(capsys):
+    release = asyncio.Event()
+
+    async def slow_generate(digest):
+        await release.wait()
+        return True, Summary("late")
+
+    conn = FakeConn()
+    worker = _worker(["a", "a"], slow_generate, generation_timeout_seconds=0.05)
+    await worker._maybe_regenerate(conn)
+
+    assert conn.stored == [] and worker.latest is None and worker.fingerprint is None
+    assert "timed out" in capsys.readouterr().out
+
+    # The shielded generation completed meanwhile: the retry stores it
+    release.set()
+    await worker._maybe_regenerate(conn)
+    assert len(conn.stored) == 1 and worker.latest["summary"] == {"summary": "late"}
+
+
+@pytest.mark.asyncio
+async def test_unchanged_input_is_rechecked_once_the_window_moved():
+    conn = FakeConn()
+    worker = _worker(["a", "b"], _generate, max_age_seconds=3600)
+    await worker._maybe_regenerate(conn)
+    assert worker.latest["input_key"] == "a"
+
+    # No new anomaly and a recent check: nothing is fetched
+    await worker._maybe_regenerate(conn)
+    assert len(conn.stored) == 1
+
+    # The window slid past older anomalies: same newest row, different input
+    worker.max_age_seconds = 0
+    await worker._maybe_regenerate(conn)
+    assert len(conn.stored) == 2 and worker.latest["input_key"] == "b"
+
+
+@pytest.mark.asyncio
+async def test_same_input_after_window_check_is_not_regenerated():
+    calls = []
+
+    async def generate(digest):
+        calls.append(digest.cache_key)
+        return await _generate(digest)
+
+    conn = FakeConn()
+    worker = _worker(["a", "a"], generate, max_age_seconds=0)
+    await worker._maybe_regenerate(conn)
+    await worker._maybe_regenerate(conn)
+    assert calls == ["a"] and len(conn.stored) == 1
+
+
+@pytest.mark.asyncio
+async def test_llm_and_rule_based_summaries_keep_their_source():
+    calls = []
+
+    async def generate(digest):
+        calls.append(digest.cache_key)
+        return await _generate(digest)
+
+    conn = FakeConn()
+    worker = _worker(["a", Digest("empty", total=0)], generate, max_age_seconds=0)
+    await worker._maybe_regenerate(conn)
+    assert worker.latest["source"] == "llm"
+
+    # Empty window: summarized by the rules, never through the LLM cache
+    await worker._maybe_regenerate(conn)
+    assert calls == ["a"]
+    assert worker.latest["source"] == "rules"
+    assert worker.latest["summary"]["overall_status"] == "Normal"
+    assert worker.cache.entries.keys() == {"a"}
+
+
+def test_summary_stored_before_the_source_column_has_unknown_source():
+    row = {
+        "version": 1, "created_at": datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc), "input_key": "a",
+        "input_fingerprint": None, "anomalies_count": 3, "generation_ms": None,
+        "summary": '{"summary": "legacy"}', "source": None,
+    }
+    assert _row_to_dict(row)["source"] == "unknown"